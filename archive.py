@@ -0,0 +1,69 @@
+"""ย้ายใบเสร็จของปีที่ปิดแล้วไปไฟล์ archive รายปีจาก command line
+
+    python archive.py status                    # ปีที่ archive แล้วและปีที่ยังอยู่ในฐานข้อมูลหลัก
+    python archive.py run                       # archive ทุกปีที่ปิดแล้ว (เก่าไปใหม่)
+    python archive.py run --year 2567 --vacuum  # archive ปีเดียวแล้ว VACUUM ฐานข้อมูลหลัก
+"""
+import argparse
+import sys
+import time
+
+import database as db
+import money
+
+
+def status() -> None:
+    result = db.get_archive_status()
+    print(f"Main database: {result['database_bytes'] / 1024 / 1024:.1f} MiB")
+    for row in result['hot_years']:
+        state = "closed" if row['closed'] else "current"
+        print(f"  {row['buddhist_year']}: {row['invoices']} invoices ({state})")
+    print(f"Archived years: {len(result['archives'])}")
+    for archive in result['archives']:
+        print(f"  {archive['buddhist_year']}: {archive['file_name']}, "
+              f"{archive['invoice_count']} invoices, {archive['line_count']} lines, "
+              f"total {money.format_baht(archive['total_satang'])} บาท "
+              f"(archived {archive['archived_at']})")
+
+
+def run(year: int, vacuum: bool) -> None:
+    if year:
+        years = [year]
+    else:
+        years = [row['buddhist_year'] for row in db.get_archive_status()['hot_years']
+                 if row['closed']]
+        if not years:
+            print("No closed years left in the main database")
+            return
+
+    for index, buddhist_year in enumerate(years):
+        started = time.perf_counter()
+        # VACUUM ครั้งเดียวหลังปีสุดท้าย
+        result = db.archive_year(buddhist_year, vacuum=vacuum and index == len(years) - 1)
+        print(f"Archived {result['invoices']} invoices ({result['lines']} lines) of "
+              f"{buddhist_year} to {result['file_name']} "
+              f"({result['bytes'] / 1024 / 1024:.1f} MiB) in "
+              f"{time.perf_counter() - started:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="archive ใบเสร็จของปีที่ปิดแล้ว")
+    parser.add_argument("command", choices=("status", "run"))
+    parser.add_argument("--year", type=int, default=0,
+                        help="run: ปี พ.ศ. ที่จะ archive (ค่าเริ่มต้น: ทุกปีที่ปิดแล้ว)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="run: VACUUM ฐานข้อมูลหลักหลัง archive")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status()
+        return
+    try:
+        run(args.year, args.vacuum)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""เรียกฟังก์ชันใน database.py จาก endpoint แบบ async โดยไม่บล็อก event loop
+
+งาน SQLite ทั้งหมดถูกส่งไปทำใน thread pool ที่จำกัดจำนวน แยกฝั่งอ่านและ
+ฝั่งเขียน การนำเข้า CSV ขนาดใหญ่หรือการค้นหาที่ช้าจึงไม่ทำให้ผู้ใช้คนอื่นต้องรอ
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import database as db
+
+# จำนวน thread สูงสุดที่ทำงานกับฐานข้อมูลพร้อมกัน
+DB_READ_CONCURRENCY = int(os.environ.get("DB_READ_CONCURRENCY", str(db.DB_POOL_SIZE)))
+DB_WRITE_CONCURRENCY = int(os.environ.get("DB_WRITE_CONCURRENCY", "2"))
+
+_read_executor = ThreadPoolExecutor(
+    max_workers=DB_READ_CONCURRENCY, thread_name_prefix="db-read"
+)
+# การเขียนใช้การเชื่อมต่อเดียวอยู่แล้ว แยก executor ไว้เพื่อไม่ให้งานเขียนที่รอล็อก
+# กิน thread ของฝั่งอ่านจนหมด
+_write_executor = ThreadPoolExecutor(
+    max_workers=DB_WRITE_CONCURRENCY, thread_name_prefix="db-write"
+)
+
+
+async def run_read(func: Callable, *args, **kwargs) -> Any:
+    """รันฟังก์ชันอ่านข้อมูลใน thread pool ฝั่งอ่าน"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _read_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_write(func: Callable, *args, **kwargs) -> Any:
+    """รันฟังก์ชันเขียนข้อมูลใน thread pool ฝั่งเขียน"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _write_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def _reader(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_read(func, *args, **kwargs)
+    return wrapper
+
+
+def _writer(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_write(func, *args, **kwargs)
+    return wrapper
+
+
+def get_executor_stats() -> Dict:
+    """จำนวนงานที่รอคิวใน thread pool แต่ละฝั่ง"""
+    return {
+        "read": {
+            "max_workers": DB_READ_CONCURRENCY,
+            "queued": _read_executor._work_queue.qsize(),
+        },
+        "write": {
+            "max_workers": DB_WRITE_CONCURRENCY,
+            "queued": _write_executor._work_queue.qsize(),
+        },
+    }
+
+
+def shutdown() -> None:
+    """ปิด thread pool (เรียกตอนปิดแอป)"""
+    _read_executor.shutdown(wait=True)
+    _write_executor.shutdown(wait=True)
+
+
+# ==================== Read Functions ====================
+
+get_seller_info = _reader(db.get_seller_info)
+get_invoice_by_id = _reader(db.get_invoice_by_id)
+get_invoice_by_number = _reader(db.get_invoice_by_number)
+get_invoices_by_numbers = _reader(db.get_invoices_by_numbers)
+search_invoices = _reader(db.search_invoices)
+search_invoices_page = _reader(db.search_invoices_page)
+list_invoices = _reader(db.list_invoices)
+get_all_items = _reader(db.get_all_items)
+get_items_count = _reader(db.get_items_count)
+search_customers = _reader(db.search_customers)
+get_customer = _reader(db.get_customer)
+sales_by_period = _reader(db.sales_by_period)
+sales_by_sku = _reader(db.sales_by_sku)
+sales_by_customer = _reader(db.sales_by_customer)
+audit_invoice_totals = _reader(db.audit_invoice_totals)
+get_idempotent_invoice = _reader(db.get_idempotent_invoice)
+get_item_import_progress = _reader(db.get_item_import_progress)
+
+# ==================== Write Functions ====================
+
+get_or_create_default_seller = _writer(db.get_or_create_default_seller)
+update_seller_info = _writer(db.update_seller_info)
+save_invoice = _writer(db.save_invoice)
+save_invoice_once = _writer(db.save_invoice_once)
+save_invoices_bulk = _writer(db.save_invoices_bulk)
+clear_all_items = _writer(db.clear_all_items)
+import_items_from_csv = _writer(db.import_items_from_csv)
+import_items_from_stream = _writer(db.import_items_from_stream)
+sync_customers_from_csv = _writer(db.sync_customers_from_csv)
+rebuild_sales_summaries = _writer(db.rebuild_sales_summaries)
+catch_up_sales_summaries = _writer(db.catch_up_sales_summaries)
@@ -0,0 +1,240 @@
+"""การยืนยันตัวตนด้วย cookie ที่ลงลายมือชื่อและมีวันหมดอายุ และการจำกัดการ login
+
+โทเค็นอยู่ในรูป ``<เวลาหมดอายุ>.<HMAC-SHA256>`` ตรวจได้โดยไม่ต้องเก็บ session
+กุญแจสำหรับลงลายมือชื่อคำนวณครั้งเดียวตอนเริ่มจาก SECRET_KEY และ ADMIN_PASSWORD
+(ถ้าไม่กำหนด SECRET_KEY จะ derive จากรหัสผ่าน) ทุก worker จึงได้กุญแจเดียวกันและ
+ยอมรับ cookie ของกันและกัน เปลี่ยนรหัสผ่านแล้วโทเค็นเดิมจะใช้ไม่ได้ทันที
+
+AuthMiddleware เป็น ASGI middleware โดยตรง (ไม่ใช้ BaseHTTPMiddleware) จึงไม่มี
+task หรือ stream เพิ่มต่อคำขอ
+"""
+import hashlib
+import hmac
+import ipaddress
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse, RedirectResponse
+
+AUTH_COOKIE = "invoice_auth"
+
+# อายุของ session (วินาที)
+SESSION_MAX_AGE = int(os.environ.get("SESSION_MAX_AGE", str(7 * 24 * 3600)))
+
+# login ผิดได้ไม่เกิน LOGIN_MAX_ATTEMPTS ครั้งต่อ LOGIN_WINDOW วินาที ต่อ IP (ต่อ worker)
+LOGIN_MAX_ATTEMPTS = int(os.environ.get("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW = float(os.environ.get("LOGIN_WINDOW", "300"))
+
+# login ผิดรวมทุก IP ต่อบัญชีใน LOGIN_WINDOW วินาที (กันการเดารหัสจากหลาย IP)
+# สูงกว่าค่าต่อ IP มาก ผู้โจมตีคนเดียวจึงล็อกบัญชีไม่ได้
+LOGIN_ACCOUNT_MAX_ATTEMPTS = int(os.environ.get("LOGIN_ACCOUNT_MAX_ATTEMPTS", "50"))
+
+# IP หรือเครือข่าย (CIDR) ของ reverse proxy คั่นด้วย comma เฉพาะคำขอจาก proxy เหล่านี้
+# ที่ใช้ X-Forwarded-For หา IP ของ client ค่าว่างคือไม่เชื่อ header นี้เลย
+TRUSTED_PROXIES = os.environ.get("TRUSTED_PROXIES", "")
+
+# salt เมื่อไม่ได้กำหนด SECRET_KEY และจำนวนรอบของ PBKDF2 (คำนวณครั้งเดียวตอนเริ่ม)
+_DEFAULT_SALT = b"invoice-generator-session"
+_KEY_ITERATIONS = 100_000
+
+# จำนวนโทเค็นที่ตรวจแล้วที่จำไว้ (ไม่ต้องคำนวณ HMAC ซ้ำ)
+_VERIFIED_CACHE_SIZE = 1024
+
+
+class SessionTokens:
+    """สร้างและตรวจโทเค็น session ที่ลงลายมือชื่อด้วย HMAC"""
+
+    def __init__(self, password: str, secret_key: Optional[str] = None,
+                 max_age: int = SESSION_MAX_AGE):
+        self.max_age = max_age
+        self._password = password.encode("utf-8")
+        salt = secret_key.encode("utf-8") if secret_key else _DEFAULT_SALT
+        self._key = hashlib.pbkdf2_hmac("sha256", self._password, salt, _KEY_ITERATIONS)
+        self._verified: Dict[str, int] = {}
+
+    def check_password(self, password: str) -> bool:
+        """เทียบรหัสผ่านแบบใช้เวลาคงที่"""
+        return hmac.compare_digest(password.encode("utf-8"), self._password)
+
+    def _sign(self, expires: str) -> str:
+        return hmac.new(self._key, expires.encode("ascii"), hashlib.sha256).hexdigest()
+
+    def issue(self, now: Optional[float] = None) -> str:
+        """สร้างโทเค็นใหม่ที่หมดอายุใน max_age วินาที"""
+        expires = str(int(now if now is not None else time.time()) + self.max_age)
+        return f"{expires}.{self._sign(expires)}"
+
+    def verify(self, token: str, now: Optional[float] = None) -> bool:
+        """ตรวจลายมือชื่อและวันหมดอายุของโทเค็น"""
+        now = now if now is not None else time.time()
+
+        expires = self._verified.get(token)
+        if expires is not None:
+            if expires > now:
+                return True
+            del self._verified[token]
+            return False
+
+        expires_text, _, signature = token.partition(".")
+        if not expires_text.isdigit() or int(expires_text) <= now:
+            return False
+        if not hmac.compare_digest(signature, self._sign(expires_text)):
+            return False
+
+        if len(self._verified) >= _VERIFIED_CACHE_SIZE:
+            self._verified.clear()
+        self._verified[token] = int(expires_text)
+        return True
+
+
+def parse_networks(value: str) -> Tuple:
+    """แปลงรายการ IP/CIDR คั่นด้วย comma เป็น ip_network (ค่าไม่ถูกต้อง raise ValueError)"""
+    return tuple(ipaddress.ip_network(part.strip(), strict=False)
+                 for part in value.split(",") if part.strip())
+
+
+_TRUSTED_NETWORKS = parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address: str, networks: Tuple) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_address(peer: Optional[str], forwarded_for: Optional[str] = None,
+                   trusted: Optional[Tuple] = None) -> str:
+    """IP ของ client สำหรับจำกัดการ login
+
+    ถ้า ``peer`` (ผู้เชื่อมต่อโดยตรง) เป็น proxy ที่เชื่อถือ จะอ่าน X-Forwarded-For
+    จากขวาไปซ้ายแล้วใช้ IP แรกที่ไม่ใช่ proxy ที่เชื่อถือ (ค่าทางซ้ายที่ client
+    ปลอมมาได้จึงไม่ถูกใช้) นอกนั้นใช้ ``peer``
+
+    Args:
+        peer: IP ของผู้เชื่อมต่อ (request.client.host)
+        forwarded_for: ค่า header X-Forwarded-For
+        trusted: เครือข่ายของ proxy ที่เชื่อถือ (ค่าเริ่มต้นจาก TRUSTED_PROXIES)
+    """
+    networks = _TRUSTED_NETWORKS if trusted is None else trusted
+    if not peer:
+        return "unknown"
+    if not forwarded_for or not _is_trusted(peer, networks):
+        return peer
+    for address in reversed([part.strip() for part in forwarded_for.split(",")]):
+        if address and not _is_trusted(address, networks):
+            return address
+    return peer
+
+
+class LoginRateLimiter:
+    """จำกัดจำนวนครั้งที่ login ผิดต่อ client ในช่วงเวลาหนึ่ง (เก็บในหน่วยความจำ)"""
+
+    def __init__(self, max_attempts: int = LOGIN_MAX_ATTEMPTS,
+                 window: float = LOGIN_WINDOW, max_clients: int = 10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_clients = max_clients
+        self._failures: Dict[str, Deque[float]] = {}
+
+    def _recent(self, client: str, now: float) -> Optional[Deque[float]]:
+        attempts = self._failures.get(client)
+        if attempts is None:
+            return None
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[client]
+            return None
+        return attempts
+
+    def retry_after(self, client: str, now: Optional[float] = None) -> int:
+        """จำนวนวินาทีที่ต้องรอก่อน login ได้อีก (0 = login ได้)"""
+        now = now if now is not None else time.monotonic()
+        attempts = self._recent(client, now)
+        if attempts is None or len(attempts) < self.max_attempts:
+            return 0
+        return max(1, math.ceil(attempts[0] + self.window - now))
+
+    def record_failure(self, client: str, now: Optional[float] = None) -> None:
+        """บันทึกการ login ผิดหนึ่งครั้ง"""
+        now = now if now is not None else time.monotonic()
+        if client not in self._failures and len(self._failures) >= self.max_clients:
+            for other in list(self._failures):
+                self._recent(other, now)
+            if len(self._failures) >= self.max_clients:
+                # ทิ้ง client ที่ถูกบันทึกไว้นานที่สุด
+                del self._failures[next(iter(self._failures))]
+        self._failures.setdefault(client, deque()).append(now)
+
+    def reset(self, client: str) -> None:
+        """ล้างประวัติหลัง login สำเร็จ"""
+        self._failures.pop(client, None)
+
+
+def _request_cookie(scope, name: str) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == b"cookie":
+            return cookie_parser(value.decode("latin-1")).get(name)
+    return None
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token.strip() if scheme.lower() == "bearer" else None
+    return None
+
+
+class AuthMiddleware:
+    """ASGI middleware: ส่งต่อคำขอที่มี cookie ถูกต้อง นอกนั้น redirect ไป /login
+    (หรือตอบ 401 สำหรับ /api/ และ ``token_paths``)
+
+    ``token_paths`` (path -> โทเค็น) รับ ``Authorization: Bearer <โทเค็น>`` แทน cookie
+    ได้ด้วย เช่น /metrics สำหรับ Prometheus ที่ login ด้วยฟอร์มไม่ได้
+    """
+
+    def __init__(self, app, tokens: SessionTokens,
+                 public_paths: Iterable[str] = ("/login",),
+                 public_prefixes: Iterable[str] = ("/static/",),
+                 token_paths: Optional[Dict[str, str]] = None):
+        self.app = app
+        self.tokens = tokens
+        self.public_paths = frozenset(public_paths)
+        self.public_prefixes = tuple(public_prefixes)
+        # path ที่ไม่ได้ตั้งโทเค็น (ค่าว่าง) ใช้ได้เฉพาะ cookie แต่ยังตอบ 401 แทน redirect
+        self.token_paths = dict(token_paths or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path in self.public_paths or path.startswith(self.public_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_cookie(scope, AUTH_COOKIE)
+        if token and self.tokens.verify(token):
+            await self.app(scope, receive, send)
+            return
+
+        expected = self.token_paths.get(path)
+        if expected:
+            bearer = _bearer_token(scope)
+            if bearer and hmac.compare_digest(bearer.encode("utf-8"), expected.encode("utf-8")):
+                await self.app(scope, receive, send)
+                return
+
+        if path.startswith("/api/") or path in self.token_paths:
+            response = JSONResponse({"detail": "Authentication required"}, status_code=401)
+        else:
+            response = RedirectResponse(url="/login", status_code=302)
+        await response(scope, receive, send)
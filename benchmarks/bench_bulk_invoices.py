@@ -0,0 +1,62 @@
+"""เปรียบเทียบ throughput ของการบันทึกใบเสร็จทีละใบกับแบบ bulk
+
+    python benchmarks/bench_bulk_invoices.py --invoices 5000 --items 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def make_invoices(count: int, items_per_invoice: int):
+    return [
+        {
+            "customer": {"name": f"ลูกค้า POS {i}", "address": "กรุงเทพฯ", "tax_id": ""},
+            "items": [
+                {"sku": f"{11000 + j}", "name": f"สินค้า {j}", "price": 25.0 + j, "quantity": 1 + j % 3}
+                for j in range(items_per_invoice)
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=1000,
+                        help="invoices per save_invoices_bulk call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_PATH"] = os.path.join(tmp, "bench.db")
+        import database as db
+        db.get_or_create_default_seller()
+
+        payload = make_invoices(args.invoices, args.items)
+
+        started = time.perf_counter()
+        for invoice in payload:
+            assert db.save_invoice(invoice["customer"], invoice["items"]) is not None
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for offset in range(0, len(payload), args.batch):
+            results = db.save_invoices_bulk(payload[offset:offset + args.batch])
+            assert all(result["success"] for result in results)
+        bulk = time.perf_counter() - started
+
+    print(f"{args.invoices} invoices x {args.items} items")
+    print(f"single  {single:7.2f}s  {args.invoices / single:9.0f} invoices/s")
+    print(f"bulk    {bulk:7.2f}s  {args.invoices / bulk:9.0f} invoices/s "
+          f"(batch {args.batch}, {single / bulk:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
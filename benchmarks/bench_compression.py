@@ -0,0 +1,150 @@
+"""วัดขนาด response และเวลา serialize/บีบอัดของ API ที่ส่ง JSON ขนาดใหญ่
+
+นำเข้า catalog ตัวอย่าง (database/export_items.csv) และสร้างใบเสร็จจากสินค้าใน
+catalog ลงฐานข้อมูลชั่วคราว แล้ววัดสองส่วน:
+
+- encoder: json มาตรฐาน เทียบกับ json_codec.dumps (orjson ถ้าติดตั้ง) และรูปแบบ
+  ``shape=columns`` ที่อ่านแถวเป็น tuple ไม่สร้าง dict ต่อแถว
+- HTTP (ASGI transport ของ httpx): byte ที่ส่งจริงและเวลาตอบกลับต่อ Accept-Encoding
+  (รวมเวลาคลายการบีบอัดฝั่ง client) พร้อมเวลาส่งข้อมูลโดยประมาณที่ความเร็วเครือข่าย
+  ``--mbps``
+
+    uv sync --extra fast
+    uv run python benchmarks/bench_compression.py --invoices 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("ADMIN_PASSWORD", "bench")
+
+CUSTOMERS = ["บริษัท ตัวอย่างการค้า จำกัด", "ห้างหุ้นส่วนจำกัด สมบูรณ์พาณิชย์",
+             "ร้านหนังสือ ศึกษาภัณฑ์", "โรงเรียนอนุบาล บ้านสวน", "คุณสมชาย ใจดี"]
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def best_of(func, runs: int) -> float:
+    """เวลาที่เร็วที่สุด (มิลลิวินาที) จาก ``runs`` ครั้ง"""
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def seed(db, csv_path: Path, invoices: int, rng: random.Random) -> None:
+    with open(csv_path, "rb") as file:
+        success, count, message = db.import_items_from_stream(file)
+    if not success:
+        raise RuntimeError(message)
+    _, items = db.get_all_items_versioned()
+    db.get_or_create_default_seller()
+
+    batch = []
+    for i in range(invoices):
+        batch.append({
+            "customer": {"name": f"{rng.choice(CUSTOMERS)} สาขา {i % 50}",
+                         "address": "99 ถนนพหลโยธิน แขวงลาดยาว เขตจตุจักร กรุงเทพฯ 10900",
+                         "tax_id": f"{rng.randrange(10 ** 12, 10 ** 13)}"},
+            "items": [{**item, "quantity": rng.randint(1, 5)}
+                      for item in rng.sample(items, 3)],
+        })
+        if len(batch) == 1000:
+            db.save_invoices_bulk(batch)
+            batch = []
+    if batch:
+        db.save_invoices_bulk(batch)
+    print(f"Seeded {count} catalog items and {invoices} invoices from {csv_path}")
+
+
+def bench_encoders(db, json_codec, runs: int) -> None:
+    payloads = {
+        "catalog": lambda: db.get_all_items_versioned()[1],
+        "invoices.500": lambda: db.list_invoices(limit=500)["invoices"],
+        "invoices.500 columns": lambda: db.list_invoices(limit=500, shape="columns")["invoices"],
+    }
+    print(f"\nEncoder (best of {runs}, orjson={'yes' if json_codec.orjson else 'no'})")
+    print(f"{'payload':24} {'bytes':>9} {'json ms':>9} {'codec ms':>9} {'fetch+codec ms':>15}")
+    for name, load in payloads.items():
+        value = load()
+        stdlib = best_of(lambda: json.dumps(value, ensure_ascii=False,
+                                            separators=(",", ":")).encode("utf-8"), runs)
+        codec = best_of(lambda: json_codec.dumps(value), runs)
+        total = best_of(lambda: json_codec.dumps(load()), runs)
+        print(f"{name:24} {len(json_codec.dumps(value)):>9} {stdlib:>9.2f} {codec:>9.2f} "
+              f"{total:>15.2f}")
+
+
+async def bench_http(compression, runs: int, mbps: float) -> None:
+    import httpx
+    import main
+
+    urls = {
+        "/api/items": "/api/items",
+        "/api/invoices?limit=500": "/api/invoices?limit=500",
+        "... &shape=columns": "/api/invoices?limit=500&shape=columns",
+        "/api/invoices/search": "/api/invoices/search?query=สาขา&limit=200",
+    }
+    encodings = [e for e in ENCODINGS if e != "br" or compression.brotli is not None]
+
+    transport = httpx.ASGITransport(app=main.app)
+    cookies = {"invoice_auth": main.SESSION_TOKENS.issue()}
+    print(f"\nHTTP (median of {runs}, transfer time at {mbps:g} Mbit/s)")
+    print(f"{'endpoint':26} {'encoding':>8} {'bytes':>9} {'response ms':>12} "
+          f"{'transfer ms':>12} {'total ms':>9}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies=cookies, timeout=None) as client:
+        for label, url in urls.items():
+            for encoding in encodings:
+                headers = {"Accept-Encoding": encoding}
+                latencies = []
+                size = 0
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    response = await client.get(url, headers=headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{url}: {response.status_code}")
+                    size = response.num_bytes_downloaded
+                response_ms = statistics.median(latencies)
+                transfer = size * 8 / (mbps * 1000)
+                print(f"{label:26} {encoding:>8} {size:>9} {response_ms:>12.2f} "
+                      f"{transfer:>12.2f} {response_ms + transfer:>9.2f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="วัดขนาด response และเวลา JSON/บีบอัด")
+    parser.add_argument("--csv", type=Path, default=ROOT / "database" / "export_items.csv")
+    parser.add_argument("--invoices", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--mbps", type=float, default=20.0,
+                        help="ความเร็วเครือข่ายสำหรับคำนวณเวลาส่งข้อมูล")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import compression
+    import database as db
+    import json_codec
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db.configure_database(os.path.join(workdir, "bench.db"))
+        seed(db, args.csv, args.invoices, random.Random(args.seed))
+        bench_encoders(db, json_codec, args.runs)
+        asyncio.run(bench_http(compression, args.runs, args.mbps))
+        db.close_database()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""วัด latency ของ /api/items ระหว่างที่มีการอัปโหลด CSV สินค้าพร้อมกัน
+
+รันแอปในโปรเซสเดียวกันผ่าน ASGI transport ของ httpx (event loop เดียวเหมือน
+uvicorn worker หนึ่งตัว) ยิง /api/items ต่อเนื่อง แล้ววัด p50/p99 สองรอบ:
+ไม่มีงานอื่น และระหว่างอัปโหลด CSV ขนาดใหญ่ซ้ำๆ
+
+    python benchmarks/bench_items_during_upload.py --rows 200000 --requests 300
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+HEADER = "Handle,SKU,Name,Category,Price [okbooks]\n"
+
+
+def build_csv(rows: int) -> bytes:
+    buffer = io.StringIO()
+    buffer.write(HEADER)
+    for i in range(rows):
+        buffer.write(f"item-{i},{100000 + i},สินค้าทดสอบ หมายเลข {i},หนังสือ,{(i % 500) + 1}.00\n")
+    return buffer.getvalue().encode("utf-8")
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def measure_items(client, count: int):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        response = await client.get("/api/items")
+        latencies.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return latencies
+
+
+async def upload_loop(client, payload: bytes, stop: asyncio.Event) -> int:
+    uploads = 0
+    while not stop.is_set():
+        files = {"file": ("items.csv", payload, "text/csv")}
+        response = await client.post("/api/items/upload", files=files)
+        response.raise_for_status()
+        uploads += 1
+    return uploads
+
+
+def report(label: str, latencies) -> None:
+    print(f"{label:<16} n={len(latencies):<5} "
+          f"p50={statistics.median(latencies):8.2f}ms "
+          f"p99={percentile(latencies, 99):8.2f}ms "
+          f"max={max(latencies):8.2f}ms")
+
+
+async def run(args) -> None:
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    cookies = {"invoice_auth": main.SESSION_TOKENS.issue()}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies=cookies, timeout=None) as client:
+        # catalog เริ่มต้นขนาดเท่ากับไฟล์ตัวอย่าง
+        sample = (ROOT / "database" / "export_items.csv").read_bytes()
+        await client.post("/api/items/upload",
+                          files={"file": ("export_items.csv", sample, "text/csv")})
+
+        report("idle", await measure_items(client, args.requests))
+
+        payload = build_csv(args.rows)
+        stop = asyncio.Event()
+        uploader = asyncio.create_task(upload_loop(client, payload, stop))
+        await asyncio.sleep(0.05)
+        latencies = await measure_items(client, args.requests)
+        stop.set()
+        uploads = await uploader
+        report("during upload", latencies)
+        print(f"{uploads} uploads of {args.rows} rows ({len(payload) / 1e6:.1f} MB) completed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_PATH"] = os.path.join(tmp, "bench.db")
+        os.environ.setdefault("ADMIN_PASSWORD", "bench")
+        os.chdir(ROOT)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""วัดเวลาเริ่มแอป: จนตอบ /health ได้ และจนนำเข้า catalog เริ่มต้นเสร็จ
+
+รัน ``uvicorn main:app`` ในโฟลเดอร์ชั่วคราวที่มี export_items.csv ขนาด ``--rows``
+สองกรณี: ฐานข้อมูลว่าง (cold start ครั้งแรก ต้อง migrate และนำเข้า CSV) และ
+เริ่มใหม่บนฐานข้อมูลเดิม (เช่น autoscaler เพิ่ม instance) รายงานค่ามัธยฐาน
+
+    python benchmarks/bench_startup.py --rows 100000 --runs 5
+
+``--app-dir`` ชี้ไปยัง checkout อื่น (เช่น git worktree ของ commit ก่อนหน้า)
+เพื่อเปรียบเทียบ โค้ดที่ไม่มี /health ถือว่าพร้อมเมื่อตอบคำขอแรก
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEADER = "Handle,SKU,Name,Category,Price [okbooks]\n"
+
+
+def write_catalog(path: Path, rows: int) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(HEADER)
+        for i in range(rows):
+            file.write(f"item-{i},{100000 + i},สินค้าทดสอบ หมายเลข {i},หนังสือ,{(i % 500) + 1}.00\n")
+
+
+def prepare_workdir(workdir: Path, app_dir: Path, rows: int) -> None:
+    for name in ("static", "templates"):
+        (workdir / name).symlink_to(app_dir / name)
+    (workdir / "database").mkdir()
+    write_catalog(workdir / "database" / "export_items.csv", rows)
+
+
+def start_once(app_dir: Path, workdir: Path, database_path: str, port: int):
+    """เริ่มเซิร์ฟเวอร์หนึ่งครั้ง คืนค่า (วินาทีจนพร้อม, วินาทีจน catalog พร้อม)"""
+    env = dict(os.environ, DATABASE_PATH=database_path, ADMIN_PASSWORD="bench",
+               PYTHONPATH=str(app_dir), CUSTOMERS_CSV_PATH=str(workdir / "customer.csv"))
+    url = f"http://127.0.0.1:{port}/health"
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    ready = catalog = None
+    try:
+        while catalog is None:
+            if server.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            if time.perf_counter() - started > 300:
+                raise RuntimeError("server did not start")
+            try:
+                response = httpx.get(url, timeout=1)
+            except httpx.HTTPError:
+                time.sleep(0.01)
+                continue
+
+            now = time.perf_counter() - started
+            if ready is None:
+                ready = now
+            if response.status_code != 200:
+                # โค้ดเดิม: นำเข้า catalog เสร็จก่อนรับคำขอ
+                catalog = ready
+            elif response.json().get("bootstrap", {}).get("state") in ("done", "failed"):
+                catalog = now
+            else:
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return ready, catalog
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000,
+                        help="rows in the bootstrap export_items.csv")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8777)
+    parser.add_argument("--app-dir", type=Path, default=ROOT)
+    args = parser.parse_args()
+
+    app_dir = args.app_dir.resolve()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp) / "app"
+        workdir.mkdir()
+        prepare_workdir(workdir, app_dir, args.rows)
+
+        results = {"empty database": [], "existing database": []}
+        for run in range(args.runs):
+            database_dir = Path(tmp) / f"db{run}"
+            shutil.rmtree(database_dir, ignore_errors=True)
+            database_dir.mkdir()
+            database_path = str(database_dir / "invoices.db")
+            results["empty database"].append(
+                start_once(app_dir, workdir, database_path, args.port))
+            results["existing database"].append(
+                start_once(app_dir, workdir, database_path, args.port))
+
+    print(f"{app_dir} ({args.rows} catalog rows, median of {args.runs} runs)")
+    for label, samples in results.items():
+        ready = statistics.median(sample[0] for sample in samples)
+        catalog = statistics.median(sample[1] for sample in samples)
+        print(f"{label:<18} ready={ready * 1000:7.0f}ms  catalog={catalog * 1000:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
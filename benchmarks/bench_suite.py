@@ -0,0 +1,426 @@
+"""ชุด benchmark ของเส้นทางหลัก (บันทึก/ดึง/ค้นหาใบเสร็จ, นำเข้าสินค้า, /api/items, render)
+
+สร้างฐานข้อมูลชั่วคราวพร้อม catalog และประวัติใบเสร็จสังเคราะห์ตามขนาด ``--scale``
+(จำนวนรายการสินค้าในใบเสร็จ 10k ถึง 10m แถว) วัดทั้งแบบเรียกฟังก์ชันโดยตรงและผ่าน
+HTTP (ASGI transport ของ httpx พร้อมกัน ``--concurrency`` คำขอ) แล้วเขียนผลเป็น JSON
+เทียบกับผลครั้งก่อนได้ (ops/s ลดลงเกิน ``--threshold`` % ถือเป็น regression) และตรวจว่า
+การจับเวลา query ของ metrics เพิ่มเวลาไม่เกิน INSTRUMENTATION_BUDGET_US ต่อ query
+
+    python benchmarks/bench_suite.py run --scale 100k -o before.json
+    python benchmarks/bench_suite.py run --scale 100k -o after.json --baseline before.json
+    python benchmarks/bench_suite.py compare before.json after.json
+
+ฐานข้อมูลที่ seed แล้วเก็บไว้ใน ``--cache-dir`` (ค่าเริ่มต้น .bench-cache) และถูกคัดลอก
+ก่อนวัดทุกครั้ง ผลจึงเริ่มจากข้อมูลชุดเดียวกันเสมอ
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# ขนาด: (จำนวนสินค้าใน catalog, จำนวนใบเสร็จ) รายการต่อใบเสร็จ = LINES_PER_INVOICE
+SCALES = {
+    "10k": (1_000, 2_000),
+    "100k": (10_000, 20_000),
+    "1m": (50_000, 200_000),
+    "10m": (100_000, 2_000_000),
+}
+LINES_PER_INVOICE = 5
+CUSTOMERS = 5_000
+HISTORY_DAYS = 3 * 365
+
+# งบเวลาที่ metrics.InstrumentedConnection เพิ่มต่อ query (execute + fetch) ไมโครวินาที
+INSTRUMENTATION_BUDGET_US = 5.0
+
+# เปลี่ยนเมื่อวิธี seed เปลี่ยน (ฐานข้อมูลใน cache เดิมจะไม่ถูกใช้)
+SEED_FORMAT = 1
+
+WORDS = ["หนังสือ", "ปากกา", "สมุด", "กระดาษ", "ดินสอ", "ยางลบ", "แฟ้ม", "กาว",
+         "notebook", "marker", "ruler", "stapler"]
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, wall: float, ops: int = None) -> dict:
+    ops = len(latencies) if ops is None else ops
+    return {
+        "ops": ops,
+        "seconds": round(wall, 4),
+        "ops_per_sec": round(ops / wall, 1) if wall > 0 else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def measure(func, args_list) -> dict:
+    """เรียก func กับอาร์กิวเมนต์แต่ละชุด จับเวลาทีละครั้ง"""
+    latencies = []
+    started = time.perf_counter()
+    for args in args_list:
+        call_started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# ==================== Seed Functions ====================
+
+def catalog_csv(count: int, rng: random.Random) -> str:
+    buffer = io.StringIO()
+    buffer.write("Handle,SKU,Name,Category,Price [okbooks]\n")
+    for i in range(count):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} รุ่น {i}"
+        buffer.write(f"item-{i},{100000 + i},{name},เครื่องเขียน,{rng.randint(5, 2000)}.00\n")
+    return buffer.getvalue()
+
+
+def customer_names():
+    return [f"ลูกค้า {WORDS[i % len(WORDS)]} {i}" for i in range(CUSTOMERS)]
+
+
+def seed_database(db, scale: str, seed: int) -> None:
+    """สร้าง catalog และใบเสร็จย้อนหลัง HISTORY_DAYS วัน เรียงตามวันที่"""
+    catalog_size, invoice_count = SCALES[scale]
+    rng = random.Random(seed)
+
+    db.get_or_create_default_seller()
+    db.import_items_from_csv(catalog_csv(catalog_size, rng))
+    _, items = db.get_all_items_versioned()
+    customers = customer_names()
+
+    first_day = date.today() - timedelta(days=HISTORY_DAYS)
+    batch = 10_000
+    for offset in range(0, invoice_count, batch):
+        with db.write_transaction() as conn:
+            cursor = conn.cursor()
+            for index in range(offset, min(offset + batch, invoice_count)):
+                day = first_day + timedelta(days=index * HISTORY_DAYS // invoice_count)
+                now = datetime(day.year, day.month, day.day, 12, 0)
+                year = day.year + 543
+                running = db.allocate_running_numbers(conn, year)
+                lines = [
+                    {**item, "quantity": rng.randint(1, 5)}
+                    for item in rng.sample(items, LINES_PER_INVOICE)
+                ]
+                name = customers[rng.randrange(len(customers))]
+                rows = db._item_rows(None, lines)
+                invoice_id = db._insert_invoice(
+                    cursor, db.format_invoice_number(running, year), running, year, now,
+                    {"name": name, "address": "กรุงเทพฯ", "tax_id": ""}, 1,
+                    db._rows_total(rows),
+                )
+                db._insert_invoice_items(cursor, [(invoice_id, *row[1:]) for row in rows])
+        print(f"  seeded {min(offset + batch, invoice_count)}/{invoice_count} invoices",
+              file=sys.stderr)
+
+    db.catch_up_sales_summaries()
+    db.checkpoint_wal()
+
+
+def sample_invoice_numbers(db, rng: random.Random, count: int):
+    """สุ่มเลขที่ใบเสร็จที่มีอยู่ (สุ่มจาก id ด้วย rng ที่กำหนด seed ผลจึงซ้ำได้)"""
+    with db.get_read_connection() as conn:
+        max_id = conn.execute("SELECT MAX(id) FROM invoices").fetchone()[0] or 0
+        ids = [rng.randint(1, max_id) for _ in range(min(count, max_id))]
+        rows = conn.execute(
+            "SELECT invoice_number FROM invoices WHERE id IN "
+            f"({','.join('?' * len(ids))})", ids
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def prepare_database(db, scale: str, seed: int, cache_dir: Path, target: str) -> None:
+    """คัดลอกฐานข้อมูลที่ seed แล้วจาก cache (seed ใหม่ถ้ายังไม่มี) ไปยัง target"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cached = cache_dir / f"seed-{scale}-s{seed}-f{SEED_FORMAT}-v{db.SCHEMA_VERSION}.db"
+    if not cached.exists():
+        print(f"Seeding {scale} database (cached at {cached})", file=sys.stderr)
+        partial = str(cached) + ".partial"
+        for suffix in ("", "-wal", "-shm"):
+            Path(partial + suffix).unlink(missing_ok=True)
+        db.configure_database(partial)
+        seed_database(db, scale, seed)
+        db.close_database()
+        os.replace(partial, cached)
+    shutil.copyfile(cached, target)
+    db.configure_database(target)
+
+
+# ==================== Benchmark Functions ====================
+
+def bench_in_process(db, rng: random.Random, ops: int) -> dict:
+    from catalog_cache import build_snapshot
+    from invoice_render import InvoiceRenderCache, invoice_context
+    from jinja2 import Environment, FileSystemLoader
+
+    results = {}
+    _, items = db.get_all_items_versioned()
+    numbers = sample_invoice_numbers(db, rng, ops * 4)
+    customers = customer_names()
+
+    def new_invoice():
+        return ({"name": rng.choice(customers), "address": "กรุงเทพฯ", "tax_id": ""},
+                [{**item, "quantity": rng.randint(1, 5)}
+                 for item in rng.sample(items, LINES_PER_INVOICE)])
+
+    results["save_invoice"] = measure(db.save_invoice, [new_invoice() for _ in range(ops)])
+    results["get_invoice_by_number"] = measure(
+        db.get_invoice_by_number, [(rng.choice(numbers),) for _ in range(ops * 4)])
+    if hasattr(db, "get_invoices_by_numbers"):
+        batches = [numbers[i:i + 50] for i in range(0, len(numbers), 50)]
+        result = measure(db.get_invoices_by_numbers, [(batch,) for batch in batches])
+        result["invoices_per_sec"] = round(len(numbers) / result["seconds"], 1)
+        results["get_invoices_by_numbers.50"] = result
+    results["search_invoices.fts"] = measure(
+        db.search_invoices, [(rng.choice(customers)[-8:],) for _ in range(ops)])
+    results["search_invoices.short"] = measure(
+        db.search_invoices, [(str(rng.randint(10, 99)),) for _ in range(max(20, ops // 5))])
+
+    csv_content = catalog_csv(len(items), random.Random(1))
+    runs = 3
+    result = measure(db.import_items_from_csv, [(csv_content,)] * runs)
+    result["rows_per_sec"] = round(len(items) * runs / result["seconds"], 1)
+    results["import_items_from_csv"] = result
+
+    version, catalog = db.get_all_items_versioned()
+    results["items_serialization"] = measure(build_snapshot, [(version, catalog)] * 5)
+
+    env = Environment(loader=FileSystemLoader(str(ROOT / "templates")), autoescape=True)
+    cache = InvoiceRenderCache(env)
+    for size in (LINES_PER_INVOICE, 50):
+        invoice = db.get_invoice_by_number(numbers[0])
+        invoice["items"] = (invoice["items"] * size)[:size]
+        context = invoice_context(invoice)
+        results[f"invoice_render.{size}_items"] = measure(cache.render, [(context,)] * ops)
+    return results
+
+
+def bench_instrumentation(path: str, rng: random.Random, ops: int) -> dict:
+    """เทียบ query เดียวกันบนการเชื่อมต่อปกติและ metrics.InstrumentedConnection
+
+    point lookup ที่เร็วที่สุดทำให้ส่วนต่างเป็นค่าใช้จ่ายของการจับเวลาเกือบทั้งหมด
+    วัดสลับกันหลายรอบแล้วใช้รอบที่เร็วที่สุดของแต่ละแบบเพื่อลดสัญญาณรบกวน
+    """
+    import metrics
+
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    connections = {
+        "plain": sqlite3.connect(uri, uri=True),
+        "instrumented": sqlite3.connect(uri, uri=True, factory=metrics.InstrumentedConnection),
+    }
+    max_id = connections["plain"].execute("SELECT MAX(id) FROM invoices").fetchone()[0]
+    ids = [(rng.randint(1, max_id),) for _ in range(ops * 20)]
+    sql = "SELECT id, invoice_number, total_satang FROM invoices WHERE id = ?"
+
+    best = {}
+    try:
+        for _ in range(5):
+            for name, conn in connections.items():
+                result = measure(lambda invoice_id: conn.execute(sql, (invoice_id,)).fetchone(),
+                                 ids)
+                if name not in best or result["seconds"] < best[name]["seconds"]:
+                    best[name] = result
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+    overhead = (best["instrumented"]["seconds"] - best["plain"]["seconds"]) / len(ids)
+    best["instrumented"]["overhead_us"] = round(overhead * 1_000_000, 3)
+    best["instrumented"]["budget_us"] = INSTRUMENTATION_BUDGET_US
+    return {f"db_query.{name}": result for name, result in best.items()}
+
+
+async def bench_http(db, rng: random.Random, ops: int, concurrency: int) -> dict:
+    import httpx
+    import main
+
+    numbers = sample_invoice_numbers(db, rng, ops * 4)
+    customers = customer_names()
+    _, items = db.get_all_items_versioned()
+
+    async def run(client, make_request, count):
+        latencies = []
+        remaining = iter(range(count))
+
+        async def worker():
+            for _ in remaining:
+                method, url, kwargs = make_request()
+                started = time.perf_counter()
+                response = await client.request(method, url, **kwargs)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{method} {url}: {response.status_code}")
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, time.perf_counter() - started)
+
+    def view_request():
+        number, year = rng.choice(numbers).split("/")
+        return "GET", "/api/invoices/view", {"params": {"number": number, "year": year}}
+
+    def save_request():
+        lines = [{**item, "quantity": 1} for item in rng.sample(items, LINES_PER_INVOICE)]
+        return "POST", "/api/generate-invoice", {
+            "json": {"customer": {"name": rng.choice(customers), "address": "-"},
+                     "items": lines}}
+
+    transport = httpx.ASGITransport(app=main.app)
+    cookies = {"invoice_auth": main.SESSION_TOKENS.issue()}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                 cookies=cookies, timeout=None) as client:
+        return {
+            "http.items": await run(
+                client, lambda: ("GET", "/api/items", {}), max(20, ops // 5)),
+            "http.invoice_view": await run(client, view_request, ops * 2),
+            "http.search": await run(
+                client, lambda: ("GET", "/api/invoices/search",
+                                 {"params": {"query": rng.choice(customers)[-8:]}}), ops),
+            "http.generate_invoice": await run(client, save_request, ops),
+        }
+
+
+def environment_info(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "ops": args.ops,
+        "concurrency": args.concurrency,
+        "metrics_enabled": os.environ.get("METRICS_ENABLED", "1") != "0",
+    }
+
+
+# ==================== Compare Functions ====================
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """พิมพ์ตารางเปรียบเทียบ คืนค่าจำนวน benchmark ที่ช้าลงเกิน threshold %"""
+    print(f"baseline {baseline['meta'].get('commit')} ({baseline['meta']['scale']})  ->  "
+          f"current {current['meta'].get('commit')} ({current['meta']['scale']})")
+    print(f"{'benchmark':<28}{'base ops/s':>12}{'ops/s':>12}{'change':>9}"
+          f"{'base p99':>11}{'p99':>11}")
+    regressions = 0
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>12}{result['ops_per_sec']:>12.1f}{'new':>9}")
+            continue
+        change = (result["ops_per_sec"] / base["ops_per_sec"] - 1) * 100 \
+            if base["ops_per_sec"] else 0.0
+        flag = ""
+        if change < -threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        elif change > threshold:
+            flag = "  faster"
+        print(f"{name:<28}{base['ops_per_sec']:>12.1f}{result['ops_per_sec']:>12.1f}"
+              f"{change:>+8.1f}%{base['p99_ms']:>9.2f}ms{result['p99_ms']:>9.2f}ms{flag}")
+    return regressions
+
+
+def run(args) -> int:
+    rng = random.Random(args.seed)
+    os.environ.setdefault("ADMIN_PASSWORD", "bench")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        target = os.path.join(tmp, "bench.db")
+        os.environ["DATABASE_PATH"] = target
+        os.chdir(ROOT)
+        import database as db
+
+        prepare_database(db, args.scale, args.seed, Path(args.cache_dir), target)
+        results = bench_in_process(db, rng, args.ops)
+        results.update(bench_instrumentation(target, rng, args.ops))
+        if not args.skip_http:
+            results.update(asyncio.run(bench_http(db, rng, args.ops, args.concurrency)))
+        db.close_database()
+
+    report = {"meta": environment_info(args), "results": results}
+    for name, result in results.items():
+        print(f"{name:<28}{result['ops_per_sec']:>12.1f} ops/s  p50={result['p50_ms']:.3f}ms  "
+              f"p99={result['p99_ms']:.3f}ms")
+
+    instrumented = results["db_query.instrumented"]
+    over_budget = instrumented["overhead_us"] > instrumented["budget_us"]
+    print(f"metrics overhead: {instrumented['overhead_us']:.3f} us/query "
+          f"(budget {instrumented['budget_us']:g} us)" + ("  OVER BUDGET" if over_budget else ""))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        print()
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 1 if over_budget else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, run benchmarks and write JSON")
+    run_parser.add_argument("--scale", choices=SCALES, default="100k")
+    run_parser.add_argument("--ops", type=int, default=500,
+                            help="operations per benchmark (some use a multiple)")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--cache-dir", default=str(ROOT / ".bench-cache"))
+    run_parser.add_argument("--skip-http", action="store_true")
+    run_parser.add_argument("-o", "--output", help="JSON result file")
+    run_parser.add_argument("--baseline", help="JSON result to compare against")
+    run_parser.add_argument("--threshold", type=float, default=10.0,
+                            help="percent drop in ops/s reported as a regression")
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        return run(args)
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.current, encoding="utf-8") as file:
+        current = json.load(file)
+    return 1 if compare(baseline, current, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
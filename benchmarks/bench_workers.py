@@ -0,0 +1,200 @@
+"""Load test: throughput ของแอปเมื่อรันหลาย worker process บนไฟล์ SQLite เดียวกัน
+
+เริ่มเซิร์ฟเวอร์จริงด้วย ``serve.py --workers N`` สำหรับแต่ละค่า N แล้วยิงคำขอ
+จาก client หลาย process พร้อมกัน (ค้นหาสินค้า, ดูใบเสร็จ, รายการใบเสร็จ,
+รายงานรายเดือน และสร้างใบเสร็จตามสัดส่วน ``--write-ratio``) รายงาน req/s,
+p50/p99 และอัตราเร่งเทียบกับ 1 worker
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --duration 10 --clients 4
+
+ควรรันบนเครื่องที่มี CPU อย่างน้อยเท่ากับจำนวน worker + client process
+การเขียนทุก worker ใช้ล็อกเดียวกันของ SQLite การเขียนจึงไม่เพิ่มตามจำนวน worker
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PASSWORD = "bench"
+SEARCH_TERMS = ["000", "หนังสือ", "11", "ค่า", "บาท", "ชิ้น"]
+ITEMS = [
+    {'sku': '11530', 'name': '000 3 ชิ้น 100 บาท', 'price': 100.0, 'quantity': 1},
+    {'sku': '11579', 'name': '000 ค่าห่อของขวัญ 10 บาท', 'price': 10.0, 'quantity': 2},
+]
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def seed_database(database_path: str, invoices: int):
+    """สร้างใบเสร็จตัวอย่าง คืนค่ารายการ (เลขรัน, ปี) สำหรับดูใบเสร็จ"""
+    os.environ["DATABASE_PATH"] = database_path
+    import database as db
+
+    db.get_or_create_default_seller()
+    payload = [
+        {"customer": {"name": f"ลูกค้า {i % 500}", "address": "กรุงเทพฯ", "tax_id": ""},
+         "items": ITEMS}
+        for i in range(invoices)
+    ]
+    numbers = []
+    for offset in range(0, len(payload), 1000):
+        for result in db.save_invoices_bulk(payload[offset:offset + 1000]):
+            numbers.append(tuple(result["invoice_number"].split("/")))
+    db.close_database()
+    return numbers
+
+
+async def client_loop(base_url: str, numbers, duration: float, concurrency: int,
+                      write_ratio: float):
+    import httpx
+
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        response = await client.post("/login", data={"password": PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f"login failed: {response.status_code}")
+
+        def pick_request():
+            roll = random.random()
+            if roll < write_ratio:
+                return "POST", "/api/generate-invoice", {
+                    "json": {"customer": {"name": "ลูกค้า load test", "address": "-"},
+                             "items": ITEMS}}
+            roll = random.random()
+            if roll < 0.4:
+                return "GET", "/api/items/search", {
+                    "params": {"q": random.choice(SEARCH_TERMS)}}
+            if roll < 0.7:
+                number, year = random.choice(numbers)
+                return "GET", "/api/invoices/view", {
+                    "params": {"number": number, "year": year}}
+            if roll < 0.9:
+                return "GET", "/api/invoices", {"params": {"limit": 20}}
+            return "GET", "/api/reports/monthly", {}
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                method, url, kwargs = pick_request()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def run_client(args):
+    return asyncio.run(client_loop(*args))
+
+
+def wait_until_ready(base_url: str, process, timeout: float = 60) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if httpx.get(base_url + "/login", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def measure(workers: int, port: int, env, numbers, args):
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(base_url, server)
+        # อุ่นเครื่องให้ทุก worker สร้างแคชก่อนจับเวลา
+        run_client((base_url, numbers, 1.0, args.concurrency, 0.0))
+
+        jobs = [(base_url, numbers, args.duration, args.concurrency, args.write_ratio)
+                for _ in range(args.clients)]
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(run_client, jobs)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = [value for samples, _ in results for value in samples]
+    errors = sum(count for _, count in results)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": len(latencies) / args.duration,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p99": percentile(latencies, 99) if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4",
+                        help="comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1,
+                        help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="in-flight requests per client process")
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--invoices", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    counts = [int(value) for value in args.workers.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, "bench.db")
+        numbers = seed_database(database_path, args.invoices)
+        env = dict(os.environ, DATABASE_PATH=database_path, ADMIN_PASSWORD=PASSWORD,
+                   LOGIN_MAX_ATTEMPTS="1000000")
+
+        print(f"{os.cpu_count()} CPUs, {args.clients} client processes x "
+              f"{args.concurrency} in flight, {args.duration:.0f}s per run, "
+              f"write ratio {args.write_ratio}")
+        baseline = None
+        for workers in counts:
+            result = measure(workers, args.port, env, numbers, args)
+            baseline = baseline or result["rps"]
+            speedup = result["rps"] / baseline if baseline else 0.0
+            print(f"workers={workers:<3} {result['rps']:8.0f} req/s  "
+                  f"p50={result['p50']:7.2f}ms  p99={result['p99']:7.2f}ms  "
+                  f"errors={result['errors']:<4} "
+                  f"speedup={speedup:4.2f}x  efficiency={speedup / workers:4.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Stress test การจองเลขรันใบเสร็จพร้อมกันหลาย process/thread
+
+สร้างฐานข้อมูลชั่วคราว ให้หลาย process แต่ละ process มีหลาย thread เรียก
+``database.save_invoice`` พร้อมกัน แล้วตรวจว่าเลขรันของปีเรียงต่อเนื่อง
+ตั้งแต่ 1 ไม่มีเลขซ้ำ ไม่มีช่องว่าง และไม่มีการบันทึกที่ล้มเหลว
+
+    python benchmarks/stress_invoice_numbers.py --processes 8 --threads 4 --per-thread 100
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+ITEMS = [
+    {'sku': '11530', 'name': '000 3 ชิ้น 100 บาท', 'price': 100.0, 'quantity': 1},
+    {'sku': '11579', 'name': '000 ค่าห่อของขวัญ 10 บาท', 'price': 10.0, 'quantity': 2},
+]
+
+
+def worker(database_path: str, threads: int, per_thread: int, failures) -> None:
+    os.environ["DATABASE_PATH"] = database_path
+    import database as db
+
+    def run(thread_no: int) -> None:
+        for i in range(per_thread):
+            customer = {'name': f'ลูกค้า {os.getpid()}-{thread_no}-{i}', 'address': 'กรุงเทพฯ'}
+            if db.save_invoice(customer, ITEMS) is None:
+                with failures.get_lock():
+                    failures.value += 1
+
+    pool = [threading.Thread(target=run, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--per-thread", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, "stress.db")
+
+        # สร้าง schema และผู้ขายก่อนแยก process
+        init = multiprocessing.get_context("spawn").Process(
+            target=_init_database, args=(database_path,)
+        )
+        init.start()
+        init.join()
+
+        failures = multiprocessing.Value("i", 0)
+        expected = args.processes * args.threads * args.per_thread
+        started = time.perf_counter()
+        procs = [
+            multiprocessing.Process(
+                target=worker,
+                args=(database_path, args.threads, args.per_thread, failures),
+            )
+            for _ in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - started
+
+        conn = sqlite3.connect(database_path)
+        rows = conn.execute("""
+            SELECT buddhist_year, running_number FROM invoices
+            ORDER BY buddhist_year, running_number
+        """).fetchall()
+        sequences = dict(conn.execute(
+            "SELECT buddhist_year, last_number FROM invoice_sequences"
+        ).fetchall())
+        conn.close()
+
+    ok = True
+    by_year = {}
+    for year, number in rows:
+        by_year.setdefault(year, []).append(number)
+    for year, numbers in by_year.items():
+        if numbers != list(range(1, len(numbers) + 1)):
+            duplicates = len(numbers) - len(set(numbers))
+            print(f"FAIL {year}: {duplicates} duplicates, numbers not contiguous")
+            ok = False
+        if sequences.get(year) != len(numbers):
+            print(f"FAIL {year}: sequence at {sequences.get(year)}, {len(numbers)} invoices")
+            ok = False
+
+    if len(rows) != expected or failures.value:
+        print(f"FAIL saved {len(rows)}/{expected} invoices, {failures.value} failures")
+        ok = False
+
+    print(f"{len(rows)} invoices from {args.processes} processes x {args.threads} threads "
+          f"in {elapsed:.2f}s ({len(rows) / elapsed:.0f} invoices/s)")
+    print("OK: no gaps, no duplicates" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+def _init_database(database_path: str) -> None:
+    os.environ["DATABASE_PATH"] = database_path
+    import database as db
+    db.get_or_create_default_seller()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""บีบอัด response ตาม Accept-Encoding (brotli หรือ gzip)
+
+JSON ของ API ส่วนใหญ่เป็นข้อความภาษาไทย (3 byte ต่อตัวอักษรใน UTF-8) บีบอัดได้
+5-7 เท่า ใช้ brotli เมื่อติดตั้งไว้ (``uv sync --extra fast``) และ browser รองรับ
+นอกนั้นใช้ gzip response ที่เล็กกว่า COMPRESS_MIN_SIZE หรือไม่ใช่ข้อความ (PDF, ZIP)
+ส่งตามเดิม response ที่ตั้ง Content-Encoding เองแล้ว (เช่น /api/items ที่บีบอัด
+ไว้ล่วงหน้า) ไม่ถูกบีบอัดซ้ำ
+"""
+import gzip
+import os
+import zlib
+from typing import Optional, Tuple
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ขนาด body ขั้นต่ำ (byte) ที่บีบอัด ต่ำกว่านี้ประหยัดได้น้อยกว่าเวลาที่เสีย
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+
+# ระดับการบีบอัดของ response ที่สร้างต่อคำขอ (ค่าต่ำ = เร็วกว่า ไฟล์ใหญ่กว่า)
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+# ชนิดเนื้อหาที่บีบอัด
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/javascript",
+    "image/svg+xml", "text/",
+)
+
+
+def negotiate_encoding(accept_encoding: Optional[str],
+                       available: Tuple[str, ...] = ("br", "gzip")) -> Optional[str]:
+    """เลือก encoding จาก header Accept-Encoding
+
+    Args:
+        accept_encoding: ค่า header Accept-Encoding
+        available: encoding ที่ผู้เรียกส่งได้ (เช่น ``("gzip",)`` เมื่อมีแต่ body
+            gzip ที่บีบอัดไว้ล่วงหน้า) br ใช้ได้เมื่อติดตั้ง brotli เท่านั้น
+
+    Returns:
+        ``"br"``, ``"gzip"`` หรือ None (ส่งแบบไม่บีบอัด) เมื่อ q เท่ากันเลือก br
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        name = name.strip()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    wildcard = weights.get("*", 0.0)
+    candidates = [name for name in available if name != "br" or brotli is not None]
+    best, best_q = None, 0.0
+    for name in candidates:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(body: bytes, encoding: str,
+             gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY) -> bytes:
+    """บีบอัด body ทั้งก้อนด้วย ``br`` หรือ ``gzip``"""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class _StreamCompressor:
+    """บีบอัด body ที่ส่งเป็นหลายส่วน (StreamingResponse เช่น export CSV/NDJSON)"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.process, self.finish = compressor.process, compressor.finish
+        else:
+            # wbits 31 = zlib แบบมี header/trailer ของ gzip
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.process, self.finish = compressor.compress, compressor.flush
+
+
+def _is_compressible(headers) -> bool:
+    content_type = ""
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value.decode("latin-1").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """ASGI middleware บีบอัด response ตาม Accept-Encoding"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        stream: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                if _is_compressible(message.get("headers", ())):
+                    # รอดูขนาด body ส่วนแรกก่อนตัดสินใจ
+                    start = message
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            if message_type != "http.response.body":
+                # เช่น http.response.pathsend ของ FileResponse ส่งตามเดิม
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if stream is None:
+                if not more_body:
+                    # body ก้อนเดียว: บีบอัดทั้งก้อนเมื่อใหญ่พอ
+                    passthrough = True
+                    if len(body) < self.minimum_size:
+                        await send(start)
+                        await send(message)
+                        return
+                    compressed = compress(body, encoding)
+                    _count_bytes(encoding, len(body), len(compressed))
+                    await send(_compressed_start(start, encoding, len(compressed)))
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                stream = _StreamCompressor(encoding)
+                await send(_compressed_start(start, encoding, None))
+
+            compressed = stream.process(body) if body else b""
+            if not more_body:
+                compressed += stream.finish()
+            _count_bytes(encoding, len(body), len(compressed))
+            if compressed or not more_body:
+                await send({"type": "http.response.body", "body": compressed,
+                            "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _compressed_start(start, encoding: str, length: Optional[int]):
+    """http.response.start พร้อม Content-Encoding (ไม่มี Content-Length เมื่อ stream)"""
+    headers = [(name, value) for name, value in start.get("headers", ())
+               if name not in (b"content-length", b"vary")]
+    vary = [value for name, value in start.get("headers", ()) if name == b"vary"]
+    vary_values = {v.strip().lower() for value in vary for v in value.split(b",")}
+    if b"accept-encoding" not in vary_values:
+        vary.append(b"Accept-Encoding")
+    headers.append((b"vary", b", ".join(vary)))
+    headers.append((b"content-encoding", encoding.encode("latin-1")))
+    if length is not None:
+        headers.append((b"content-length", str(length).encode("latin-1")))
+    return {**start, "headers": headers}
+
+
+def _count_bytes(encoding: str, raw: int, sent: int) -> None:
+    metrics.HTTP_RESPONSE_BYTES.inc_labels(raw, (encoding, "uncompressed"))
+    metrics.HTTP_RESPONSE_BYTES.inc_labels(sent, (encoding, "sent"))
@@ -1,28 +1,500 @@
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from queue import Queue, Empty
+from typing import IO, Callable, Iterator, List, Dict, Optional, Tuple
+import base64
+import functools
 import json
+import math
+import os
 
-DATABASE_PATH = "database/invoices.db"
+import metrics
+import money
+
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "database/invoices.db")
+
+# จำนวนการเชื่อมต่อสูงสุดใน pool และเวลารอสูงสุด (วินาที)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+# จำนวน statement ที่ compile แล้วเก็บไว้ต่อการเชื่อมต่อ (sqlite3 ค่าเริ่มต้น 128)
+# คำค้นหา/ตัวกรองแต่ละแบบสร้างข้อความ SQL ต่างกัน จึงเผื่อให้ query หลักไม่ถูกไล่ออก
+DB_CACHED_STATEMENTS = int(os.environ.get("DB_CACHED_STATEMENTS", "256"))
+
+# PRAGMA ที่ตั้งค่าครั้งเดียวตอนเปิดการเชื่อมต่อ
+CONNECTION_PRAGMAS = [
+    "PRAGMA busy_timeout = 5000",
+]
+
+# โปรไฟล์การจัดเก็บข้อมูล เลือกด้วย DB_STORAGE_PROFILE
+#   wal     - WAL + synchronous NORMAL อ่านและเขียนพร้อมกันได้ (ค่าเริ่มต้น)
+#   durable - WAL + synchronous FULL ปลอดภัยสูงสุดเมื่อไฟดับ แลกกับความเร็วในการเขียน
+#   legacy  - rollback journal แบบเดิม
+STORAGE_PROFILES = {
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,          # KiB (ค่าติดลบ) ต่อการเชื่อมต่อ
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,    # pages
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 64 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+        "journal_size_limit": 64 * 1024 * 1024,
+    },
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -2000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+    },
+}
+
+DB_STORAGE_PROFILE = os.environ.get("DB_STORAGE_PROFILE", "wal")
+
+# นโยบาย checkpoint: ทุกๆ N ครั้งที่คืนการเชื่อมต่อสำหรับเขียน ตรวจขนาดไฟล์ WAL
+# ถ้าเกิน DB_WAL_MAX_BYTES ให้ checkpoint แบบ TRUNCATE เพื่อไม่ให้ไฟล์โตไม่จำกัด
+DB_CHECKPOINT_INTERVAL = int(os.environ.get("DB_CHECKPOINT_INTERVAL", "200"))
+DB_WAL_MAX_BYTES = int(os.environ.get("DB_WAL_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# โฟลเดอร์ของไฟล์ใบเสร็จปีที่ปิดแล้ว (invoices_2567.db, ...) ค่าว่าง = โฟลเดอร์เดียวกับ DATABASE_PATH
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "")
+
+# ขนาด memory-map (byte) ต่อไฟล์ archive ต่อการเชื่อมต่อ ไฟล์ไม่เปลี่ยนแล้วจึง map ได้ทั้งไฟล์
+ARCHIVE_MMAP_SIZE = int(os.environ.get("ARCHIVE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class PoolTimeout(Exception):
+    """รอการเชื่อมต่อจาก pool นานเกินกำหนด"""
+
+
+class ImportInProgress(Exception):
+    """มีการนำเข้าสินค้ากำลังทำอยู่ (อาจเป็นของ worker อื่น)"""
+
+
+def get_storage_profile(name: Optional[str] = None) -> Dict:
+    """ดึงค่าโปรไฟล์การจัดเก็บข้อมูล"""
+    name = name or DB_STORAGE_PROFILE
+    if name not in STORAGE_PROFILES:
+        raise ValueError(
+            f"Unknown DB_STORAGE_PROFILE '{name}', "
+            f"expected one of {', '.join(STORAGE_PROFILES)}"
+        )
+    return STORAGE_PROFILES[name]
+
+
+def build_pragmas(profile: Dict, writer: bool) -> List[str]:
+    """สร้างรายการ PRAGMA สำหรับการเชื่อมต่อตามโปรไฟล์"""
+    pragmas = list(CONNECTION_PRAGMAS)
+    for key in ("synchronous", "cache_size", "mmap_size", "temp_store"):
+        if key in profile:
+            pragmas.append(f"PRAGMA {key} = {profile[key]}")
+
+    if writer:
+        # journal_mode มีผลกับไฟล์ฐานข้อมูล ตั้งจากฝั่งเขียนเท่านั้น
+        for key in ("journal_mode", "wal_autocheckpoint", "journal_size_limit"):
+            if key in profile:
+                pragmas.append(f"PRAGMA {key} = {profile[key]}")
+    else:
+        pragmas.append("PRAGMA query_only = ON")
+    return pragmas
+
+
+def _attach_archives(conn: sqlite3.Connection, attachments: Dict[str, str]) -> None:
+    """ATTACH/DETACH ให้การเชื่อมต่อมีฐานข้อมูลตรงกับ ``attachments`` (schema -> path)"""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")
+                if row[1] not in ("main", "temp")}
+    for schema in attached - attachments.keys():
+        conn.execute(f"DETACH DATABASE {schema}")
+    for schema, path in attachments.items():
+        if schema in attached:
+            continue
+        # immutable=1: ไฟล์ไม่เปลี่ยนอีก SQLite จึงไม่ต้องล็อกหรือตรวจ WAL ทุกครั้งที่อ่าน
+        uri = Path(path).resolve().as_uri() + "?mode=ro&immutable=1"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (uri,))
+        conn.execute(f"PRAGMA {schema}.mmap_size = {ARCHIVE_MMAP_SIZE}")
+
+
+class ConnectionPool:
+    """Pool การเชื่อมต่อ SQLite แบบจำกัดจำนวน
+
+    การเชื่อมต่อถูกสร้างตามต้องการจนครบ ``max_size`` แล้วนำกลับมาใช้ซ้ำ
+    การเรียกซ้อนกันใน thread เดียวกัน (เช่น save_invoice -> get_invoice_by_id)
+    จะได้การเชื่อมต่อเดิมกลับไปโดยไม่ต้องยืมใหม่
+    """
+
+    def __init__(self, database: str, max_size: int = DB_POOL_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT,
+                 pragmas: Optional[List[str]] = None,
+                 read_only: bool = False,
+                 isolation_level: Optional[str] = ""):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = list(CONNECTION_PRAGMAS if pragmas is None else pragmas)
+        self.read_only = read_only
+        self.isolation_level = isolation_level
+        self._idle: Queue = Queue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._all: List[sqlite3.Connection] = []
+        self._closed = False
+        # ฐานข้อมูลที่ ATTACH เพิ่ม (ชื่อ schema -> path) และรุ่นของรายการ
+        # การเชื่อมต่อแต่ละตัวปรับให้ตรงรุ่นล่าสุดตอนถูกยืม
+        self._attachments: Dict[str, str] = {}
+        self._attachments_generation = 0
+        self._attached: Dict[int, int] = {}
+        self._stats = {
+            "created": 0,
+            "hits": 0,
+            "reentrant": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.read_only:
+            uri = Path(self.database).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   cached_statements=DB_CACHED_STATEMENTS,
+                                   factory=metrics.connection_factory())
+        else:
+            conn = sqlite3.connect(self.database, check_same_thread=False,
+                                   isolation_level=self.isolation_level,
+                                   cached_statements=DB_CACHED_STATEMENTS,
+                                   factory=metrics.connection_factory())
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """ยืมการเชื่อมต่อจาก pool (รอถ้าใช้ครบทุกตัวแล้ว)"""
+        conn = self._checkout()
+        if self._attached.get(id(conn), 0) != self._attachments_generation:
+            try:
+                self._sync_attachments(conn)
+            except BaseException:
+                self.release(conn)
+                raise
+        return conn
+
+    def set_attachments(self, attachments: Dict[str, str]) -> None:
+        """ตั้งรายการฐานข้อมูลที่ ATTACH แบบ read-only (immutable) ทุกการเชื่อมต่อ
+
+        ใช้กับ pool ฝั่งอ่านเท่านั้น (เปิดแบบ URI) การเชื่อมต่อที่ยืมอยู่จะถูกปรับ
+        เมื่อถูกยืมครั้งถัดไป
+
+        Args:
+            attachments: ชื่อ schema -> path ของไฟล์ฐานข้อมูล
+        """
+        with self._lock:
+            if attachments == self._attachments:
+                return
+            self._attachments = dict(attachments)
+            self._attachments_generation += 1
+
+    def _sync_attachments(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            attachments = dict(self._attachments)
+            generation = self._attachments_generation
+
+        _attach_archives(conn, attachments)
+        self._attached[id(conn)] = generation
+
+    def connect_dedicated(self) -> sqlite3.Connection:
+        """เปิดการเชื่อมต่อใหม่นอก pool (ตั้งค่าและ ATTACH เหมือนการเชื่อมต่อใน pool)
+
+        ใช้กับงานที่ถือการเชื่อมต่อนานตามความเร็วของ client เช่น streaming export
+        เพื่อไม่ให้กินโควตาของ pool ผู้เรียกต้องปิดการเชื่อมต่อเอง
+        """
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        with self._lock:
+            attachments = dict(self._attachments)
+        conn = self._connect()
+        try:
+            _attach_archives(conn, attachments)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def _checkout(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._stats["hits"] += 1
+            return conn
+        except Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.max_size:
+                conn = self._connect()
+                self._all.append(conn)
+                self._stats["created"] += 1
+                return conn
+            self._stats["waits"] += 1
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except Empty:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"No database connection available after {self.timeout}s"
+            )
+        with self._lock:
+            self._stats["wait_time"] += time.perf_counter() - started
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """คืนการเชื่อมต่อเข้า pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    def current(self) -> Optional[sqlite3.Connection]:
+        """การเชื่อมต่อที่ thread ปัจจุบันยืมอยู่ (ถ้ามี)"""
+        return getattr(self._local, "conn", None)
+
+    @contextmanager
+    def connection(self):
+        """ยืมการเชื่อมต่อภายใน ``with`` และคืนอัตโนมัติ"""
+        current = self.current()
+        if current is not None:
+            # การเรียกซ้อนใน thread เดียวกัน ใช้การเชื่อมต่อเดิม
+            with self._lock:
+                self._stats["reentrant"] += 1
+            yield current
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def stats(self) -> Dict:
+        """สถิติการใช้งาน pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._all)
+        stats["idle"] = self._idle.qsize()
+        stats["in_use"] = stats["size"] - stats["idle"]
+        stats["max_size"] = self.max_size
+        return stats
+
+    def close(self) -> None:
+        """ปิดการเชื่อมต่อทั้งหมด"""
+        self._closed = True
+        with self._lock:
+            connections, self._all = self._all, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+class WriterPool(ConnectionPool):
+    """Pool ฝั่งเขียนที่มีการเชื่อมต่อเดียว พร้อมนโยบาย checkpoint ของ WAL
+
+    การเชื่อมต่ออยู่ในโหมด autocommit (isolation_level=None) การเขียนหลาย
+    คำสั่งต้องอยู่ใน ``write_transaction()`` ซึ่งเปิด ``BEGIN IMMEDIATE``
+    """
+
+    def __init__(self, database: str, profile: Dict,
+                 timeout: float = DB_POOL_TIMEOUT):
+        super().__init__(database, max_size=1, timeout=timeout,
+                         pragmas=build_pragmas(profile, writer=True),
+                         isolation_level=None)
+        self.wal_enabled = str(profile.get("journal_mode", "")).upper() == "WAL"
+        self._releases = 0
+        self._stats["checkpoints"] = 0
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if self.wal_enabled and not self._closed:
+            self._releases += 1
+            if self._releases >= DB_CHECKPOINT_INTERVAL:
+                self._releases = 0
+                self._maybe_checkpoint(conn)
+        super().release(conn)
+
+    def _maybe_checkpoint(self, conn: sqlite3.Connection) -> None:
+        try:
+            wal_size = os.path.getsize(f"{self.database}-wal")
+        except OSError:
+            return
+        if wal_size > DB_WAL_MAX_BYTES:
+            self.checkpoint(conn, "TRUNCATE")
+
+    def checkpoint(self, conn: sqlite3.Connection, mode: str = "PASSIVE") -> Tuple:
+        """สั่ง checkpoint ไฟล์ WAL คืนค่า (busy, log_pages, checkpointed_pages)"""
+        row = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        with self._lock:
+            self._stats["checkpoints"] += 1
+        return tuple(row)
+
+
+_writer_pool: Optional[WriterPool] = None
+_reader_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> WriterPool:
+    """ดึง pool ฝั่งเขียนที่ใช้ร่วมกันทั้งโมดูล
+
+    สร้างเมื่อเรียกครั้งแรก และปรับ schema ให้เป็นเวอร์ชันล่าสุดก่อนใช้งาน
+    """
+    global _writer_pool
+    if _writer_pool is None:
+        with _pool_lock:
+            if _writer_pool is None:
+                Path(DATABASE_PATH).parent.mkdir(parents=True, exist_ok=True)
+                pool = WriterPool(DATABASE_PATH, get_storage_profile())
+                try:
+                    _migrate(pool)
+                except BaseException:
+                    pool.close()
+                    raise
+                _writer_pool = pool
+    return _writer_pool
+
+
+def get_read_pool() -> ConnectionPool:
+    """ดึง pool ฝั่งอ่านแบบ read-only (สร้างเมื่อเรียกครั้งแรก)"""
+    global _reader_pool
+    if _reader_pool is None:
+        # ไฟล์ฐานข้อมูลต้องถูกสร้างโดยฝั่งเขียนก่อนจึงจะเปิดแบบ read-only ได้
+        get_pool()
+        with _pool_lock:
+            if _reader_pool is None:
+                _reader_pool = ConnectionPool(
+                    DATABASE_PATH,
+                    pragmas=build_pragmas(get_storage_profile(), writer=False),
+                    read_only=True,
+                )
+    return _reader_pool
+
+
+def close_database() -> None:
+    """ปิดการเชื่อมต่อทั้งหมด (pool จะถูกสร้างใหม่เมื่อใช้งานครั้งถัดไป)"""
+    global _writer_pool, _reader_pool, _archives
+    with _pool_lock:
+        for pool in (_reader_pool, _writer_pool):
+            if pool is not None:
+                pool.close()
+        _writer_pool = None
+        _reader_pool = None
+        _archives = (-1, {})
+
+
+def configure_database(database_path: str) -> None:
+    """เปลี่ยนไฟล์ฐานข้อมูลและสร้าง pool ใหม่ (ใช้กับ benchmark/สคริปต์)"""
+    global DATABASE_PATH
+    close_database()
+    DATABASE_PATH = database_path
+    init_database()
+
+
+def get_pool_stats() -> Dict:
+    """สถิติของ connection pool ทั้งฝั่งอ่านและฝั่งเขียน"""
+    return {
+        "profile": DB_STORAGE_PROFILE,
+        "writer": get_pool().stats(),
+        "reader": get_read_pool().stats(),
+    }
+
+
+def checkpoint_wal(mode: str = "TRUNCATE") -> Optional[Tuple]:
+    """สั่ง checkpoint ไฟล์ WAL ทันที (เช่น ก่อนสำรองข้อมูล)"""
+    pool = get_pool()
+    if not pool.wal_enabled:
+        return None
+    with pool.connection() as conn:
+        return pool.checkpoint(conn, mode)
 
 
 def get_db_connection():
-    """สร้างการเชื่อมต่อกับฐานข้อมูล"""
-    # Ensure database file exists and is writable
-    if not Path(DATABASE_PATH).exists():
-        Path(DATABASE_PATH).touch()
+    """ยืมการเชื่อมต่อฝั่งเขียนจาก pool
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    ใช้กับ ``with get_db_connection() as conn:`` การเชื่อมต่อจะถูกคืน
+    เข้า pool เมื่อออกจาก block และ transaction ที่ค้างอยู่จะถูก rollback
+    """
+    return get_pool().connection()
 
 
-def init_database():
-    """สร้างตารางในฐานข้อมูล"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+@contextmanager
+def write_transaction():
+    """เปิด transaction สำหรับเขียนด้วย ``BEGIN IMMEDIATE``
+
+    ล็อกการเขียนถูกจองตั้งแต่ต้น transaction จึงไม่มี process อื่นแทรกระหว่าง
+    อ่านค่าและเขียนกลับ (เช่น การจองเลขรัน) commit เมื่อออกจาก block ตามปกติ
+    และ rollback เมื่อเกิด exception ถ้าเรียกซ้อนภายใน transaction เดิม
+    จะใช้ transaction เดิมต่อ
+    """
+    with get_db_connection() as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+
+@contextmanager
+def get_read_connection():
+    """ยืมการเชื่อมต่อแบบ read-only จาก pool ฝั่งอ่าน
+
+    ถ้า thread นี้ถือการเชื่อมต่อฝั่งเขียนอยู่ (เช่น อ่านข้อมูลกลับหลังบันทึก)
+    จะใช้การเชื่อมต่อนั้นแทน เพื่อให้เห็นข้อมูลใน transaction เดียวกัน
+    """
+    writer = get_pool().current()
+    if writer is not None:
+        yield writer
+        return
+    with get_read_pool().connection() as conn:
+        yield conn
+
+
+def _migrate_core_schema(cursor: sqlite3.Cursor) -> None:
+    """ตารางหลัก (ผู้ขาย ใบเสร็จ สินค้า ลูกค้า เลขรัน) และ index
+
+    ฐานข้อมูลที่สร้างก่อนมีระบบ migration อาจมีบางส่วนอยู่แล้ว ทุกคำสั่งจึงรันซ้ำได้
+    """
     # ตารางข้อมูลผู้ขาย (ร้านค้า)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS seller_info (
@@ -35,7 +507,7 @@ def init_database():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
+
     # ตารางใบเสร็จ
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS invoices (
@@ -53,7 +525,7 @@ def init_database():
             FOREIGN KEY (seller_id) REFERENCES seller_info (id)
         )
     """)
-    
+
     # ตารางรายการสินค้าในใบเสร็จ
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS invoice_items (
@@ -67,7 +539,7 @@ def init_database():
             FOREIGN KEY (invoice_id) REFERENCES invoices (id) ON DELETE CASCADE
         )
     """)
-    
+
     # ตารางสินค้า (Items)
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS items (
@@ -79,58 +551,258 @@ def init_database():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
-    # สร้าง index สำหรับการค้นหาสินค้า
+
+    # SKU ไม่ซ้ำกัน เพื่อให้นำเข้า CSV แบบ upsert ได้
+    # ฐานข้อมูลเดิมอาจมี SKU ซ้ำ เก็บแถวล่าสุดไว้ก่อนสร้าง unique index
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_items_sku 
-        ON items(sku)
+        SELECT 1 FROM sqlite_master
+        WHERE type = 'index' AND name = 'idx_items_sku_unique'
     """)
-    
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            DELETE FROM items
+            WHERE id NOT IN (SELECT MAX(id) FROM items GROUP BY sku)
+        """)
+        cursor.execute("DROP INDEX IF EXISTS idx_items_sku")
+        cursor.execute("""
+            CREATE UNIQUE INDEX idx_items_sku_unique 
+            ON items(sku)
+        """)
+
+    # เลขเวอร์ชันของข้อมูลที่แคชไว้ในแอป (เช่น catalog สินค้า)
+    # ทุก process อ่านจากตารางนี้ จึงรู้ว่าแคชของตัวเองเก่าแล้ว
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+
+    # รอบการนำเข้าล่าสุดที่พบสินค้านี้ ใช้ลบ SKU ที่ไม่อยู่ในไฟล์ใหม่แล้ว
+    if not _column_exists(cursor, "items", "import_id"):
+        cursor.execute("ALTER TABLE items ADD COLUMN import_id INTEGER")
+
+    # ตารางลูกค้า (นำเข้าจาก customer.csv)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            address TEXT NOT NULL DEFAULT '',
+            tax_id TEXT NOT NULL DEFAULT '',
+            search_key TEXT NOT NULL,
+            import_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # ลูกค้าหนึ่งรายระบุด้วยชื่อและเลขประจำตัวผู้เสียภาษี
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_customers_name_tax
+        ON customers(name, tax_id)
+    """)
+
+    # เรียงตามชื่อสำหรับรายการแบบแบ่งหน้า
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customers_name
+        ON customers(name, id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customers_tax_id
+        ON customers(tax_id)
+    """)
+
     # สร้าง index สำหรับการค้นหา
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_invoice_number 
         ON invoices(invoice_number)
     """)
-    
+
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_invoice_date 
         ON invoices(invoice_date)
     """)
-    
-    conn.commit()
-    conn.close()
+
+    # เลขรันต้องไม่ซ้ำภายในปีเดียวกัน
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_invoice_year_running
+        ON invoices(buddhist_year, running_number)
+    """)
+
+    # ตารางเลขรันล่าสุดของแต่ละปี (จองเลขแบบ O(1) ภายใน transaction)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_sequences (
+            buddhist_year INTEGER PRIMARY KEY,
+            last_number INTEGER NOT NULL
+        )
+    """)
+
+    # ฐานข้อมูลเดิมที่ยังไม่มีตารางเลขรัน ตั้งค่าเริ่มจากเลขสูงสุดที่มีอยู่
+    cursor.execute("SELECT 1 FROM invoice_sequences LIMIT 1")
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            INSERT INTO invoice_sequences (buddhist_year, last_number)
+            SELECT buddhist_year, MAX(running_number)
+            FROM invoices
+            GROUP BY buddhist_year
+        """)
+
+    # วันที่แบบ ISO (YYYY-MM-DD) สำหรับเรียงและค้นหาเป็นช่วง
+    # invoice_date เดิมเป็น dd/mm/YYYY ซึ่งเรียงตามตัวอักษรไม่ได้
+    if not _column_exists(cursor, "invoices", "invoice_date_iso"):
+        cursor.execute("ALTER TABLE invoices ADD COLUMN invoice_date_iso TEXT")
+        cursor.execute("""
+            UPDATE invoices
+            SET invoice_date_iso = substr(invoice_date, 7, 4) || '-' ||
+                                   substr(invoice_date, 4, 2) || '-' ||
+                                   substr(invoice_date, 1, 2)
+            WHERE invoice_date_iso IS NULL
+        """)
+
+    # index สำหรับรายการใบเสร็จแบบแบ่งหน้า (เรียงตามวันที่แล้ว id)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoice_date_iso
+        ON invoices(invoice_date_iso, id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoice_customer_date
+        ON invoices(customer_name, invoice_date_iso, id)
+    """)
+
+    # รายการสินค้าของใบเสร็จ (ดึงใบเสร็จและส่งออกแบบ join)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice
+        ON invoice_items(invoice_id)
+    """)
+
+
+def _column_exists(cursor: sqlite3.Cursor, table: str, column: str) -> bool:
+    """ตรวจว่าตารางมีคอลัมน์นี้แล้วหรือยัง"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+# ใช้ FTS5 ได้หรือไม่ (SQLite บางรุ่นคอมไพล์มาโดยไม่มี FTS5) ตั้งค่าเมื่อเปิดฐานข้อมูล
+FTS_ENABLED = False
+
+# trigram tokenizer ค้นหาได้เมื่อคำค้นยาวอย่างน้อย 3 ตัวอักษร
+FTS_MIN_QUERY_LENGTH = 3
+
+
+def _init_invoice_search_index(cursor: sqlite3.Cursor) -> None:
+    """สร้างดัชนีค้นหาใบเสร็จแบบ full-text (FTS5) พร้อม trigger ให้ข้อมูลตรงกัน
+
+    ใช้ tokenizer แบบ trigram ซึ่งตัดข้อความเป็นกลุ่มละ 3 ตัวอักษร
+    จึงค้นหาภาษาไทยที่ไม่มีการเว้นวรรคระหว่างคำได้แบบ substring
+    """
+    cursor.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoices_fts'
+    """)
+    exists = cursor.fetchone() is not None
+
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS invoices_fts USING fts5(
+                invoice_number, customer_name, invoice_date,
+                content='invoices', content_rowid='id',
+                tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search disabled: {e}")
+        return
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS invoices_fts_insert AFTER INSERT ON invoices BEGIN
+            INSERT INTO invoices_fts (rowid, invoice_number, customer_name, invoice_date)
+            VALUES (new.id, new.invoice_number, new.customer_name, new.invoice_date);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS invoices_fts_delete AFTER DELETE ON invoices BEGIN
+            INSERT INTO invoices_fts (invoices_fts, rowid, invoice_number, customer_name, invoice_date)
+            VALUES ('delete', old.id, old.invoice_number, old.customer_name, old.invoice_date);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS invoices_fts_update
+        AFTER UPDATE OF invoice_number, customer_name, invoice_date ON invoices BEGIN
+            INSERT INTO invoices_fts (invoices_fts, rowid, invoice_number, customer_name, invoice_date)
+            VALUES ('delete', old.id, old.invoice_number, old.customer_name, old.invoice_date);
+            INSERT INTO invoices_fts (rowid, invoice_number, customer_name, invoice_date)
+            VALUES (new.id, new.invoice_number, new.customer_name, new.invoice_date);
+        END
+    """)
+
+    if not exists:
+        # ฐานข้อมูลเดิม สร้างดัชนีจากใบเสร็จที่มีอยู่
+        cursor.execute("INSERT INTO invoices_fts (invoices_fts) VALUES ('rebuild')")
 
 
-def get_thai_buddhist_year() -> int:
-    """คำนวณปีพุทธศักราช"""
-    current_year = datetime.now().year
+def get_thai_buddhist_year(now: Optional[datetime] = None) -> int:
+    """คำนวณปีพุทธศักราชของเวลา ``now`` (ค่าเริ่มต้น: เวลาปัจจุบัน)"""
+    current_year = (now or datetime.now()).year
     return current_year + 543
 
 
 def get_next_running_number(buddhist_year: int) -> int:
-    """หาเลขรันถัดไปสำหรับปีนั้นๆ"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT MAX(running_number) as max_number 
-        FROM invoices 
-        WHERE buddhist_year = ?
-    """, (buddhist_year,))
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result['max_number'] is None:
+    """ดูเลขรันถัดไปสำหรับปีนั้นๆ (ไม่จองเลข)"""
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT last_number FROM invoice_sequences 
+            WHERE buddhist_year = ?
+        """, (buddhist_year,))
+
+        result = cursor.fetchone()
+
+    if result is None:
         return 1
-    return result['max_number'] + 1
+    return result['last_number'] + 1
 
 
-def generate_invoice_number() -> Tuple[str, int, int]:
-    """สร้างเลขที่ใบเสร็จในรูปแบบ เลขรัน/ปีพ.ศ."""
-    buddhist_year = get_thai_buddhist_year()
-    running_number = get_next_running_number(buddhist_year)
-    invoice_number = f"{running_number:03d}/{buddhist_year}"
+def allocate_running_numbers(conn: sqlite3.Connection, buddhist_year: int,
+                             count: int = 1) -> int:
+    """จองเลขรันต่อเนื่อง ``count`` เลขของปีนั้นๆ คืนค่าเลขแรกของช่วง
+
+    ต้องเรียกภายใน ``write_transaction()`` เดียวกับการ INSERT ใบเสร็จ
+    เพื่อให้เลขที่จองถูก rollback ไปพร้อมกันถ้าบันทึกไม่สำเร็จ
+    """
+    if not conn.in_transaction:
+        raise RuntimeError("allocate_running_numbers() requires an open write transaction")
+
+    cursor = conn.execute("""
+        INSERT INTO invoice_sequences (buddhist_year, last_number)
+        VALUES (?, ?)
+        ON CONFLICT (buddhist_year)
+        DO UPDATE SET last_number = last_number + excluded.last_number
+        RETURNING last_number
+    """, (buddhist_year, count))
+    last_number = cursor.fetchone()[0]
+    return last_number - count + 1
+
+
+def format_invoice_number(running_number: int, buddhist_year: int) -> str:
+    """จัดรูปแบบเลขที่ใบเสร็จ เลขรัน/ปีพ.ศ."""
+    return f"{running_number:03d}/{buddhist_year}"
+
+
+def generate_invoice_number(buddhist_year: Optional[int] = None) -> Tuple[str, int, int]:
+    """สร้างเลขที่ใบเสร็จในรูปแบบ เลขรัน/ปีพ.ศ.
+
+    เลขถูกจองทันที ถ้าเรียกภายใน ``write_transaction()`` จะจองใน
+    transaction นั้นและคืนเลขเมื่อ rollback
+
+    Args:
+        buddhist_year: ปี พ.ศ. ของลำดับเลขรัน (ค่าเริ่มต้น: ปีปัจจุบัน)
+    """
+    if buddhist_year is None:
+        buddhist_year = get_thai_buddhist_year()
+    with write_transaction() as conn:
+        running_number = allocate_running_numbers(conn, buddhist_year)
+    invoice_number = format_invoice_number(running_number, buddhist_year)
     
     return invoice_number, running_number, buddhist_year
 
@@ -139,16 +811,15 @@ def generate_invoice_number() -> Tuple[str, int, int]:
 
 def get_seller_info(seller_id: int = 1) -> Optional[Dict]:
     """ดึงข้อมูลผู้ขาย"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT * FROM seller_info WHERE id = ?
-    """, (seller_id,))
-    
-    result = cursor.fetchone()
-    conn.close()
-    
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT * FROM seller_info WHERE id = ?
+        """, (seller_id,))
+
+        result = cursor.fetchone()
+
     if result:
         return dict(result)
     return None
@@ -159,25 +830,19 @@ def get_or_create_default_seller() -> Dict:
     seller = get_seller_info(1)
     
     if seller is None:
-        # สร้างข้อมูลเริ่มต้น
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO seller_info (shop_name, shop_address, tax_id, phone)
-            VALUES (?, ?, ?, ?)
-        """, (
-            "ชื่อร้าน",
-            "ที่อยู่ร้าน",
-            "0000000000000",
-            "000-000-0000"
-        ))
-        
-        conn.commit()
-        seller_id = cursor.lastrowid
-        conn.close()
-        
-        seller = get_seller_info(seller_id)
+        # สร้างข้อมูลเริ่มต้น (id คงที่ worker หลายตัวที่สร้างพร้อมกันจึงได้แถวเดียว)
+        with write_transaction() as conn:
+            conn.execute("""
+                INSERT OR IGNORE INTO seller_info (id, shop_name, shop_address, tax_id, phone)
+                VALUES (1, ?, ?, ?, ?)
+            """, (
+                "ชื่อร้าน",
+                "ที่อยู่ร้าน",
+                "0000000000000",
+                "000-000-0000"
+            ))
+
+        seller = get_seller_info(1)
     
     return seller
 
@@ -185,275 +850,2335 @@ def get_or_create_default_seller() -> Dict:
 def update_seller_info(seller_id: int, shop_name: str, shop_address: str, 
                        tax_id: str, phone: str) -> bool:
     """อัปเดตข้อมูลผู้ขาย"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("""
-            UPDATE seller_info 
-            SET shop_name = ?, shop_address = ?, tax_id = ?, phone = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (shop_name, shop_address, tax_id, phone, seller_id))
-        
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
-        return success
+        with write_transaction() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                UPDATE seller_info 
+                SET shop_name = ?, shop_address = ?, tax_id = ?, phone = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (shop_name, shop_address, tax_id, phone, seller_id))
+
+            if cursor.rowcount == 0:
+                return False
+            # ใบเสร็จที่ render แล้วแสดงข้อมูลผู้ขายปัจจุบัน ต้องสร้างใหม่
+            bump_data_version(conn, SELLER_VERSION)
+            return True
     except Exception as e:
-        conn.close()
         print(f"Error updating seller info: {e}")
         return False
 
 
 # ==================== Invoice Functions ====================
 
+def _insert_invoice(cursor: sqlite3.Cursor, invoice_number: str,
+                    running_number: int, buddhist_year: int, now: datetime,
+                    customer_info: Dict, seller_id: int,
+                    total_satang: int) -> int:
+    """INSERT แถวใบเสร็จ คืนค่า id ของใบเสร็จ"""
+    cursor.execute("""
+        INSERT INTO invoices 
+        (invoice_number, running_number, buddhist_year, invoice_date,
+         invoice_date_iso, customer_name, customer_address,
+         customer_tax_id, seller_id, total_satang)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        invoice_number,
+        running_number,
+        buddhist_year,
+        now.strftime("%d/%m/%Y"),
+        now.strftime("%Y-%m-%d"),
+        customer_info['name'],
+        customer_info['address'],
+        customer_info.get('tax_id', ''),
+        seller_id,
+        total_satang
+    ))
+    return cursor.lastrowid
+
+
+def _insert_invoice_items(cursor: sqlite3.Cursor, rows: List[Tuple]) -> None:
+    """INSERT รายการสินค้าหลายแถวในครั้งเดียว
+
+    rows เป็น tuple (invoice_id, sku, name, ราคาสตางค์, quantity, ยอดสตางค์)
+    """
+    cursor.executemany("""
+        INSERT INTO invoice_items 
+        (invoice_id, sku, name, price_satang, quantity, subtotal_satang)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+
+
+def _item_rows(invoice_id: int, items: List[Dict]) -> List[Tuple]:
+    """แปลงรายการสินค้าเป็นแถวสำหรับ _insert_invoice_items
+
+    ราคาแปลงเป็นสตางค์ก่อนคูณจำนวน ยอดของแต่ละรายการจึงเป็นจำนวนเต็มเสมอ
+    """
+    rows = []
+    for item in items:
+        price_satang = money.to_satang(item['price'])
+        rows.append((
+            invoice_id,
+            item['sku'],
+            item['name'],
+            price_satang,
+            item['quantity'],
+            money.line_total(price_satang, item['quantity'])
+        ))
+    return rows
+
+
+def _rows_total(rows: List[Tuple]) -> int:
+    """ยอดรวมใบเสร็จ (สตางค์) จากแถวของ _item_rows"""
+    return sum(row[5] for row in rows)
+
+
+def _sales_invoice(invoice_id: int, now: datetime, customer_info: Dict,
+                   total_satang: int) -> Tuple:
+    """ข้อมูลใบเสร็จสำหรับ _record_sales"""
+    return (invoice_id, now.strftime("%Y-%m-%d"), customer_info['name'],
+            customer_info.get('tax_id', ''), total_satang)
+
+
 def save_invoice(customer_info: Dict, items: List[Dict], 
                 seller_id: int = 1) -> Optional[Dict]:
-    """บันทึกใบเสร็จลงฐานข้อมูล"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    """บันทึกใบเสร็จลงฐานข้อมูล
+
+    การจองเลขรันและการ INSERT อยู่ใน ``BEGIN IMMEDIATE`` transaction เดียวกัน
+    การบันทึกพร้อมกันจึงได้เลขไม่ซ้ำและไม่เว้นช่วง
+
+    Raises:
+        ValueError: ข้อมูลใบเสร็จไม่ถูกต้อง (ตรวจด้วย validate_invoice_payload)
+    """
+    validate_invoice_payload(customer_info, items)
     try:
-        # สร้างเลขที่ใบเสร็จ
-        invoice_number, running_number, buddhist_year = generate_invoice_number()
-        
-        # คำนวณยอดรวม
-        total_amount = sum(item['price'] * item['quantity'] for item in items)
-        
-        # บันทึกใบเสร็จ
-        invoice_date = datetime.now().strftime("%d/%m/%Y")
-        
-        cursor.execute("""
-            INSERT INTO invoices 
-            (invoice_number, running_number, buddhist_year, invoice_date,
-             customer_name, customer_address, customer_tax_id, seller_id, total_amount)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            invoice_number,
-            running_number,
-            buddhist_year,
-            invoice_date,
-            customer_info['name'],
-            customer_info['address'],
-            customer_info.get('tax_id', ''),
-            seller_id,
-            total_amount
-        ))
-        
-        invoice_id = cursor.lastrowid
-        
-        # บันทึกรายการสินค้า
-        for item in items:
-            subtotal = item['price'] * item['quantity']
-            cursor.execute("""
-                INSERT INTO invoice_items 
-                (invoice_id, sku, name, price, quantity, subtotal)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                invoice_id,
-                item['sku'],
-                item['name'],
-                item['price'],
-                item['quantity'],
-                subtotal
-            ))
-        
-        conn.commit()
-        
+        with write_transaction() as conn:
+            invoice_id = _save_invoice(conn, customer_info, items, seller_id)
+
         # ดึงข้อมูลใบเสร็จที่สร้างขึ้น
-        invoice = get_invoice_by_id(invoice_id)
-        conn.close()
-        
-        return invoice
-        
+        return get_invoice_by_id(invoice_id)
+
     except Exception as e:
-        conn.rollback()
-        conn.close()
         print(f"Error saving invoice: {e}")
         return None
 
 
-def get_invoice_by_id(invoice_id: int) -> Optional[Dict]:
-    """ดึงข้อมูลใบเสร็จตาม ID"""
-    conn = get_db_connection()
+def _save_invoice(conn: sqlite3.Connection, customer_info: Dict, items: List[Dict],
+                  seller_id: int) -> int:
+    """จองเลขรันและ INSERT ใบเสร็จภายใน write transaction คืนค่า id ของใบเสร็จ"""
     cursor = conn.cursor()
-    
-    # ดึงข้อมูลใบเสร็จ
-    cursor.execute("""
-        SELECT i.*, s.shop_name, s.shop_address, s.tax_id as seller_tax_id, s.phone
-        FROM invoices i
-        JOIN seller_info s ON i.seller_id = s.id
-        WHERE i.id = ?
-    """, (invoice_id,))
-    
-    invoice_row = cursor.fetchone()
-    
-    if not invoice_row:
-        conn.close()
-        return None
-    
-    invoice = dict(invoice_row)
-    
-    # ดึงรายการสินค้า
-    cursor.execute("""
-        SELECT * FROM invoice_items WHERE invoice_id = ?
-    """, (invoice_id,))
-    
-    items = [dict(row) for row in cursor.fetchall()]
-    invoice['items'] = items
-    
-    conn.close()
-    return invoice
 
+    # เวลาเดียวกันใช้ทั้งปีของเลขรันและวันที่ใบเสร็จ ใบเสร็จที่บันทึกตอนข้ามปี
+    # จึงไม่ได้วันที่ปีใหม่กับเลขรันของปีเก่า
+    now = datetime.now()
 
-def get_invoice_by_number(invoice_number: str) -> Optional[Dict]:
-    """ค้นหาใบเสร็จด้วยเลขที่ใบเสร็จ"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT id FROM invoices WHERE invoice_number = ?
-    """, (invoice_number,))
-    
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
-        return get_invoice_by_id(result['id'])
-    return None
+    # สร้างเลขที่ใบเสร็จ
+    invoice_number, running_number, buddhist_year = generate_invoice_number(
+        get_thai_buddhist_year(now)
+    )
 
+    # คำนวณยอดรวม (สตางค์) จากยอดของแต่ละรายการ
+    item_rows = _item_rows(None, items)
+    total_satang = _rows_total(item_rows)
 
-def search_invoices(query: str = "", limit: int = 50) -> List[Dict]:
-    """ค้นหาใบเสร็จ"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if query:
-        cursor.execute("""
-            SELECT i.*, s.shop_name
-            FROM invoices i
-            JOIN seller_info s ON i.seller_id = s.id
-            WHERE i.invoice_number LIKE ? 
-               OR i.customer_name LIKE ?
-               OR i.invoice_date LIKE ?
-            ORDER BY i.created_at DESC
+    # บันทึกใบเสร็จ
+    invoice_id = _insert_invoice(
+        cursor, invoice_number, running_number, buddhist_year,
+        now, customer_info, seller_id, total_satang
+    )
+
+    # บันทึกรายการสินค้า
+    item_rows = [(invoice_id, *row[1:]) for row in item_rows]
+    _insert_invoice_items(cursor, item_rows)
+
+    # อัปเดตตารางสรุปยอดขาย
+    _record_sales(cursor, [_sales_invoice(invoice_id, now, customer_info,
+                                          total_satang)], item_rows)
+    return invoice_id
+
+
+def validate_invoice_payload(customer_info: Dict, items: List[Dict]) -> None:
+    """ตรวจสอบข้อมูลใบเสร็จก่อนบันทึก ข้อมูลไม่ถูกต้องจะ raise ValueError"""
+    if not isinstance(customer_info, dict) or not customer_info.get('name'):
+        raise ValueError("customer.name is required")
+    if 'address' not in customer_info:
+        raise ValueError("customer.address is required")
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"items[{index}] must be an object")
+        for key in ('sku', 'name', 'price', 'quantity'):
+            if key not in item:
+                raise ValueError(f"items[{index}].{key} is required")
+        if not isinstance(item['price'], (int, float)) or isinstance(item['price'], bool):
+            raise ValueError(f"items[{index}].price must be a number")
+        if not math.isfinite(item['price']):
+            raise ValueError(f"items[{index}].price must be a finite number")
+        if not isinstance(item['quantity'], int) or isinstance(item['quantity'], bool):
+            raise ValueError(f"items[{index}].quantity must be an integer")
+
+
+def save_invoices_bulk(invoices: List[Dict], seller_id: int = 1) -> List[Dict]:
+    """บันทึกใบเสร็จหลายใบใน transaction เดียว
+
+    ใบเสร็จที่ข้อมูลถูกต้องได้เลขรันต่อเนื่องกันเป็นช่วงเดียว รายการสินค้า
+    ทั้งหมด INSERT ด้วย executemany ครั้งเดียว ถ้าบันทึกไม่สำเร็จจะ rollback
+    ทั้งชุดและไม่มีเลขรันถูกใช้ไป
+
+    Args:
+        invoices: รายการ dict ที่มี ``customer`` และ ``items``
+
+    Returns:
+        ผลลัพธ์ของแต่ละใบเรียงตามลำดับที่ส่งมา มี ``index``, ``success`` และ
+        ``invoice_id``/``invoice_number``/``total_amount`` หรือ ``error``
+    """
+    results: List[Dict] = []
+    valid: List[Tuple[int, Dict, List[Dict]]] = []
+
+    for index, payload in enumerate(invoices):
+        try:
+            if not isinstance(payload, dict):
+                raise ValueError("invoice must be an object")
+            customer_info = payload.get('customer', {})
+            items = payload.get('items', [])
+            validate_invoice_payload(customer_info, items)
+        except ValueError as e:
+            results.append({"index": index, "success": False, "error": str(e)})
+            continue
+        results.append(None)
+        valid.append((index, customer_info, items))
+
+    if not valid:
+        return results
+
+    now = datetime.now()
+    buddhist_year = get_thai_buddhist_year(now)
+
+    try:
+        with write_transaction() as conn:
+            cursor = conn.cursor()
+            first_number = allocate_running_numbers(conn, buddhist_year, len(valid))
+
+            item_rows: List[Tuple] = []
+            sales_invoices: List[Tuple] = []
+            for offset, (index, customer_info, items) in enumerate(valid):
+                running_number = first_number + offset
+                invoice_number = format_invoice_number(running_number, buddhist_year)
+                rows = _item_rows(None, items)
+                total_satang = _rows_total(rows)
+
+                invoice_id = _insert_invoice(
+                    cursor, invoice_number, running_number, buddhist_year,
+                    now, customer_info, seller_id, total_satang
+                )
+                item_rows.extend((invoice_id, *row[1:]) for row in rows)
+                sales_invoices.append(
+                    _sales_invoice(invoice_id, now, customer_info, total_satang)
+                )
+
+                results[index] = {
+                    "index": index,
+                    "success": True,
+                    "invoice_id": invoice_id,
+                    "invoice_number": invoice_number,
+                    "total_amount": money.to_baht(total_satang),
+                }
+
+            _insert_invoice_items(cursor, item_rows)
+            _record_sales(cursor, sales_invoices, item_rows)
+
+    except Exception as e:
+        print(f"Error saving invoice batch: {e}")
+        for index, _, _ in valid:
+            results[index] = {"index": index, "success": False, "error": str(e)}
+
+    return results
+
+
+# ยอดเงินเป็นบาทในผลลัพธ์ (ค่าจริงอยู่ในคอลัมน์ *_satang ที่ส่งกลับด้วย)
+_INVOICE_AMOUNT = "i.total_satang / 100.0 AS total_amount"
+
+# ใบเสร็จพร้อมข้อมูลผู้ขายและรายการสินค้าในคำสั่งเดียว รายการสินค้ารวมเป็น JSON array
+# ของ [id, sku, name, quantity, price_satang, subtotal_satang] เรียงตาม id (subquery ใช้
+# idx_invoice_items_invoice) ต่อท้ายด้วย WHERE ของผู้เรียก ``schema`` คือ main หรือ
+# archive ของปีที่ปิดแล้ว (ข้อมูลผู้ขายอยู่ใน main เสมอ)
+@functools.lru_cache(maxsize=None)
+def _invoice_select(schema: str = "main") -> str:
+    return f"""
+        SELECT i.*, {_INVOICE_AMOUNT},
+               s.shop_name, s.shop_address, s.tax_id AS seller_tax_id, s.phone,
+               (
+                   SELECT json_group_array(json_array(
+                       ii.id, ii.sku, ii.name, ii.quantity,
+                       ii.price_satang, ii.subtotal_satang
+                   ))
+                   FROM (
+                       SELECT * FROM {schema}.invoice_items WHERE invoice_id = i.id ORDER BY id
+                   ) ii
+               ) AS items_json
+        FROM {schema}.invoices i
+        JOIN main.seller_info s ON i.seller_id = s.id
+    """
+
+
+# จำนวนเลขที่ใบเสร็จสูงสุดต่อการเรียก get_invoices_by_numbers
+MAX_INVOICES_PER_BATCH = 500
+
+
+def _invoice_from_row(row: sqlite3.Row) -> Dict:
+    invoice = dict(row)
+    invoice_id = invoice['id']
+    # array แทน json_object เพราะ JSON สั้นกว่าและ parse เร็วกว่า
+    invoice['items'] = [
+        {
+            'id': item_id, 'invoice_id': invoice_id, 'sku': sku, 'name': name,
+            'quantity': quantity, 'price_satang': price, 'subtotal_satang': subtotal,
+            'price': money.to_baht(price), 'subtotal': money.to_baht(subtotal),
+        }
+        for item_id, sku, name, quantity, price, subtotal in json.loads(invoice.pop('items_json'))
+    ]
+    return invoice
+
+
+def _partition_connection(schema: str):
+    """การเชื่อมต่อสำหรับอ่าน ``schema`` (archive อ่านได้จาก pool ฝั่งอ่านที่ ATTACH ไว้เท่านั้น)"""
+    if schema == "main":
+        return get_read_connection()
+    return get_read_pool().connection()
+
+
+def get_invoice_by_id(invoice_id: int) -> Optional[Dict]:
+    """ดึงข้อมูลใบเสร็จตาม ID (รวมข้อมูลผู้ขายและรายการสินค้า)
+
+    ค้นในฐานข้อมูลหลักก่อน ถ้าไม่พบจึงอ่านจาก archive ที่ช่วง id ครอบคลุม
+    """
+    with get_read_connection() as conn:
+        row = conn.execute(_invoice_select() + "WHERE i.id = ?",
+                           (invoice_id,)).fetchone()
+
+    if row is None:
+        archive = _archive_for_id(invoice_id)
+        if archive is not None:
+            with _partition_connection(archive['schema']) as conn:
+                row = conn.execute(_invoice_select(archive['schema']) + "WHERE i.id = ?",
+                                   (invoice_id,)).fetchone()
+
+    return _invoice_from_row(row) if row else None
+
+
+def get_invoice_by_number(invoice_number: str) -> Optional[Dict]:
+    """ค้นหาใบเสร็จด้วยเลขที่ใบเสร็จ (ปีท้ายเลขที่บอกว่าอยู่ใน archive ไฟล์ใด)"""
+    row = _invoice_row_by_number(invoice_number, get_archives(check=False))
+    if row is None and _closed_invoice_year(invoice_number) is not None:
+        # ปีนี้อาจเพิ่งถูก archive โดย process อื่น
+        row = _invoice_row_by_number(invoice_number, get_archives())
+
+    return _invoice_from_row(row) if row else None
+
+
+def _invoice_row_by_number(invoice_number: str,
+                           archives: Dict[int, Dict]) -> Optional[sqlite3.Row]:
+    schema = _invoice_number_schema(invoice_number, archives)
+    with _partition_connection(schema) as conn:
+        return conn.execute(_invoice_select(schema) + "WHERE i.invoice_number = ?",
+                            (invoice_number,)).fetchone()
+
+
+def get_invoices_by_numbers(invoice_numbers: List[str]) -> Dict[str, Dict]:
+    """ดึงใบเสร็จหลายใบในคำสั่งเดียว
+
+    ส่งเลขที่ใบเสร็จเป็น JSON array พารามิเตอร์เดียว ข้อความ SQL จึงเหมือนกันทุกครั้ง
+    ไม่ว่าจะขอกี่ใบ และใช้ statement ที่ compile แล้วใน cache ของการเชื่อมต่อซ้ำได้
+    เลขที่ของปีที่ archive แล้วแยกเป็นหนึ่งคำสั่งต่อไฟล์
+
+    Args:
+        invoice_numbers: เลขที่ใบเสร็จ (ไม่เกิน MAX_INVOICES_PER_BATCH)
+
+    Returns:
+        Dict เลขที่ใบเสร็จ -> ใบเสร็จ (เลขที่ไม่พบจะไม่อยู่ในผลลัพธ์)
+    """
+    if len(invoice_numbers) > MAX_INVOICES_PER_BATCH:
+        raise ValueError(f"At most {MAX_INVOICES_PER_BATCH} invoices per request")
+    if not invoice_numbers:
+        return {}
+
+    invoices: Dict[str, Dict] = {}
+    _fetch_invoices_by_numbers(invoice_numbers, get_archives(check=False), invoices)
+
+    # เลขที่ของปีก่อนที่ไม่พบในฐานข้อมูลหลัก อาจเพิ่งถูก archive โดย process อื่น
+    missing = [number for number in invoice_numbers
+               if number not in invoices and _closed_invoice_year(number) is not None]
+    if missing:
+        _fetch_invoices_by_numbers(missing, get_archives(), invoices)
+    return invoices
+
+
+def _fetch_invoices_by_numbers(invoice_numbers: List[str], archives: Dict[int, Dict],
+                               invoices: Dict[str, Dict]) -> None:
+    partitions: Dict[str, List[str]] = {}
+    for invoice_number in invoice_numbers:
+        schema = _invoice_number_schema(invoice_number, archives)
+        partitions.setdefault(schema, []).append(invoice_number)
+
+    for schema, numbers in partitions.items():
+        with _partition_connection(schema) as conn:
+            rows = conn.execute(
+                _invoice_select(schema)
+                + "WHERE i.invoice_number IN (SELECT value FROM json_each(?))",
+                (json.dumps(numbers),)
+            ).fetchall()
+        for row in rows:
+            invoices[row['invoice_number']] = _invoice_from_row(row)
+
+
+def _fts_phrase(query: str) -> str:
+    """แปลงคำค้นเป็น phrase ของ FTS5 (ค้นหาแบบ substring ด้วย trigram)"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _parse_search_cursor(cursor_token: Optional[str],
+                         ranked: bool) -> Optional[Tuple]:
+    """แยก cursor สำหรับ keyset pagination คืนค่า (rank, id) หรือ (id,)"""
+    if not cursor_token:
+        return None
+    try:
+        if ranked:
+            rank, last_id = cursor_token.rsplit(":", 1)
+            return float(rank), int(last_id)
+        return (int(cursor_token),)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor_token}")
+
+
+def search_invoices_page(query: str = "", limit: int = 50,
+                         cursor: Optional[str] = None,
+                         sort: str = "relevance", shape: str = "objects") -> Dict:
+    """ค้นหาใบเสร็จแบบแบ่งหน้าด้วย keyset
+
+    ค้นในฐานข้อมูลหลักก่อน แล้วจึงไล่ archive จากปีใหม่ไปเก่าเฉพาะเมื่อหน้ายังไม่เต็ม
+    คะแนน bm25 เทียบกันได้ภายในไฟล์เดียวกันเท่านั้น ``relevance`` จึงเรียงตามคะแนน
+    ภายในแต่ละปีที่ archive (ฐานข้อมูลหลักก่อน)
+
+    Args:
+        query: คำค้นหา (เลขที่ใบเสร็จ, ชื่อลูกค้า หรือวันที่)
+        limit: จำนวนผลลัพธ์ต่อหน้า
+        cursor: ค่า ``next_cursor`` จากหน้าก่อนหน้า
+        sort: ``relevance`` เรียงตามคะแนน bm25 หรือ ``recent`` เรียงจากใหม่ไปเก่า
+        shape: รูปแบบของ ``invoices`` (ดู ROW_SHAPES)
+
+    Returns:
+        Dict ที่มี ``invoices`` และ ``next_cursor`` (None เมื่อถึงหน้าสุดท้าย)
+    """
+    if sort not in ("relevance", "recent"):
+        raise ValueError(f"Unknown sort '{sort}', expected relevance or recent")
+    # LIMIT ติดลบใน SQLite คือไม่จำกัด จะได้ทั้งตารางในหน้าเดียว
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    _check_shape(shape)
+
+    query = query.strip()
+    use_fts = FTS_ENABLED and len(query) >= FTS_MIN_QUERY_LENGTH
+    ranked = use_fts and sort == "relevance"
+    after = _parse_search_cursor(cursor, ranked)
+
+    columns: List[str] = []
+    rows: List[tuple] = []
+    for schema in _partitions_newest_first(after[-1] if after else None):
+        with _partition_connection(schema) as conn:
+            db_cursor = conn.cursor()
+            db_cursor.row_factory = None
+            _search_partition(db_cursor, schema, query, use_fts, ranked, after,
+                              limit - len(rows))
+            columns, found = _fetch_rows(db_cursor)
+        rows += found
+        if len(rows) >= limit:
+            break
+        if ranked:
+            # ไฟล์ถัดไปมีแต่ใบเสร็จที่เก่ากว่า เริ่มเรียงตามคะแนนของไฟล์นั้นใหม่
+            after = None
+        elif rows:
+            after = (rows[-1][columns.index('id')],)
+
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last = dict(zip(columns, rows[-1]))
+        if ranked:
+            next_cursor = f"{last['_rank']!r}:{last['id']}"
+        else:
+            next_cursor = str(last['id'])
+    if ranked:
+        # _rank เป็นคอลัมน์สุดท้าย ใช้เฉพาะทำ cursor
+        columns = columns[:-1]
+        rows = [row[:-1] for row in rows]
+
+    return {"invoices": _shape_rows(columns, rows, shape), "next_cursor": next_cursor}
+
+
+def _search_partition(db_cursor: sqlite3.Cursor, schema: str, query: str,
+                      use_fts: bool, ranked: bool, after: Optional[Tuple],
+                      limit: int) -> None:
+    """รันคำค้นของ search_invoices_page กับใบเสร็จใน ``schema`` (main หรือ archive)"""
+    if ranked:
+        # ให้น้ำหนักเลขที่ใบเสร็จ > ชื่อลูกค้า > วันที่
+        params = [_fts_phrase(query)]
+        keyset = ""
+        if after:
+            keyset = "WHERE f.rank > ? OR (f.rank = ? AND f.id < ?)"
+            params += [after[0], after[0], after[1]]
+        db_cursor.execute(f"""
+            SELECT i.*, {_INVOICE_AMOUNT}, s.shop_name, f.rank AS _rank
+            FROM (
+                SELECT rowid AS id, bm25(invoices_fts, 10.0, 5.0, 1.0) AS rank
+                FROM {schema}.invoices_fts
+                WHERE invoices_fts MATCH ?
+            ) f
+            JOIN {schema}.invoices i ON i.id = f.id
+            JOIN main.seller_info s ON i.seller_id = s.id
+            {keyset}
+            ORDER BY f.rank, f.id DESC
+            LIMIT ?
+        """, params + [limit])
+    elif use_fts:
+        params = [_fts_phrase(query)]
+        keyset = ""
+        if after:
+            keyset = "AND rowid < ?"
+            params.append(after[0])
+        db_cursor.execute(f"""
+            SELECT i.*, {_INVOICE_AMOUNT}, s.shop_name
+            FROM {schema}.invoices i
+            JOIN main.seller_info s ON i.seller_id = s.id
+            WHERE i.id IN (
+                SELECT rowid FROM {schema}.invoices_fts
+                WHERE invoices_fts MATCH ? {keyset}
+            )
+            ORDER BY i.id DESC
             LIMIT ?
-        """, (f"%{query}%", f"%{query}%", f"%{query}%", limit))
+        """, params + [limit])
     else:
-        cursor.execute("""
-            SELECT i.*, s.shop_name
-            FROM invoices i
-            JOIN seller_info s ON i.seller_id = s.id
-            ORDER BY i.created_at DESC
+        # คำค้นสั้นกว่า trigram หรือไม่มี FTS5 ไล่จากใบเสร็จล่าสุดลงไป
+        # (id เพิ่มขึ้นตามเวลาที่สร้าง) หยุดทันทีเมื่อได้ครบ limit
+        conditions = []
+        params = []
+        if query:
+            conditions.append("""(i.invoice_number LIKE ?
+               OR i.customer_name LIKE ?
+               OR i.invoice_date LIKE ?)""")
+            params += [f"%{query}%"] * 3
+        if after:
+            conditions.append("i.id < ?")
+            params.append(after[0])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        db_cursor.execute(f"""
+            SELECT i.*, {_INVOICE_AMOUNT}, s.shop_name
+            FROM {schema}.invoices i
+            JOIN main.seller_info s ON i.seller_id = s.id
+            {where}
+            ORDER BY i.id DESC
             LIMIT ?
-        """, (limit,))
-    
-    invoices = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    return invoices
+        """, params + [limit])
+
+
+def search_invoices(query: str = "", limit: int = 50) -> List[Dict]:
+    """ค้นหาใบเสร็จ"""
+    return search_invoices_page(query, limit)["invoices"]
+
+
+def parse_date_filter(value: Optional[str]) -> Optional[str]:
+    """แปลงวันที่จาก YYYY-MM-DD หรือ dd/mm/YYYY เป็น ISO (YYYY-MM-DD)
+
+    ปีที่มากกว่า 2400 ถือเป็นปีพุทธศักราชและแปลงเป็นคริสต์ศักราช
+    """
+    if not value:
+        return None
+    value = value.strip()
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or dd/mm/YYYY")
+
+    if parsed.year > 2400:
+        parsed = parsed.replace(year=parsed.year - 543)
+    return parsed.strftime("%Y-%m-%d")
+
+
+def encode_cursor(*values) -> str:
+    """เข้ารหัสค่าของแถวสุดท้ายเป็น cursor แบบ ASCII (ใส่ใน URL/header ได้)"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, size: int) -> List:
+    """ถอดรหัส cursor จาก encode_cursor ข้อมูลไม่ถูกต้องจะ raise ValueError"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError(f"Invalid cursor: {token}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor: {token}")
+    return values
+
+
+# รูปแบบแถวของผลการค้นหา/รายการ: ``objects`` เป็น list ของ dict (ค่าเริ่มต้น)
+# ``columns`` เป็น {"columns": [...], "rows": [[...], ...]} ไม่ซ้ำชื่อคอลัมน์ทุกแถว
+# JSON จึงเล็กลงราวครึ่งหนึ่ง และไม่ต้องสร้าง dict ต่อแถว
+ROW_SHAPES = ("objects", "columns")
+
+
+def _check_shape(shape: str) -> None:
+    if shape not in ROW_SHAPES:
+        raise ValueError(f"Unknown shape '{shape}', expected objects or columns")
+
+
+def _fetch_rows(cursor: sqlite3.Cursor) -> Tuple[List[str], List[tuple]]:
+    """ชื่อคอลัมน์และแถวแบบ tuple (cursor ต้องตั้ง ``row_factory = None``)
+
+    tuple ธรรมดาเร็วกว่า sqlite3.Row แล้วแปลงเป็น dict
+    """
+    columns = [description[0] for description in cursor.description]
+    return columns, cursor.fetchall()
+
+
+def _shape_rows(columns: List[str], rows: List[tuple], shape: str):
+    if shape == "columns":
+        return {"columns": columns, "rows": rows}
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _glob_prefix(prefix: str) -> str:
+    """สร้าง pattern GLOB แบบขึ้นต้นด้วย (GLOB ใช้ index ได้ ต่างจาก LIKE)"""
+    escaped = "".join(f"[{ch}]" if ch in "*?[" else ch for ch in prefix)
+    return escaped + "*"
+
+
+def list_invoices(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  customer: Optional[str] = None,
+                  min_amount: Optional[float] = None,
+                  max_amount: Optional[float] = None,
+                  cursor: Optional[str] = None, limit: int = 50,
+                  order: str = "desc", shape: str = "objects") -> Dict:
+    """รายการใบเสร็จตามช่วงวันที่/ลูกค้า/ยอดเงิน แบ่งหน้าด้วย keyset
+
+    เรียงตาม (invoice_date_iso, id) และใช้ค่าของแถวสุดท้ายเป็น cursor
+    หน้าลึกๆ จึงเร็วเท่าหน้าแรก ไม่ต้องใช้ OFFSET ปีที่ archive แล้วอ่านต่อจาก
+    ฐานข้อมูลหลักเมื่อหน้ายังไม่เต็ม และข้ามไฟล์ที่อยู่นอกช่วงวันที่
+
+    Args:
+        date_from, date_to: ช่วงวันที่ (รวมวันสุดท้าย) YYYY-MM-DD หรือ dd/mm/YYYY
+        customer: ชื่อลูกค้าขึ้นต้นด้วยข้อความนี้
+        min_amount, max_amount: ช่วงยอดรวม
+        cursor: ค่า ``next_cursor`` จากหน้าก่อนหน้า
+        order: ``desc`` (ใหม่ไปเก่า) หรือ ``asc``
+        shape: รูปแบบของ ``invoices`` (ดู ROW_SHAPES)
+
+    Returns:
+        Dict ที่มี ``invoices`` และ ``next_cursor`` (None เมื่อถึงหน้าสุดท้าย)
+    """
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unknown order '{order}', expected asc or desc")
+    _check_shape(shape)
+
+    conditions = []
+    params: List = []
+
+    date_from = parse_date_filter(date_from)
+    date_to = parse_date_filter(date_to)
+    if date_from:
+        conditions.append("i.invoice_date_iso >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("i.invoice_date_iso <= ?")
+        params.append(date_to)
+    if customer:
+        conditions.append("i.customer_name GLOB ?")
+        params.append(_glob_prefix(customer.strip()))
+    if min_amount is not None:
+        conditions.append("i.total_satang >= ?")
+        params.append(money.to_satang(min_amount))
+    if max_amount is not None:
+        conditions.append("i.total_satang <= ?")
+        params.append(money.to_satang(max_amount))
+
+    last = None
+    if cursor:
+        try:
+            last_date, last_id = cursor.rsplit(":", 1)
+            last = (last_date, int(last_id))
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor}")
+
+    direction = "DESC" if order == "desc" else "ASC"
+    comparison = "<" if order == "desc" else ">"
+
+    # ไฟล์ archive ที่อยู่นอกช่วงวันที่ (รวมส่วนที่ผ่าน cursor ไปแล้ว) ไม่ต้องเปิดอ่าน
+    range_from, range_to = date_from, date_to
+    if last and order == "desc":
+        range_to = min(filter(None, (range_to, last[0])))
+    elif last:
+        range_from = max(filter(None, (range_from, last[0])))
+
+    columns: List[str] = []
+    rows: List[tuple] = []
+    for schema in _partitions_by_date(order, range_from, range_to):
+        keyset, keyset_params = "", []
+        if last:
+            keyset = f"(i.invoice_date_iso, i.id) {comparison} (?, ?)"
+            keyset_params = list(last)
+        where = " AND ".join(filter(None, conditions + [keyset]))
+        with _partition_connection(schema) as conn:
+            db_cursor = conn.cursor()
+            db_cursor.row_factory = None
+            db_cursor.execute(f"""
+                SELECT i.*, {_INVOICE_AMOUNT}, s.shop_name
+                FROM {schema}.invoices i
+                JOIN main.seller_info s ON i.seller_id = s.id
+                {"WHERE " + where if where else ""}
+                ORDER BY i.invoice_date_iso {direction}, i.id {direction}
+                LIMIT ?
+            """, params + keyset_params + [limit - len(rows)])
+            columns, found = _fetch_rows(db_cursor)
+        rows += found
+        if len(rows) >= limit:
+            break
+        if found:
+            row = dict(zip(columns, found[-1]))
+            last = (row['invoice_date_iso'], row['id'])
+
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last_row = dict(zip(columns, rows[-1]))
+        next_cursor = f"{last_row['invoice_date_iso']}:{last_row['id']}"
+
+    return {"invoices": _shape_rows(columns, rows, shape), "next_cursor": next_cursor}
+
+
+# จำนวนแถวที่ดึงจาก cursor ต่อครั้งระหว่างส่งออก
+EXPORT_FETCH_SIZE = int(os.environ.get("EXPORT_FETCH_SIZE", "1000"))
+
+# จำนวน export ที่ส่งพร้อมกันได้สูงสุด (ต่อ process) แต่ละตัวถือการเชื่อมต่อและ
+# read snapshot ของ WAL ไว้จนกว่า client อ่านครบ คำขอที่เกินรอได้ถึง DB_POOL_TIMEOUT
+EXPORT_MAX_CONCURRENT = int(os.environ.get("EXPORT_MAX_CONCURRENT", "4"))
+_EXPORT_SLOTS = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+INVOICE_LINE_COLUMNS = (
+    "invoice_id", "invoice_number", "invoice_date", "customer_name",
+    "customer_address", "customer_tax_id", "total_amount",
+    "sku", "name", "price", "quantity", "subtotal",
+)
+
+
+def iter_invoice_lines(date_from: Optional[str] = None,
+                       date_to: Optional[str] = None,
+                       fetch_size: int = EXPORT_FETCH_SIZE) -> Iterator[List[sqlite3.Row]]:
+    """อ่านใบเสร็จ join รายการสินค้าตามช่วงวันที่ ทีละชุดด้วย fetchmany
+
+    ตรวจวันที่ทันทีที่เรียก (ValueError) โดยไม่แตะฐานข้อมูล แล้วคืน generator
+    ที่ให้ทีละ ``fetch_size`` แถว เรียงตาม (invoice_date_iso, id ใบเสร็จ, id รายการ)
+    คอลัมน์ตาม INVOICE_LINE_COLUMNS หน่วยความจำคงที่ไม่ว่าจะมีกี่แถว ปีที่ archive
+    แล้วอ่านเฉพาะไฟล์ที่อยู่ในช่วงวันที่
+
+    Args:
+        date_from, date_to: ช่วงวันที่ (รวมวันสุดท้าย) YYYY-MM-DD หรือ dd/mm/YYYY
+        fetch_size: จำนวนแถวต่อชุด
+
+    Returns:
+        Iterator ของ list แถว (sqlite3.Row)
+    """
+    conditions = []
+    params: List = []
+    date_from = parse_date_filter(date_from)
+    date_to = parse_date_filter(date_to)
+    if date_from:
+        conditions.append("i.invoice_date_iso >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("i.invoice_date_iso <= ?")
+        params.append(date_to)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    sql = f"""
+        SELECT i.id AS invoice_id, i.invoice_number,
+               i.invoice_date_iso AS invoice_date, i.customer_name,
+               i.customer_address, i.customer_tax_id, {_INVOICE_AMOUNT},
+               ii.sku, ii.name, ii.price_satang / 100.0 AS price, ii.quantity,
+               ii.subtotal_satang / 100.0 AS subtotal
+        FROM {{schema}}.invoices i
+        JOIN {{schema}}.invoice_items ii ON ii.invoice_id = i.id
+        {where}
+        ORDER BY i.invoice_date_iso, i.id, ii.id
+    """
+
+    def batches() -> Iterator[List[sqlite3.Row]]:
+        # รายการ archive อ่านจากฐานข้อมูล จึงหาเมื่อเริ่ม iterate (ใน threadpool ของ
+        # StreamingResponse) ไม่ใช่ตอนเรียกใน async handler
+        # archive จากเก่าไปใหม่แล้วจึงฐานข้อมูลหลัก ลำดับรวมจึงยังเรียงตามวันที่
+        statements = [sql.format(schema=schema)
+                      for schema in _partitions_by_date("asc", date_from, date_to)]
+        yield from _iter_query(statements, params, fetch_size)
+
+    return batches()
+
+
+def _iter_query(statements: List[str], params: List,
+                fetch_size: int) -> Iterator[List[sqlite3.Row]]:
+    """รัน ``statements`` ตามลำดับบนการเชื่อมต่อเฉพาะของ export นี้ ให้ทีละ ``fetch_size`` แถว
+
+    การเชื่อมต่อเปิดนอก pool เพราะถือไว้ตามความเร็วของ client (client ที่ช้าหรือค้าง
+    ไม่กินการเชื่อมต่อของคำขออื่น) และไม่ผูกกับ thread-local เพราะ generator อาจถูก
+    เรียกต่อจาก thread อื่น (StreamingResponse) จำนวน export พร้อมกันจำกัดด้วย
+    EXPORT_MAX_CONCURRENT
+    """
+    if not _EXPORT_SLOTS.acquire(timeout=DB_POOL_TIMEOUT):
+        raise PoolTimeout(
+            f"No export slot available after {DB_POOL_TIMEOUT}s"
+        )
+    try:
+        conn = get_read_pool().connect_dedicated()
+        try:
+            for sql in statements:
+                cursor = conn.execute(sql, params)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(fetch_size)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    # ปิด statement ที่อ่านไม่จบ (ผู้ใช้ยกเลิก) เพื่อคืน read snapshot
+                    cursor.close()
+        finally:
+            conn.close()
+    finally:
+        _EXPORT_SLOTS.release()
+
+
+# ==================== Data Version Functions ====================
+
+# ชื่อเวอร์ชันของ catalog สินค้า
+ITEMS_VERSION = "items"
+
+# ชื่อเวอร์ชันของรายชื่อลูกค้า และ mtime (ns) ของ customer.csv ที่นำเข้าล่าสุด
+CUSTOMERS_VERSION = "customers"
+CUSTOMERS_SOURCE_MTIME = "customers_source_mtime"
+
+# ชื่อเวอร์ชันของข้อมูลผู้ขาย (ใช้ล้างแคชใบเสร็จที่ render แล้ว)
+SELLER_VERSION = "seller"
+
+# เพิ่มขึ้นเมื่อแก้ยอดเงินของใบเสร็จที่บันทึกแล้ว (audit_invoice_totals(fix=True))
+INVOICES_VERSION = "invoices"
+
+# id ใบเสร็จล่าสุดที่อยู่ในตารางสรุปยอดขายแล้ว
+SALES_WATERMARK = "sales_watermark"
+
+# เวอร์ชันของรายการ archive (invoice_archives) เพิ่มทุกครั้งที่ย้ายปีออกจากฐานข้อมูลหลัก
+ARCHIVES_VERSION = "archives"
+
+
+def bump_data_version(conn: sqlite3.Connection, name: str) -> int:
+    """เพิ่มเลขเวอร์ชันของข้อมูล เรียกภายใน transaction ที่แก้ข้อมูลนั้น"""
+    cursor = conn.execute("""
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1
+        RETURNING version
+    """, (name,))
+    return cursor.fetchone()[0]
+
+
+def set_data_version(conn: sqlite3.Connection, name: str, value: int) -> None:
+    """ตั้งค่าเวอร์ชันของข้อมูลเป็นค่าที่กำหนด"""
+    conn.execute("""
+        INSERT INTO data_versions (name, version) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET version = excluded.version
+    """, (name, value))
+
+
+def get_data_version(name: str) -> int:
+    """เลขเวอร์ชันปัจจุบันของข้อมูล (0 ถ้ายังไม่เคยแก้ไข)"""
+    with get_read_connection() as conn:
+        row = conn.execute("""
+            SELECT version FROM data_versions WHERE name = ?
+        """, (name,)).fetchone()
+
+    return row['version'] if row else 0
 
 
 # ==================== Items Functions ====================
 
 def get_all_items() -> List[Dict]:
     """ดึงรายการสินค้าทั้งหมด"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT sku, name, price FROM items ORDER BY sku
-    """)
-    
-    items = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    return items
+    return get_all_items_versioned()[1]
+
+
+def get_all_items_versioned() -> Tuple[int, List[Dict]]:
+    """ดึงรายการสินค้าทั้งหมดพร้อมเลขเวอร์ชันของ catalog จาก snapshot เดียวกัน"""
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+
+        # อ่านเวอร์ชันและสินค้าใน transaction เดียว เวอร์ชันจึงตรงกับข้อมูลที่ได้
+        in_transaction = conn.in_transaction
+        if not in_transaction:
+            cursor.execute("BEGIN")
+        try:
+            cursor.execute("""
+                SELECT version FROM data_versions WHERE name = ?
+            """, (ITEMS_VERSION,))
+            row = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT sku, name, price_satang / 100.0 AS price FROM items ORDER BY sku
+            """)
+
+            items = [dict(row) for row in cursor.fetchall()]
+        finally:
+            if not in_transaction:
+                cursor.execute("COMMIT")
+
+    return (row['version'] if row else 0), items
 
 
 def get_items_count() -> int:
     """นับจำนวนสินค้าทั้งหมด"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) as count FROM items")
-    result = cursor.fetchone()
-    conn.close()
-    
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT COUNT(*) as count FROM items")
+        result = cursor.fetchone()
+
     return result['count'] if result else 0
 
 
 def clear_all_items() -> bool:
     """ลบสินค้าทั้งหมด"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute("DELETE FROM items")
-        conn.commit()
-        conn.close()
+        with write_transaction() as conn:
+            conn.execute("DELETE FROM items")
+            bump_data_version(conn, ITEMS_VERSION)
         return True
     except Exception as e:
-        conn.close()
         print(f"Error clearing items: {e}")
         return False
 
 
-def import_items_from_csv(csv_content: str) -> Tuple[bool, int, str]:
-    """นำเข้าสินค้าจาก CSV content
-    
+# จำนวนแถวต่อ batch ตอนนำเข้า CSV (commit ทุก batch)
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+
+# การนำเข้าที่ไม่อัปเดตความคืบหน้านานเกินนี้ (วินาที) ถือว่า process ที่นำเข้าหยุดไปแล้ว
+# worker อื่นเริ่มนำเข้าใหม่ได้
+IMPORT_LOCK_TIMEOUT = float(os.environ.get("IMPORT_LOCK_TIMEOUT", "300"))
+
+
+def _init_item_import_table(cursor: sqlite3.Cursor) -> None:
+    """สถานะการนำเข้าสินค้า (แถวเดียว) ใช้เป็นล็อกข้าม worker และความคืบหน้า"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_import_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            import_id INTEGER,
+            filename TEXT,
+            rows_read INTEGER NOT NULL DEFAULT 0,
+            imported INTEGER NOT NULL DEFAULT 0,
+            started_at REAL,
+            heartbeat_at REAL,
+            finished_at REAL,
+            success INTEGER,
+            message TEXT
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO item_import_state (id) VALUES (1)
+    """)
+
+
+def _claim_item_import(filename: str) -> int:
+    """จองการนำเข้าสินค้า คืนค่า import_id
+
+    Raises:
+        ImportInProgress: มีการนำเข้าที่ยังทำงานอยู่ (ของ process ใดก็ได้)
+    """
+    import_id = time.time_ns()
+    now = time.time()
+    with write_transaction() as conn:
+        row = conn.execute("""
+            SELECT import_id, heartbeat_at FROM item_import_state WHERE id = 1
+        """).fetchone()
+        if row['import_id'] is not None and row['heartbeat_at'] > now - IMPORT_LOCK_TIMEOUT:
+            raise ImportInProgress("Another item import is in progress")
+        conn.execute("""
+            UPDATE item_import_state
+            SET import_id = ?, filename = ?, rows_read = 0, imported = 0,
+                started_at = ?, heartbeat_at = ?, finished_at = NULL,
+                success = NULL, message = NULL
+            WHERE id = 1
+        """, (import_id, filename, now, now))
+    return import_id
+
+
+def _update_item_import(conn: sqlite3.Connection, import_id: int,
+                        rows_read: int, imported: int) -> None:
+    """บันทึกความคืบหน้าใน transaction ของ batch (ล็อกถูกยึดไปแล้วจะ raise)"""
+    cursor = conn.execute("""
+        UPDATE item_import_state
+        SET rows_read = ?, imported = ?, heartbeat_at = ?
+        WHERE id = 1 AND import_id = ?
+    """, (rows_read, imported, time.time(), import_id))
+    if cursor.rowcount == 0:
+        raise ImportInProgress("Item import lock was taken over by another import")
+
+
+def _release_item_import(import_id: int, success: bool, message: str) -> None:
+    with write_transaction() as conn:
+        conn.execute("""
+            UPDATE item_import_state
+            SET import_id = NULL, finished_at = ?, success = ?, message = ?
+            WHERE id = 1 AND import_id = ?
+        """, (time.time(), int(success), message, import_id))
+
+
+def get_item_import_progress() -> Dict:
+    """ความคืบหน้าการนำเข้าสินค้าล่าสุด (ของทุก worker)
+
+    Returns:
+        Dict ที่มี running, filename, rows_read, imported, started_at,
+        finished_at, success และ message
+    """
+    with get_read_connection() as conn:
+        row = conn.execute("""
+            SELECT * FROM item_import_state WHERE id = 1
+        """).fetchone()
+
+    if row is None:
+        return {"running": False, "rows_read": 0, "imported": 0}
+    progress = dict(row)
+    del progress['id']
+    import_id = progress.pop('import_id')
+    heartbeat_at = progress.pop('heartbeat_at')
+    running = import_id is not None and heartbeat_at > time.time() - IMPORT_LOCK_TIMEOUT
+    if progress['success'] is not None:
+        progress['success'] = bool(progress['success'])
+    return {"running": running, **progress}
+
+
+def _parse_item_row(row: Dict) -> Optional[Tuple[str, str, int, str]]:
+    """แปลงแถว CSV เป็น (sku, name, ราคาสตางค์, category) หรือ None ถ้าข้อมูลไม่ครบ"""
+    sku = (row.get('SKU') or '').strip()
+    name = (row.get('Name') or '').strip()
+    price_str = (row.get('Price [okbooks]') or '0').strip()
+    category = (row.get('Category') or '').strip()
+
+    # Parse price
+    try:
+        price = money.to_satang(price_str) if price_str else 0
+    except ValueError:
+        price = 0
+
+    # Only include items with valid data
+    if sku and name and price > 0:
+        return sku, name, price, category
+    return None
+
+
+def import_items_from_stream(stream: IO, batch_size: int = IMPORT_BATCH_SIZE,
+                             progress: Optional[Callable[[int, int], None]] = None,
+                             filename: str = ""
+                             ) -> Tuple[bool, int, str]:
+    """นำเข้าสินค้าจากไฟล์ CSV แบบอ่านทีละส่วน
+
+    อ่านไฟล์ทีละแถวและ upsert ตาม SKU เป็น batch ละ ``batch_size`` แถว
+    (commit ทุก batch จึงไม่ล็อกการบันทึกใบเสร็จนานและหน้าร้านยังเห็นสินค้าเดิม
+    ระหว่างนำเข้า) เมื่ออ่านครบจึงลบ SKU ที่ไม่มีในไฟล์ใหม่ ถ้าเกิดข้อผิดพลาด
+    กลางทาง แถวที่ commit แล้วยังอยู่และจะไม่มีการลบสินค้าเดิม
+
+    นำเข้าได้ทีละครั้งทั้งฐานข้อมูล (ล็อกในตาราง item_import_state ข้าม worker)
+    ความคืบหน้าบันทึกในแถวเดียวกันทุก batch อ่านได้จาก get_item_import_progress()
+
+    Args:
+        stream: ไฟล์แบบ binary (UTF-8) หรือ text
+        progress: callback ``progress(rows_read, imported)`` เรียกหลังแต่ละ batch
+        filename: ชื่อไฟล์ที่แสดงในความคืบหน้า
+
     Returns:
         Tuple of (success, count, message)
+
+    Raises:
+        ImportInProgress: มีการนำเข้าอื่นกำลังทำอยู่
+        UnicodeDecodeError: ไฟล์ไม่ใช่ UTF-8
     """
     import csv
     import io
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    import_id = _claim_item_import(filename)
+    rows_read = 0
+    count = 0
+    batch: List[Tuple] = []
+
+    def flush() -> None:
+        with write_transaction() as conn:
+            _update_item_import(conn, import_id, rows_read, count)
+            conn.executemany("""
+                INSERT INTO items (sku, name, price_satang, category, import_id)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (sku) DO UPDATE SET
+                    name = excluded.name,
+                    price_satang = excluded.price_satang,
+                    category = excluded.category,
+                    import_id = excluded.import_id
+            """, batch)
+            bump_data_version(conn, ITEMS_VERSION)
+        batch.clear()
+        if progress:
+            progress(rows_read, count)
+
     try:
-        # ลบข้อมูลเก่าทั้งหมด
-        cursor.execute("DELETE FROM items")
-        
-        # อ่าน CSV
-        csv_file = io.StringIO(csv_content)
-        csv_reader = csv.DictReader(csv_file)
-        
-        count = 0
+        csv_reader = csv.DictReader(stream)
+
         for row in csv_reader:
-            try:
-                sku = row.get('SKU', '').strip()
-                name = row.get('Name', '').strip()
-                price_str = row.get('Price [okbooks]', '0').strip()
-                category = row.get('Category', '').strip()
-                
-                # Parse price
-                try:
-                    price = float(price_str) if price_str else 0.0
-                except ValueError:
-                    price = 0.0
-                
-                # Only include items with valid data
-                if sku and name and price > 0:
-                    cursor.execute("""
-                        INSERT INTO items (sku, name, price, category)
-                        VALUES (?, ?, ?, ?)
-                    """, (sku, name, price, category))
-                    count += 1
-            except Exception as e:
+            rows_read += 1
+            item = _parse_item_row(row)
+            if item is None:
                 continue
-        
-        conn.commit()
-        conn.close()
-        
-        return True, count, f"นำเข้าสินค้าสำเร็จ {count} รายการ"
-        
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        return False, 0, f"เกิดข้อผิดพลาด: {str(e)}"
+            batch.append(item + (import_id,))
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
 
+        # ลบสินค้าที่ไม่อยู่ในไฟล์ใหม่ และ batch สุดท้ายใน transaction เดียวกัน
+        # (_update_item_import ยืนยันว่ายังถือล็อกอยู่ก่อนลบ)
+        with write_transaction() as conn:
+            _update_item_import(conn, import_id, rows_read, count)
+            if batch:
+                flush()
+            conn.execute("""
+                DELETE FROM items WHERE import_id IS NOT ?
+            """, (import_id,))
+            bump_data_version(conn, ITEMS_VERSION)
+        if progress:
+            progress(rows_read, count)
 
-# เริ่มต้นฐานข้อมูลเมื่อ import module
-init_database()
\ No newline at end of file
+        message = f"นำเข้าสินค้าสำเร็จ {count} รายการ"
+        _release_item_import(import_id, True, message)
+        return True, count, message
+
+    except ImportInProgress:
+        # ล็อกถูก worker อื่นยึดไปแล้ว (หยุดนานเกิน IMPORT_LOCK_TIMEOUT) ไม่แตะสถานะของเขา
+        raise
+    except UnicodeDecodeError:
+        _release_item_import(import_id, False, "invalid encoding")
+        raise
+    except Exception as e:
+        message = f"เกิดข้อผิดพลาด: {str(e)}"
+        _release_item_import(import_id, False, message)
+        return False, 0, message
+
+
+def import_items_from_csv(csv_content: str) -> Tuple[bool, int, str]:
+    """นำเข้าสินค้าจาก CSV content
+    
+    Returns:
+        Tuple of (success, count, message)
+    """
+    import io
+
+    return import_items_from_stream(io.StringIO(csv_content, newline=''))
+
+
+# ==================== Customer Functions ====================
+
+def parse_customer_row(row: Dict) -> Optional[Dict]:
+    """แปลงแถว CSV (คอลัมน์ Name, Address, Tax ID) เป็นข้อมูลลูกค้า"""
+    name = (row.get('Name') or '').strip()
+    address = (row.get('Address') or '').strip()
+    tax_id = (row.get('Tax ID') or '').strip()
+
+    if name:
+        return {
+            'name': name,
+            'address': address,
+            'tax_id': tax_id
+        }
+    return None
+
+
+def customer_search_key(name: str) -> str:
+    """ข้อความสำหรับค้นหาชื่อลูกค้าแบบไม่สนตัวพิมพ์"""
+    return " ".join(name.casefold().split())
+
+
+def import_customers_from_stream(stream: IO, batch_size: int = IMPORT_BATCH_SIZE,
+                                 source_mtime: Optional[int] = None
+                                 ) -> Tuple[bool, int, str]:
+    """นำเข้ารายชื่อลูกค้าจาก CSV แบบอ่านทีละส่วน
+
+    upsert ตาม (ชื่อ, เลขประจำตัวผู้เสียภาษี) เป็น batch แล้วลบลูกค้าที่ไม่อยู่
+    ในไฟล์ใหม่ ถ้าระบุ ``source_mtime`` จะบันทึกไว้เพื่อให้ทุก worker รู้ว่า
+    นำเข้าไฟล์เวอร์ชันนี้แล้ว
+
+    Returns:
+        Tuple of (success, count, message)
+    """
+    import csv
+    import io
+
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    import_id = time.time_ns()
+    count = 0
+    batch: List[Tuple] = []
+
+    def flush() -> None:
+        with write_transaction() as conn:
+            conn.executemany("""
+                INSERT INTO customers (name, address, tax_id, search_key, import_id)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (name, tax_id) DO UPDATE SET
+                    address = excluded.address,
+                    search_key = excluded.search_key,
+                    import_id = excluded.import_id
+            """, batch)
+            bump_data_version(conn, CUSTOMERS_VERSION)
+        batch.clear()
+
+    try:
+        for row in csv.DictReader(stream):
+            customer = parse_customer_row(row)
+            if customer is None:
+                continue
+            batch.append((
+                customer['name'],
+                customer['address'],
+                customer['tax_id'],
+                customer_search_key(customer['name']),
+                import_id
+            ))
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+
+        with write_transaction() as conn:
+            if batch:
+                flush()
+            conn.execute("""
+                DELETE FROM customers WHERE import_id IS NOT ?
+            """, (import_id,))
+            bump_data_version(conn, CUSTOMERS_VERSION)
+            if source_mtime is not None:
+                set_data_version(conn, CUSTOMERS_SOURCE_MTIME, source_mtime)
+
+        return True, count, f"นำเข้าลูกค้าสำเร็จ {count} รายการ"
+
+    except UnicodeDecodeError:
+        raise
+    except Exception as e:
+        return False, 0, f"เกิดข้อผิดพลาด: {str(e)}"
+
+
+def sync_customers_from_csv(csv_path: str = "customer.csv") -> bool:
+    """นำเข้า customer.csv ใหม่ถ้าไฟล์ถูกแก้ไขหลังการนำเข้าครั้งล่าสุด
+
+    เทียบ mtime ของไฟล์กับค่าที่บันทึกไว้ในฐานข้อมูล worker หลายตัว
+    จึงไม่นำเข้าไฟล์เดิมซ้ำ คืนค่า True ถ้ามีการนำเข้าใหม่
+    """
+    try:
+        mtime = os.stat(csv_path).st_mtime_ns
+    except OSError:
+        return False
+
+    if get_data_version(CUSTOMERS_SOURCE_MTIME) == mtime:
+        return False
+
+    with open(csv_path, 'rb') as file:
+        success, count, message = import_customers_from_stream(
+            file, source_mtime=mtime
+        )
+    if not success:
+        print(f"Error importing customers: {message}")
+    return success
+
+
+def search_customers(query: str = "", limit: int = 20,
+                     cursor: Optional[str] = None, shape: str = "objects") -> Dict:
+    """ค้นหาลูกค้าจากชื่อ (มีคำค้นอยู่ในชื่อ) หรือเลขประจำตัวผู้เสียภาษี (ขึ้นต้นด้วย)
+
+    เรียงตามชื่อและแบ่งหน้าด้วย cursor ``(name, id)`` ของแถวสุดท้าย
+    ``shape`` เป็นรูปแบบของ ``customers`` (ดู ROW_SHAPES)
+
+    Returns:
+        Dict ที่มี ``customers`` และ ``next_cursor`` (None เมื่อถึงหน้าสุดท้าย)
+    """
+    _check_shape(shape)
+    conditions = []
+    params: List = []
+
+    query = query.strip()
+    if query:
+        conditions.append("(instr(search_key, ?) > 0 OR tax_id GLOB ?)")
+        params += [customer_search_key(query), _glob_prefix(query)]
+
+    if cursor:
+        last_name, last_id = decode_cursor(cursor, 2)
+        conditions.append("(name, id) > (?, ?)")
+        params += [str(last_name), int(last_id)]
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_read_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.row_factory = None
+        db_cursor.execute(f"""
+            SELECT id, name, address, tax_id
+            FROM customers
+            {where}
+            ORDER BY name, id
+            LIMIT ?
+        """, params + [limit])
+        columns, rows = _fetch_rows(db_cursor)
+
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last_id, last_name = rows[-1][:2]
+        next_cursor = encode_cursor(last_name, last_id)
+
+    return {"customers": _shape_rows(columns, rows, shape), "next_cursor": next_cursor}
+
+
+def get_customer(customer_id: int) -> Optional[Dict]:
+    """ดึงข้อมูลลูกค้าตาม ID"""
+    with get_read_connection() as conn:
+        row = conn.execute("""
+            SELECT id, name, address, tax_id FROM customers WHERE id = ?
+        """, (customer_id,)).fetchone()
+
+    return dict(row) if row else None
+
+
+# ==================== Sales Report Functions ====================
+
+# จำนวนใบเสร็จต่อชุดเมื่อนำใบเสร็จเก่าเข้าตารางสรุปยอดขาย
+SALES_CATCH_UP_BATCH = 5000
+
+# ตารางสรุปยอดขาย: (ชื่อตาราง, คอลัมน์ key, คอลัมน์ที่บวกสะสม) ยอดเงินเป็นสตางค์
+_SALES_DAILY = ("sales_daily", ("day",),
+                ("invoice_count", "line_count", "quantity", "total_satang"))
+_SALES_SKU_TABLES = {
+    "day": ("sales_daily_sku", ("day", "sku")),
+    "month": ("sales_monthly_sku", ("month", "sku")),
+    "year": ("sales_yearly_sku", ("year", "sku")),
+}
+_SALES_CUSTOMER_TABLES = {
+    "day": ("sales_daily_customer", ("day", "customer_name", "customer_tax_id")),
+    "month": ("sales_monthly_customer", ("month", "customer_name", "customer_tax_id")),
+    "year": ("sales_yearly_customer", ("year", "customer_name", "customer_tax_id")),
+}
+
+# ความละเอียดของตารางสรุปและ key จากวันที่ ISO (วัน YYYY-MM-DD, เดือน YYYY-MM, ปี ค.ศ. YYYY)
+_SALES_GRAINS = (("day", 10), ("month", 7), ("year", 4))
+_SKU_VALUES = ("line_count", "quantity", "amount_satang")
+_CUSTOMER_VALUES = ("invoice_count", "total_satang")
+
+
+def _init_sales_tables(cursor: sqlite3.Cursor) -> None:
+    """สร้างตารางสรุปยอดขายรายวัน/รายเดือน (อัปเดตใน transaction เดียวกับการบันทึกใบเสร็จ)
+
+    ใบเสร็จที่มีอยู่เดิมถูกนำเข้าตารางสรุปใน migration 4 (หลังแปลงยอดเงินเป็นสตางค์)
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            day TEXT PRIMARY KEY,
+            invoice_count INTEGER NOT NULL,
+            line_count INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            total_satang INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+    for table, key in _SALES_SKU_TABLES.values():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key[0]} TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                name TEXT NOT NULL,
+                line_count INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                amount_satang INTEGER NOT NULL,
+                PRIMARY KEY ({", ".join(key)})
+            ) WITHOUT ROWID
+        """)
+
+    for table, key in _SALES_CUSTOMER_TABLES.values():
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key[0]} TEXT NOT NULL,
+                customer_name TEXT NOT NULL,
+                customer_tax_id TEXT NOT NULL,
+                invoice_count INTEGER NOT NULL,
+                total_satang INTEGER NOT NULL,
+                PRIMARY KEY ({", ".join(key)})
+            ) WITHOUT ROWID
+        """)
+
+
+@functools.lru_cache(maxsize=None)
+def _upsert_sales_sql(table: str, key: Tuple[str, ...], values: Tuple[str, ...],
+                      replace: Tuple[str, ...]) -> str:
+    columns = key + replace + values
+    updates = [f"{column} = {column} + excluded.{column}" for column in values]
+    updates += [f"{column} = excluded.{column}" for column in replace]
+    return f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join("?" for _ in columns)})
+        ON CONFLICT ({", ".join(key)}) DO UPDATE SET {", ".join(updates)}
+    """
+
+
+def _upsert_sales(cursor: sqlite3.Cursor, table: str, key: Tuple[str, ...],
+                  values: Tuple[str, ...], rows: List[Tuple],
+                  replace: Tuple[str, ...] = ()) -> None:
+    """บวกยอดเข้าตารางสรุป (แถวใหม่ INSERT แถวเดิมบวกเพิ่ม)"""
+    if rows:
+        cursor.executemany(_upsert_sales_sql(table, key, values, replace), rows)
+
+
+def _record_sales(cursor: sqlite3.Cursor, invoices: List[Tuple],
+                  lines: List[Tuple]) -> None:
+    """บวกใบเสร็จใหม่เข้าตารางสรุปยอดขาย เรียกภายใน transaction ที่บันทึกใบเสร็จ
+
+    Args:
+        invoices: tuple (invoice_id, วันที่ ISO, ชื่อลูกค้า, เลขผู้เสียภาษี, ยอดรวมสตางค์)
+        lines: แถวรายการสินค้าแบบเดียวกับ _insert_invoice_items
+    """
+    if not invoices:
+        return
+
+    days: Dict[int, str] = {}
+    daily: Dict[str, List] = {}
+    customers: Dict[str, Dict[Tuple, List]] = {grain: {} for grain, _ in _SALES_GRAINS}
+    skus: Dict[str, Dict[Tuple, List]] = {grain: {} for grain, _ in _SALES_GRAINS}
+
+    for invoice_id, day, customer_name, customer_tax_id, total_satang in invoices:
+        days[invoice_id] = day
+        totals = daily.setdefault(day, [0, 0, 0, 0])
+        totals[0] += 1
+        totals[3] += total_satang
+        for grain, length in _SALES_GRAINS:
+            entry = customers[grain].setdefault(
+                (day[:length], customer_name, customer_tax_id or ""), [0, 0]
+            )
+            entry[0] += 1
+            entry[1] += total_satang
+
+    for invoice_id, sku, name, _, quantity, subtotal in lines:
+        day = days[invoice_id]
+        totals = daily[day]
+        totals[1] += 1
+        totals[2] += quantity
+        for grain, length in _SALES_GRAINS:
+            entry = skus[grain].setdefault((day[:length], sku), [name, 0, 0, 0])
+            entry[0] = name
+            entry[1] += 1
+            entry[2] += quantity
+            entry[3] += subtotal
+
+    table, key, values = _SALES_DAILY
+    _upsert_sales(cursor, table, key, values,
+                  [(day, *totals) for day, totals in daily.items()])
+    for grain, (table, key) in _SALES_SKU_TABLES.items():
+        _upsert_sales(cursor, table, key, _SKU_VALUES,
+                      [(*k, *v) for k, v in skus[grain].items()], replace=("name",))
+    for grain, (table, key) in _SALES_CUSTOMER_TABLES.items():
+        _upsert_sales(cursor, table, key, _CUSTOMER_VALUES,
+                      [(*k, *v) for k, v in customers[grain].items()])
+
+    set_data_version(cursor.connection, SALES_WATERMARK, max(days))
+
+
+def _catch_up_sales(conn: sqlite3.Connection) -> int:
+    """นำใบเสร็จที่ id มากกว่า watermark เข้าตารางสรุป คืนค่าจำนวนใบเสร็จ"""
+    cursor = conn.cursor()
+    row = cursor.execute("""
+        SELECT version FROM data_versions WHERE name = ?
+    """, (SALES_WATERMARK,)).fetchone()
+    watermark = row[0] if row else 0
+    applied = 0
+
+    while True:
+        invoices = cursor.execute("""
+            SELECT id, invoice_date_iso, customer_name, customer_tax_id, total_satang
+            FROM invoices
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (watermark, SALES_CATCH_UP_BATCH)).fetchall()
+        if not invoices:
+            return applied
+
+        last_id = invoices[-1][0]
+        lines = cursor.execute("""
+            SELECT invoice_id, sku, name, price_satang, quantity, subtotal_satang
+            FROM invoice_items
+            WHERE invoice_id > ? AND invoice_id <= ?
+        """, (watermark, last_id)).fetchall()
+
+        _record_sales(cursor, [tuple(r) for r in invoices], [tuple(r) for r in lines])
+        applied += len(invoices)
+        watermark = last_id
+
+
+def catch_up_sales_summaries() -> int:
+    """อัปเดตตารางสรุปยอดขายให้ครบทุกใบเสร็จ คืนค่าจำนวนใบเสร็จที่เพิ่ม"""
+    with write_transaction() as conn:
+        return _catch_up_sales(conn)
+
+
+def rebuild_sales_summaries() -> int:
+    """สร้างตารางสรุปยอดขายใหม่จาก invoices และ invoice_items
+
+    ยอดของปีที่ archive แล้วไม่อยู่ในฐานข้อมูลหลัก จึงคงค่าเดิมไว้
+
+    Returns:
+        จำนวนใบเสร็จที่นำเข้าตารางสรุป
+    """
+    with write_transaction() as conn:
+        return _rebuild_sales(conn)
+
+
+def _sales_tables() -> List[str]:
+    return [table for table, _ in _sales_table_keys()]
+
+
+def _sales_table_keys() -> List[Tuple[str, str]]:
+    """(ชื่อตาราง, คอลัมน์วันที่/เดือน/ปี) ของตารางสรุปทุกตาราง"""
+    tables = [(_SALES_DAILY[0], _SALES_DAILY[1][0])]
+    tables += [(table, key[0]) for table, key in _SALES_SKU_TABLES.values()]
+    tables += [(table, key[0]) for table, key in _SALES_CUSTOMER_TABLES.values()]
+    return tables
+
+
+def _rebuild_sales(conn: sqlite3.Connection) -> int:
+    archived = _archived_through(conn)
+    if archived is None:
+        for table in _sales_tables():
+            conn.execute(f"DELETE FROM {table}")
+        set_data_version(conn, SALES_WATERMARK, 0)
+    else:
+        # ลบเฉพาะปี ค.ศ. หลังปีที่ archive ล่าสุด key ทุกความละเอียดขึ้นต้นด้วยปี
+        # จึงเทียบกับ "YYYY" ได้ตรงๆ (เช่น "2024-12-31" < "2025" <= "2025-01")
+        year, max_id = archived
+        first_key = str(year - 543 + 1)
+        for table, column in _sales_table_keys():
+            conn.execute(f"DELETE FROM {table} WHERE {column} >= ?", (first_key,))
+        set_data_version(conn, SALES_WATERMARK, max_id)
+    return _catch_up_sales(conn)
+
+
+def _range_condition(column: str, start: Optional[str], end: Optional[str]) -> Tuple[str, List]:
+    conditions = []
+    params: List = []
+    if start:
+        conditions.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        conditions.append(f"{column} <= ?")
+        params.append(end)
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def _split_report_range(date_from: Optional[str],
+                        date_to: Optional[str]) -> List[Tuple[str, str, str]]:
+    """แบ่งช่วงวันที่เป็นปีเต็ม เดือนเต็ม และวันที่เหลือที่ขอบ
+
+    ปีเต็มอ่านจากตารางรายปี เดือนเต็มที่เหลืออ่านจากตารางรายเดือน ส่วนที่ขอบ
+    อ่านจากตารางรายวัน จำนวนแถวที่ต้องรวมจึงไม่โตตามความยาวของช่วงวันที่
+
+    Returns:
+        List ของ (ความละเอียด, ค่าเริ่มต้น, ค่าสุดท้าย) เช่น ("month", "2024-02", "2024-11")
+    """
+    start = parse_date_filter(date_from)
+    end = parse_date_filter(date_to)
+    first = date.fromisoformat(start) if start else date.min
+    last = date.fromisoformat(end) if end else date.max
+    segments: List[Tuple[str, str, str]] = []
+    if first > last:
+        return segments
+
+    def days(lo: date, hi: date) -> None:
+        segments.append(("day", lo.isoformat(), hi.isoformat()))
+
+    def months(lo: date, hi: date) -> None:
+        month_lo = lo if lo.day == 1 else (lo.replace(day=28) + timedelta(days=4)).replace(day=1)
+        is_month_end = hi == date.max or (hi + timedelta(days=1)).day == 1
+        month_hi = hi if is_month_end else hi.replace(day=1) - timedelta(days=1)
+        if month_lo > month_hi:
+            days(lo, hi)
+            return
+        segments.append(("month", month_lo.strftime("%Y-%m"), month_hi.strftime("%Y-%m")))
+        if lo < month_lo:
+            days(lo, month_lo - timedelta(days=1))
+        if hi > month_hi:
+            days(month_hi + timedelta(days=1), hi)
+
+    year_lo = first.year if (first.month, first.day) == (1, 1) else first.year + 1
+    year_hi = last.year if (last.month, last.day) == (12, 31) else last.year - 1
+    if year_lo > year_hi:
+        months(first, last)
+        return segments
+
+    segments.append(("year", f"{year_lo:04d}", f"{year_hi:04d}"))
+    if first < date(year_lo, 1, 1):
+        months(first, date(year_lo - 1, 12, 31))
+    if last > date(year_hi, 12, 31):
+        months(date(year_hi + 1, 1, 1), last)
+    return segments
+
+
+def sales_by_period(period: str = "day", date_from: Optional[str] = None,
+                    date_to: Optional[str] = None) -> List[Dict]:
+    """ยอดขายรวมรายวัน รายเดือน หรือรายปี (พ.ศ.) จากตาราง sales_daily
+
+    Args:
+        period: ``day``, ``month`` หรือ ``year``
+        date_from, date_to: ช่วงวันที่ (รวมวันสุดท้าย) YYYY-MM-DD หรือ dd/mm/YYYY
+
+    Returns:
+        List ของ dict ที่มี period, invoice_count, line_count, quantity, total_amount
+    """
+    expressions = {
+        "day": "day",
+        "month": "substr(day, 1, 7)",
+        "year": "CAST(substr(day, 1, 4) AS INTEGER) + 543",
+    }
+    if period not in expressions:
+        raise ValueError(f"Unknown period '{period}', expected day, month or year")
+
+    where, params = _range_condition(
+        "day", parse_date_filter(date_from), parse_date_filter(date_to)
+    )
+    with get_read_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT {expressions[period]} AS period,
+                   SUM(invoice_count) AS invoice_count,
+                   SUM(line_count) AS line_count,
+                   SUM(quantity) AS quantity,
+                   SUM(total_satang) / 100.0 AS total_amount
+            FROM sales_daily
+            {where}
+            GROUP BY 1
+            ORDER BY 1
+        """, params).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def _sales_ranking(tables: Dict[str, Tuple], columns: str, group_by: str,
+                   totals: str, order_by: str, date_from: Optional[str],
+                   date_to: Optional[str], limit: int) -> List[Dict]:
+    """รวมยอดจากตารางรายปี/รายเดือน/รายวันตามช่วงที่แบ่งได้ แล้วจัดอันดับ"""
+    parts = []
+    params: List = []
+    for grain, start, end in _split_report_range(date_from, date_to):
+        table, key = tables[grain]
+        where, part_params = _range_condition(key[0], start, end)
+        parts.append(f"SELECT {columns} FROM {table} {where}")
+        params += part_params
+    if not parts:
+        return []
+
+    with get_read_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT {group_by}, {totals}
+            FROM ({" UNION ALL ".join(parts)})
+            GROUP BY {group_by}
+            ORDER BY {order_by} DESC, {group_by}
+            LIMIT ?
+        """, params + [limit]).fetchall()
+
+    return [dict(row) for row in rows]
+
+
+def sales_by_sku(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 limit: int = 50, order_by: str = "amount") -> List[Dict]:
+    """สินค้าขายดีตามยอดเงิน (``amount``) หรือจำนวนชิ้น (``quantity``)"""
+    if order_by not in ("amount", "quantity"):
+        raise ValueError(f"Unknown order_by '{order_by}', expected amount or quantity")
+    return _sales_ranking(
+        _SALES_SKU_TABLES,
+        "sku, name, line_count, quantity, amount_satang",
+        "sku",
+        "MAX(name) AS name, SUM(line_count) AS line_count, "
+        "SUM(quantity) AS quantity, SUM(amount_satang) / 100.0 AS amount",
+        order_by, date_from, date_to, limit
+    )
+
+
+def sales_by_customer(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      limit: int = 50) -> List[Dict]:
+    """ลูกค้าที่มียอดซื้อสูงสุดในช่วงวันที่"""
+    return _sales_ranking(
+        _SALES_CUSTOMER_TABLES,
+        "customer_name, customer_tax_id, invoice_count, total_satang",
+        "customer_name, customer_tax_id",
+        "SUM(invoice_count) AS invoice_count, SUM(total_satang) / 100.0 AS total_amount",
+        "total_amount", date_from, date_to, limit
+    )
+
+
+# ==================== Idempotency Functions ====================
+
+# เวลาที่ Idempotency-Key ยังใช้ได้ (วินาที) หลังจากนั้นคีย์เดิมสร้างใบเสร็จใหม่ได้
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", str(24 * 3600)))
+
+
+def _init_idempotency_table(cursor: sqlite3.Cursor) -> None:
+    """ตาราง Idempotency-Key ของการสร้างใบเสร็จ (คีย์ -> ใบเสร็จที่สร้างแล้ว)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            request_hash TEXT NOT NULL,
+            invoice_id INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_idempotency_created
+        ON idempotency_keys(created_at)
+    """)
+
+
+def _find_idempotency_key(conn: sqlite3.Connection, key: str) -> Optional[Tuple[str, int]]:
+    row = conn.execute("""
+        SELECT request_hash, invoice_id FROM idempotency_keys
+        WHERE key = ? AND created_at >= ?
+    """, (key, time.time() - IDEMPOTENCY_TTL)).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def get_idempotent_invoice(key: str) -> Optional[Tuple[str, int]]:
+    """ค้นหาใบเสร็จที่สร้างด้วยคีย์นี้ คืนค่า (request_hash, invoice_id) หรือ None"""
+    with get_read_connection() as conn:
+        return _find_idempotency_key(conn, key)
+
+
+def save_invoice_once(key: str, request_hash: str, customer_info: Dict,
+                      items: List[Dict], seller_id: int = 1) -> Optional[Dict]:
+    """บันทึกใบเสร็จครั้งเดียวต่อ Idempotency-Key
+
+    ตรวจคีย์และบันทึกใน write transaction เดียวกัน คำขอซ้ำจาก worker อื่นที่มาถึง
+    พร้อมกันจึงได้ใบเสร็จเดิม ไม่ใช้เลขรันเพิ่ม คีย์ที่หมดอายุถูกลบไปพร้อมกัน
+
+    Args:
+        key: ค่า Idempotency-Key จาก client
+        request_hash: hash ของเนื้อหาคำขอ (ใช้ตรวจว่าคีย์ถูกใช้กับคำขออื่น)
+
+    Returns:
+        Dict ที่มี invoice_id, request_hash และ replayed (True ถ้าคีย์เคยใช้แล้ว)
+        หรือ None ถ้าบันทึกไม่สำเร็จ
+
+    Raises:
+        ValueError: ข้อมูลใบเสร็จไม่ถูกต้อง (ตรวจด้วย validate_invoice_payload)
+    """
+    validate_invoice_payload(customer_info, items)
+    try:
+        with write_transaction() as conn:
+            existing = _find_idempotency_key(conn, key)
+            if existing:
+                return {"invoice_id": existing[1], "request_hash": existing[0],
+                        "replayed": True}
+
+            invoice_id = _save_invoice(conn, customer_info, items, seller_id)
+            now = time.time()
+            conn.execute("""
+                DELETE FROM idempotency_keys WHERE created_at < ?
+            """, (now - IDEMPOTENCY_TTL,))
+            conn.execute("""
+                INSERT INTO idempotency_keys
+                (key, request_hash, invoice_id, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, request_hash, invoice_id, now))
+        return {"invoice_id": invoice_id, "request_hash": request_hash, "replayed": False}
+
+    except Exception as e:
+        print(f"Error saving invoice: {e}")
+        return None
+
+
+# ==================== Money Audit Functions ====================
+
+# ยอดที่คำนวณใหม่จากราคา x จำนวน ต่อใบเสร็จ ไล่ใบเสร็จตาม id ครั้งเดียว
+# (GROUP BY i.id เรียงตามการ scan อยู่แล้ว จึงไม่ต้อง sort หรือสร้าง index ชั่วคราว)
+# {where} จำกัดใบเสร็จที่ตรวจ (เช่น ปีที่จะ archive) ค่าว่าง = ทุกใบ
+_AUDIT_MISMATCH_SQL = """
+    SELECT i.id, i.invoice_number, i.total_satang,
+           COUNT(ii.id) AS line_count,
+           COALESCE(SUM(ii.subtotal_satang), 0) AS stored_lines_satang,
+           COALESCE(SUM(ii.price_satang * ii.quantity), 0) AS computed_satang,
+           COALESCE(SUM(ii.subtotal_satang != ii.price_satang * ii.quantity), 0) AS bad_lines
+    FROM invoices i
+    LEFT JOIN invoice_items ii ON ii.invoice_id = i.id
+    {where}
+    GROUP BY i.id
+    HAVING i.total_satang != computed_satang OR bad_lines > 0
+"""
+
+
+def _audit(conn: sqlite3.Connection, limit: int) -> Dict:
+    invoices, total_satang = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(total_satang), 0) FROM invoices
+    """).fetchone()
+    lines, line_mismatches = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(subtotal_satang != price_satang * quantity), 0)
+        FROM invoice_items
+    """).fetchone()
+
+    mismatches = []
+    invoice_mismatches = 0
+    for row in conn.execute(_AUDIT_MISMATCH_SQL.format(where="")):
+        invoice_mismatches += 1
+        if len(mismatches) < limit:
+            mismatches.append(dict(row))
+
+    return {
+        "invoices": invoices,
+        "lines": lines,
+        "total_satang": total_satang,
+        "line_mismatches": line_mismatches,
+        "invoice_mismatches": invoice_mismatches,
+        "mismatches": mismatches,
+        "fixed": False,
+    }
+
+
+def audit_invoice_totals(limit: int = 100, fix: bool = False) -> Dict:
+    """ตรวจยอดเงินของใบเสร็จทั้งหมดโดยคำนวณใหม่ใน SQL
+
+    คำนวณราคา x จำนวนของทุกรายการและผลรวมต่อใบเสร็จเป็นจำนวนเต็มสตางค์ใน SQLite
+    ทีละทั้งตาราง (ไม่วนทีละแถวใน Python) แล้วเทียบกับ subtotal_satang และ
+    total_satang ที่บันทึกไว้ ตรวจเฉพาะฐานข้อมูลหลัก ปีที่ archive แล้วผ่านการตรวจ
+    ก่อนย้ายและแก้ไขไม่ได้อีก
+
+    Args:
+        limit: จำนวนใบเสร็จที่ยอดไม่ตรงสูงสุดที่ส่งรายละเอียดกลับ
+        fix: แก้ยอดที่ไม่ตรงเป็นค่าที่คำนวณใหม่ แล้วสร้างตารางสรุปยอดขายใหม่
+
+    Returns:
+        Dict ที่มี invoices, lines, total_satang, line_mismatches, invoice_mismatches,
+        mismatches (ไม่เกิน ``limit`` ใบ) และ fixed
+    """
+    if not fix:
+        with get_read_connection() as conn:
+            return _audit(conn, limit)
+
+    with write_transaction() as conn:
+        result = _audit(conn, limit)
+        if result["line_mismatches"] or result["invoice_mismatches"]:
+            conn.execute("""
+                UPDATE invoice_items SET subtotal_satang = price_satang * quantity
+                WHERE subtotal_satang != price_satang * quantity
+            """)
+            conn.execute("""
+                UPDATE invoices SET total_satang = (
+                    SELECT COALESCE(SUM(subtotal_satang), 0) FROM invoice_items
+                    WHERE invoice_id = invoices.id
+                )
+                WHERE total_satang != (
+                    SELECT COALESCE(SUM(subtotal_satang), 0) FROM invoice_items
+                    WHERE invoice_id = invoices.id
+                )
+            """)
+            _rebuild_sales(conn)
+            bump_data_version(conn, INVOICES_VERSION)
+            result["fixed"] = True
+    return result
+
+
+# ==================== Archive Functions ====================
+
+# ใบเสร็จของปีที่ปิดแล้วย้ายไปไฟล์ละปี (invoices_2567.db, ...) ที่ไม่เปลี่ยนอีก
+# ฐานข้อมูลหลักจึงเหลือเฉพาะปีปัจจุบัน สำรองข้อมูลและ VACUUM ได้เร็วไม่ว่าจะใช้งานมากี่ปี
+# ไฟล์ archive ถูก ATTACH เข้าการเชื่อมต่อฝั่งอ่านเป็น schema arch_<ปี> แบบ read-only
+
+# (เวอร์ชันของ ARCHIVES_VERSION, ปี พ.ศ. -> archive) ของ process นี้
+_archives: Tuple[int, Dict[int, Dict]] = (-1, {})
+_archives_lock = threading.Lock()
+
+
+def _init_archive_table(cursor: sqlite3.Cursor) -> None:
+    """ตารางรายการปีที่ archive แล้ว (ไฟล์ จำนวนใบเสร็จ ยอดรวม และช่วง id)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_archives (
+            buddhist_year INTEGER PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            invoice_count INTEGER NOT NULL,
+            line_count INTEGER NOT NULL,
+            total_satang INTEGER NOT NULL,
+            min_id INTEGER NOT NULL,
+            max_id INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _archive_dir() -> Path:
+    return Path(ARCHIVE_DIR) if ARCHIVE_DIR else Path(DATABASE_PATH).parent
+
+
+def get_archives(check: bool = True) -> Dict[int, Dict]:
+    """ปีที่ archive แล้ว (ปี พ.ศ. -> ข้อมูลจาก invoice_archives พร้อม schema และ path)
+
+    อ่านเลขเวอร์ชันหนึ่งแถว เมื่อ process ใดก็ตาม archive ปีใหม่จะโหลดรายการใหม่
+    และปรับการ ATTACH ของ pool ฝั่งอ่านให้ตรงกัน เรียงจากปีเก่าไปใหม่
+
+    Args:
+        check: False = ใช้รายการที่โหลดไว้โดยไม่อ่านเวอร์ชัน (archive ไม่ถูกลบหรือแก้
+            รายการเดิมจึงถูกเสมอ แต่อาจยังไม่มีปีที่เพิ่ง archive)
+    """
+    global _archives
+    if not check and _archives[0] >= 0:
+        return _archives[1]
+    version = get_data_version(ARCHIVES_VERSION)
+    if version == _archives[0]:
+        return _archives[1]
+
+    with _archives_lock:
+        if version != _archives[0]:
+            with get_read_connection() as conn:
+                rows = conn.execute("""
+                    SELECT * FROM invoice_archives ORDER BY buddhist_year
+                """).fetchall()
+            archives = {}
+            for row in rows:
+                archive = dict(row)
+                archive['schema'] = f"arch_{archive['buddhist_year']}"
+                archive['path'] = str(_archive_dir() / archive['file_name'])
+                archives[archive['buddhist_year']] = archive
+            get_read_pool().set_attachments(
+                {archive['schema']: archive['path'] for archive in archives.values()}
+            )
+            _archives = (version, archives)
+    return _archives[1]
+
+
+def _archive_for_id(invoice_id: int) -> Optional[Dict]:
+    for archive in get_archives().values():
+        if archive['min_id'] <= invoice_id <= archive['max_id']:
+            return archive
+    return None
+
+
+def _closed_invoice_year(invoice_number: str) -> Optional[int]:
+    """ปี พ.ศ. ท้ายเลขที่ใบเสร็จ (NNN/YYYY) ถ้าเป็นปีที่ปิดแล้ว นอกนั้น None"""
+    _, _, year = invoice_number.rpartition("/")
+    if year.isdigit() and int(year) < get_thai_buddhist_year():
+        return int(year)
+    return None
+
+
+def _invoice_number_schema(invoice_number: str, archives: Dict[int, Dict]) -> str:
+    """schema ที่เก็บเลขที่ใบเสร็จนี้ (ปีปัจจุบันอยู่ในฐานข้อมูลหลักเสมอ)"""
+    archive = archives.get(_closed_invoice_year(invoice_number))
+    return archive['schema'] if archive else "main"
+
+
+def _partitions_newest_first(before_id: Optional[int] = None) -> Iterator[str]:
+    """schema จากใบเสร็จใหม่ไปเก่า เริ่มที่ไฟล์ที่มี ``before_id`` (ถ้ามี)
+
+    รายการ archive ถูกอ่านเมื่อผู้เรียกขอ schema ถัดจากฐานข้อมูลหลักเท่านั้น
+    """
+    if before_id is None:
+        yield "main"
+        archives = list(get_archives().values())
+    else:
+        archives = list(get_archives().values())
+        if not archives or before_id > archives[-1]['max_id']:
+            yield "main"
+    for archive in reversed(archives):
+        if before_id is None or archive['min_id'] <= before_id:
+            yield archive['schema']
+
+
+def _partitions_by_date(order: str, date_from: Optional[str],
+                        date_to: Optional[str]) -> Iterator[str]:
+    """schema ที่อาจมีใบเสร็จในช่วงวันที่ (ISO) เรียงตาม ``order``
+
+    archive ปี พ.ศ. Y มีเฉพาะวันที่ในปี ค.ศ. Y - 543 และเก่ากว่าทุกใบในฐานข้อมูลหลัก
+    (ตรวจก่อน archive) ``desc`` อ่านรายการ archive เมื่อฐานข้อมูลหลักให้ผลไม่พอเท่านั้น
+    """
+    def archived(archives: List[Dict]) -> Iterator[str]:
+        for archive in archives:
+            year = archive['buddhist_year'] - 543
+            if date_from and date_from > f"{year}-12-31":
+                continue
+            if date_to and date_to < f"{year}-01-01":
+                continue
+            yield archive['schema']
+
+    if order == "desc":
+        yield "main"
+        yield from archived(list(reversed(get_archives().values())))
+    else:
+        yield from archived(list(get_archives().values()))
+        yield "main"
+
+
+def _archived_through(conn: sqlite3.Connection) -> Optional[Tuple[int, int]]:
+    """(ปี พ.ศ. ล่าสุดที่ archive, id ใบเสร็จสูงสุดในนั้น) หรือ None ถ้ายังไม่เคย archive"""
+    exists = conn.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoice_archives'
+    """).fetchone()
+    if exists is None:
+        # migration 4 สร้างตารางสรุปยอดขายก่อนมีตาราง invoice_archives
+        return None
+    row = conn.execute("""
+        SELECT MAX(buddhist_year), MAX(max_id) FROM invoice_archives
+    """).fetchone()
+    return (row[0], row[1]) if row[0] is not None else None
+
+
+def _year_summary(conn: sqlite3.Connection, buddhist_year: int) -> Tuple[int, int, int, int, int]:
+    """(จำนวนใบเสร็จ, จำนวนรายการ, ยอดรวมสตางค์, id ต่ำสุด, id สูงสุด) ของปีในฐานข้อมูลหลัก"""
+    invoices, total_satang, min_id, max_id = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(total_satang), 0), MIN(id), MAX(id)
+        FROM invoices WHERE buddhist_year = ?
+    """, (buddhist_year,)).fetchone()
+    lines = conn.execute("""
+        SELECT COUNT(*) FROM invoice_items WHERE invoice_id BETWEEN ? AND ?
+    """, (min_id, max_id)).fetchone()[0]
+    return invoices, lines, total_satang, min_id, max_id
+
+
+def _check_archivable(conn: sqlite3.Connection, buddhist_year: int,
+                      summary: Tuple[int, int, int, int, int]) -> None:
+    """ตรวจเงื่อนไขก่อน archive ไม่ผ่านจะ raise ValueError
+
+    ใบเสร็จของปีต้องเป็นช่วง id และช่วงวันที่ที่เก่ากว่าทุกใบที่เหลือในฐานข้อมูลหลัก
+    การค้นหาและรายการแบบแบ่งหน้าจึงอ่านต่อกันทีละไฟล์ได้โดยไม่ต้องรวมผลแล้วเรียงใหม่
+    """
+    invoices, _, _, min_id, max_id = summary
+    if invoices == 0:
+        raise ValueError(f"No invoices for year {buddhist_year}")
+
+    oldest = conn.execute("SELECT MIN(buddhist_year) FROM invoices").fetchone()[0]
+    if oldest < buddhist_year:
+        raise ValueError(f"Archive year {oldest} before {buddhist_year}")
+
+    year = buddhist_year - 543
+    outside = conn.execute("""
+        SELECT COUNT(*) FROM invoices
+        WHERE buddhist_year = ? AND invoice_date_iso NOT BETWEEN ? AND ?
+    """, (buddhist_year, f"{year}-01-01", f"{year}-12-31")).fetchone()[0]
+    later = conn.execute("""
+        SELECT COUNT(*) FROM invoices
+        WHERE buddhist_year != ? AND (id <= ? OR invoice_date_iso <= ?)
+    """, (buddhist_year, max_id, f"{year}-12-31")).fetchone()[0]
+    if outside or later:
+        raise ValueError(
+            f"Year {buddhist_year} overlaps other years: {outside} invoices dated outside "
+            f"{year}, {later} invoices of other years inside its id/date range"
+        )
+
+    mismatches = conn.execute(
+        f"SELECT COUNT(*) FROM ({_AUDIT_MISMATCH_SQL.format(where='WHERE i.id BETWEEN ? AND ?')})",
+        (min_id, max_id)
+    ).fetchone()[0]
+    if mismatches:
+        raise ValueError(
+            f"Year {buddhist_year} has {mismatches} invoice total mismatches, "
+            f"run audit_invoice_totals(fix=True) first"
+        )
+
+
+def _build_archive(path: Path, buddhist_year: int, min_id: int, max_id: int) -> Tuple[int, int, int]:
+    """คัดลอกใบเสร็จช่วง id ไปไฟล์ใหม่ด้วย schema และ index เดียวกับฐานข้อมูลหลัก
+
+    Returns:
+        (จำนวนใบเสร็จ, จำนวนรายการ, ยอดรวมสตางค์) ที่อ่านกลับจากไฟล์ใหม่
+    """
+    conn = sqlite3.connect(path.resolve().as_uri(), uri=True, isolation_level=None)
+    try:
+        # ไฟล์ใหม่ทั้งไฟล์ ถ้าล้มเหลวก็ลบทิ้ง ไม่ต้องมี journal
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("ATTACH DATABASE ? AS src",
+                     (Path(DATABASE_PATH).resolve().as_uri() + "?mode=ro",))
+        definitions = conn.execute("""
+            SELECT type, sql FROM src.sqlite_master
+            WHERE tbl_name IN ('invoices', 'invoice_items')
+              AND type IN ('table', 'index') AND sql IS NOT NULL
+        """).fetchall()
+
+        conn.execute("BEGIN")
+        for kind, sql in definitions:
+            if kind == "table":
+                conn.execute(sql)
+        conn.execute("""
+            INSERT INTO main.invoices SELECT * FROM src.invoices
+            WHERE id BETWEEN ? AND ? ORDER BY id
+        """, (min_id, max_id))
+        conn.execute("""
+            INSERT INTO main.invoice_items SELECT * FROM src.invoice_items
+            WHERE invoice_id BETWEEN ? AND ? ORDER BY id
+        """, (min_id, max_id))
+        # สร้าง index หลังใส่ข้อมูลเร็วกว่าอัปเดต index ทีละแถว
+        for kind, sql in definitions:
+            if kind == "index":
+                conn.execute(sql)
+        if FTS_ENABLED:
+            fts_sql = conn.execute("""
+                SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = 'invoices_fts'
+            """).fetchone()[0]
+            conn.execute(fts_sql)
+            conn.execute("INSERT INTO main.invoices_fts (invoices_fts) VALUES ('rebuild')")
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE src")
+
+        if conn.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+            raise RuntimeError(f"Archive file for {buddhist_year} failed quick_check")
+        invoices, total_satang = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(total_satang), 0) FROM invoices
+        """).fetchone()
+        lines = conn.execute("SELECT COUNT(*) FROM invoice_items").fetchone()[0]
+    finally:
+        conn.close()
+
+    # ข้อมูลต้องอยู่บนดิสก์จริงก่อนลบออกจากฐานข้อมูลหลัก
+    with open(path, "rb+") as file:
+        os.fsync(file.fileno())
+    return invoices, lines, total_satang
+
+
+def _fsync_dir(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        # Windows เปิดโฟลเดอร์เพื่อ fsync ไม่ได้ (rename ถูกบันทึกทันทีอยู่แล้ว)
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def archive_year(buddhist_year: int, vacuum: bool = False) -> Dict:
+    """ย้ายใบเสร็จของปีที่ปิดแล้วจากฐานข้อมูลหลักไปไฟล์ ``invoices_<ปี>.db``
+
+    ต้อง archive จากปีเก่าไปใหม่ ยอดเงินของปีนั้นต้องผ่าน audit และไม่ปะปนกับปีอื่น
+    (ดู _check_archivable) สร้างไฟล์ใหม่และตรวจจำนวนใบเสร็จ/ยอดรวมก่อน แล้วจึงบันทึก
+    รายการ archive และลบใบเสร็จออกจากฐานข้อมูลหลักใน transaction เดียว ตารางสรุป
+    ยอดขายของปีนั้นคงอยู่ในฐานข้อมูลหลัก รายงานยอดขายจึงไม่ต้องเปิดไฟล์ archive
+
+    Args:
+        buddhist_year: ปี พ.ศ. ที่จะ archive (ต้องน้อยกว่าปีปัจจุบัน)
+        vacuum: VACUUM ฐานข้อมูลหลักหลังย้ายเพื่อคืนพื้นที่ให้ระบบ
+
+    Returns:
+        Dict ที่มี buddhist_year, file_name, invoices, lines, total_satang และ bytes
+        (ขนาดไฟล์ archive)
+    """
+    if buddhist_year >= get_thai_buddhist_year():
+        raise ValueError(f"Year {buddhist_year} is not closed yet")
+    archives = get_archives()
+    if buddhist_year in archives:
+        raise ValueError(f"Year {buddhist_year} is already archived")
+
+    with get_read_pool().connection() as conn:
+        # แต่ละการเชื่อมต่อ ATTACH ได้จำกัด (ค่าเริ่มต้นของ SQLite คือ 10 ไฟล์)
+        attach_limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(archives) >= attach_limit:
+            raise ValueError(f"Cannot attach more than {attach_limit} archive files")
+        summary = _year_summary(conn, buddhist_year)
+        _check_archivable(conn, buddhist_year, summary)
+    invoices, lines, total_satang, min_id, max_id = summary
+
+    directory = _archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = f"invoices_{buddhist_year}.db"
+    path = directory / file_name
+    temp_path = directory / f"{file_name}.tmp"
+    temp_path.unlink(missing_ok=True)
+    try:
+        copied = _build_archive(temp_path, buddhist_year, min_id, max_id)
+        if copied != (invoices, lines, total_satang):
+            raise RuntimeError(f"Archive copy of {buddhist_year} does not match: "
+                               f"{copied} != {(invoices, lines, total_satang)}")
+        os.replace(temp_path, path)
+        _fsync_dir(directory)
+
+        with write_transaction() as conn:
+            if _year_summary(conn, buddhist_year) != summary:
+                raise RuntimeError(f"Invoices of {buddhist_year} changed while archiving")
+            # ตารางสรุปต้องมีทุกใบของปีก่อนลบ (ยอดของปีนี้จะไม่ถูกคำนวณใหม่อีก)
+            _catch_up_sales(conn)
+            conn.execute("""
+                INSERT INTO invoice_archives
+                    (buddhist_year, file_name, invoice_count, line_count, total_satang,
+                     min_id, max_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (buddhist_year, file_name, invoices, lines, total_satang, min_id, max_id))
+            conn.execute("DELETE FROM invoice_items WHERE invoice_id BETWEEN ? AND ?",
+                         (min_id, max_id))
+            conn.execute("DELETE FROM invoices WHERE id BETWEEN ? AND ?", (min_id, max_id))
+            bump_data_version(conn, ARCHIVES_VERSION)
+            bump_data_version(conn, INVOICES_VERSION)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        if buddhist_year not in get_archives():
+            path.unlink(missing_ok=True)
+        raise
+
+    get_archives()
+    if vacuum:
+        vacuum_database()
+
+    return {
+        "buddhist_year": buddhist_year,
+        "file_name": file_name,
+        "invoices": invoices,
+        "lines": lines,
+        "total_satang": total_satang,
+        "bytes": path.stat().st_size,
+    }
+
+
+def vacuum_database() -> None:
+    """VACUUM ฐานข้อมูลหลักแล้ว checkpoint WAL คืนพื้นที่ที่ว่างหลัง archive"""
+    with get_db_connection() as conn:
+        conn.execute("VACUUM")
+    checkpoint_wal("TRUNCATE")
+
+
+def get_archive_status() -> Dict:
+    """ปีที่ archive แล้ว และจำนวนใบเสร็จต่อปีที่ยังอยู่ในฐานข้อมูลหลัก
+
+    Returns:
+        Dict ที่มี archives (list), hot_years (list ของ buddhist_year, invoices, closed)
+        และ database_bytes (ขนาดไฟล์ฐานข้อมูลหลัก)
+    """
+    current_year = get_thai_buddhist_year()
+    with get_read_connection() as conn:
+        rows = conn.execute("""
+            SELECT buddhist_year, COUNT(*) AS invoices FROM invoices
+            GROUP BY buddhist_year ORDER BY buddhist_year
+        """).fetchall()
+
+    return {
+        "archives": list(get_archives().values()),
+        "hot_years": [
+            {**dict(row), "closed": row['buddhist_year'] < current_year} for row in rows
+        ],
+        "database_bytes": os.path.getsize(DATABASE_PATH),
+    }
+
+
+# ==================== Migration Functions ====================
+
+# คอลัมน์เงินเดิม (REAL บาท) และคอลัมน์ใหม่ (INTEGER สตางค์)
+_MONEY_COLUMNS = (
+    ("items", "price", "price_satang"),
+    ("invoice_items", "price", "price_satang"),
+    ("invoice_items", "subtotal", "subtotal_satang"),
+    ("invoices", "total_amount", "total_satang"),
+)
+
+
+def _migrate_money_to_satang(cursor: sqlite3.Cursor) -> None:
+    """เปลี่ยนคอลัมน์เงินจาก REAL (บาท) เป็น INTEGER (สตางค์) และสร้างตารางสรุปยอดขายใหม่
+
+    แปลงด้วย money.to_satang เหมือนข้อมูลใหม่ ยอดที่บันทึกไว้ไม่ตรงกับราคา x จำนวน
+    (เศษทศนิยมจาก float) ยังคงค่าเดิม ตรวจและแก้ได้ด้วย audit_invoice_totals()
+    """
+    cursor.connection.create_function("to_satang", 1, money.to_satang,
+                                      deterministic=True)
+    for table, old, new in _MONEY_COLUMNS:
+        if not _column_exists(cursor, table, old):
+            continue
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {new} INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(f"UPDATE {table} SET {new} = to_satang({old})")
+        cursor.execute(f"ALTER TABLE {table} DROP COLUMN {old}")
+
+    # ตารางสรุปยอดขายเป็นข้อมูลที่คำนวณได้ สร้างใหม่ด้วยคอลัมน์สตางค์
+    if _column_exists(cursor, "sales_daily", "total_amount"):
+        for table in _sales_tables():
+            cursor.execute(f"DROP TABLE {table}")
+        _init_sales_tables(cursor)
+    _rebuild_sales(cursor.connection)
+
+
+# migration ตามลำดับ (เวอร์ชัน, คำอธิบาย, ฟังก์ชันที่รับ cursor) เวอร์ชันที่ใช้แล้ว
+# เก็บใน PRAGMA user_version ของไฟล์ฐานข้อมูล เพิ่ม migration ใหม่ต่อท้ายเท่านั้น
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "core tables and indexes", _migrate_core_schema),
+    (2, "invoice full-text search index", _init_invoice_search_index),
+    (3, "sales summary tables", _init_sales_tables),
+    (4, "money columns in satang", _migrate_money_to_satang),
+    (5, "idempotency keys", _init_idempotency_table),
+    (6, "invoice archives", _init_archive_table),
+    (7, "item import lock", _init_item_import_table),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """เวอร์ชัน schema ของไฟล์ฐานข้อมูล (0 = ยังไม่เคย migrate)"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _migrate(pool: "WriterPool") -> int:
+    """ใช้ migration ที่ยังไม่ได้ใช้ คืนค่าเวอร์ชัน schema หลัง migrate
+
+    กรณีปกติ (schema ล่าสุดแล้ว) อ่านแค่ user_version ไม่เปิด transaction
+    หลาย process ที่เริ่มพร้อมกันจะรอกันที่ BEGIN IMMEDIATE และตรวจเวอร์ชันซ้ำ
+    """
+    global FTS_ENABLED
+
+    with pool.connection() as conn:
+        version = get_schema_version(conn)
+        if version < SCHEMA_VERSION:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = get_schema_version(conn)
+                cursor = conn.cursor()
+                for target, description, migration in MIGRATIONS:
+                    if target <= version:
+                        continue
+                    started = time.perf_counter()
+                    migration(cursor)
+                    cursor.execute(f"PRAGMA user_version = {target}")
+                    print(f"Database migration {target} ({description}) applied in "
+                          f"{time.perf_counter() - started:.2f}s")
+                    version = target
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        elif version > SCHEMA_VERSION:
+            print(f"Warning: database schema version {version} is newer than "
+                  f"this application ({SCHEMA_VERSION})")
+
+        FTS_ENABLED = conn.execute("""
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoices_fts'
+        """).fetchone() is not None
+
+    return version
+
+
+def init_database() -> int:
+    """เปิดฐานข้อมูลและปรับ schema ให้เป็นเวอร์ชันล่าสุด (เรียกตอนเริ่มแอป)
+
+    การเรียกใช้ฟังก์ชันอื่นในโมดูลครั้งแรกก็ migrate ให้อัตโนมัติเช่นกัน
+    ฟังก์ชันนี้ใช้เพื่อให้ migrate เกิดขึ้นก่อนรับคำขอแรก
+
+    Returns:
+        เวอร์ชัน schema ปัจจุบัน
+    """
+    with get_pool().connection() as conn:
+        return get_schema_version(conn)
@@ -0,0 +1,133 @@
+"""Idempotency-Key สำหรับการสร้างใบเสร็จ (POST /api/generate-invoice)
+
+client (เช่น POS) ส่ง header ``Idempotency-Key`` ค่าเดิมเมื่อส่งคำขอซ้ำ (กดปุ่มซ้ำ,
+retry หลัง network หลุด) คำขอซ้ำได้ใบเสร็จเดิมโดยไม่บันทึกใหม่และไม่ใช้เลขรันเพิ่ม
+
+คีย์ที่เพิ่งใช้เก็บใน LRU ของ process (หมดอายุตาม IDEMPOTENCY_TTL) คำขอซ้ำจึงไม่ผ่าน
+การเขียนฐานข้อมูลเลย คำขอซ้ำที่มาพร้อมกันรอผลของคำขอแรกที่กำลังบันทึก ตาราง
+idempotency_keys เป็นข้อมูลหลักที่ใช้ข้าม worker และหลังเริ่มแอปใหม่
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import async_database as adb
+import database as db
+
+# จำนวนคีย์สูงสุดที่เก็บในหน่วยความจำ (ต่อ process)
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+# ความยาวสูงสุดของ Idempotency-Key
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """คีย์นี้เคยใช้กับคำขอที่มีเนื้อหาต่างกัน"""
+
+
+def request_hash(payload) -> str:
+    """hash ของเนื้อหาคำขอ (JSON แบบเรียง key) ใช้ตรวจว่าคีย์ถูกใช้ซ้ำกับคำขออื่น"""
+    body = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class IdempotencyCache:
+    """LRU ของคีย์ที่ใช้แล้ว (คีย์ -> request hash, id ใบเสร็จ) และคำขอที่กำลังบันทึก"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_CACHE_SIZE,
+                 ttl: float = db.IDEMPOTENCY_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def _get(self, key: str) -> Optional[Tuple[str, int]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def _put(self, key: str, hash_: str, invoice_id: int) -> None:
+        self._entries[key] = (hash_, invoice_id, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def submit(self, key: str, hash_: str,
+                     save: Callable[[], Awaitable[Optional[Dict]]]
+                     ) -> Optional[Tuple[int, bool]]:
+        """บันทึกใบเสร็จครั้งเดียวต่อคีย์
+
+        Args:
+            key: ค่า Idempotency-Key
+            hash_: request_hash() ของคำขอ
+            save: coroutine function ที่บันทึกใบเสร็จ (adb.save_invoice_once)
+
+        Returns:
+            (id ใบเสร็จ, True ถ้าเป็นคำขอซ้ำ) หรือ None ถ้าบันทึกไม่สำเร็จ
+
+        Raises:
+            IdempotencyConflict: คีย์เคยใช้กับคำขอที่เนื้อหาต่างกัน
+            ValueError: ข้อมูลใบเสร็จไม่ถูกต้อง (จาก save) คีย์ไม่ถูกบันทึก
+        """
+        while True:
+            cached = self._get(key)
+            if cached is not None:
+                self.hits += 1
+                return self._result(cached, hash_, True)
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            # คำขอแรกยังบันทึกอยู่ รอแล้วตรวจแคชอีกครั้ง (ถ้าคำขอแรกล้มเหลว
+            # คำขอนี้จะบันทึกเอง)
+            self.waits += 1
+            await asyncio.wait([inflight])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            # คีย์ที่ worker อื่นหรือก่อนเริ่มแอปใหม่บันทึกไว้ อ่านได้โดยไม่ต้องเขียน
+            stored = await adb.get_idempotent_invoice(key)
+            if stored is not None:
+                self._put(key, *stored)
+                return self._result(stored, hash_, True)
+
+            saved = await save()
+            if saved is None:
+                return None
+            stored = (saved['request_hash'], saved['invoice_id'])
+            self._put(key, *stored)
+            return self._result(stored, hash_, saved['replayed'])
+        finally:
+            del self._inflight[key]
+            future.set_result(None)
+
+    @staticmethod
+    def _result(stored: Tuple[str, int], hash_: str, replayed: bool) -> Tuple[int, bool]:
+        if stored[0] != hash_:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+        return stored[1], replayed
+
+    def stats(self) -> Dict:
+        """สถิติของแคช"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+        }
@@ -0,0 +1,82 @@
+"""ส่งออกใบเสร็จพร้อมรายการสินค้าแบบ streaming (CSV และ JSON Lines) สำหรับระบบบัญชี
+
+รับชุดแถวจาก database.iter_invoice_lines แล้วแปลงเป็น bytes ทีละชุด ใช้กับ
+StreamingResponse ได้โดยตรง ไม่ต้องสร้างผลลัพธ์ทั้งหมดไว้ในหน่วยความจำ
+"""
+import csv
+import io
+from typing import Dict, Iterator, List
+
+import json_codec
+from database import INVOICE_LINE_COLUMNS
+
+# รูปแบบที่รองรับ: (media type, นามสกุลไฟล์)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def stream_invoice_lines_csv(batches: Iterator[List]) -> Iterator[bytes]:
+    """CSV หนึ่งแถวต่อรายการสินค้า (ข้อมูลใบเสร็จซ้ำในทุกแถวของใบเดียวกัน)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(INVOICE_LINE_COLUMNS)
+    yield buffer.getvalue().encode("utf-8")
+
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _invoice_record(row) -> Dict:
+    return {
+        "invoice_number": row['invoice_number'],
+        "invoice_date": row['invoice_date'],
+        "customer_name": row['customer_name'],
+        "customer_address": row['customer_address'],
+        "customer_tax_id": row['customer_tax_id'],
+        "total_amount": row['total_amount'],
+        "items": [],
+    }
+
+
+def stream_invoices_ndjson(batches: Iterator[List]) -> Iterator[bytes]:
+    """JSON Lines หนึ่งบรรทัดต่อใบเสร็จ พร้อมรายการสินค้าใน ``items``
+
+    แถวเรียงตามใบเสร็จอยู่แล้ว จึงเก็บไว้แค่ใบเสร็จที่กำลังประกอบอยู่ใบเดียว
+    """
+    current = None
+    current_id = None
+
+    for rows in batches:
+        lines = []
+        for row in rows:
+            if row['invoice_id'] != current_id:
+                if current is not None:
+                    lines.append(json_codec.dumps(current))
+                current = _invoice_record(row)
+                current_id = row['invoice_id']
+            current['items'].append({
+                "sku": row['sku'],
+                "name": row['name'],
+                "price": row['price'],
+                "quantity": row['quantity'],
+                "subtotal": row['subtotal'],
+            })
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    if current is not None:
+        yield json_codec.dumps(current) + b"\n"
+
+
+def stream_export(fmt: str, batches: Iterator[List]) -> Iterator[bytes]:
+    """เลือกตัวแปลงตามรูปแบบ (``csv`` หรือ ``ndjson``)"""
+    if fmt == "csv":
+        return stream_invoice_lines_csv(batches)
+    if fmt == "ndjson":
+        return stream_invoices_ndjson(batches)
+    raise ValueError(f"Unknown format '{fmt}', expected csv or ndjson")
@@ -0,0 +1,169 @@
+"""สร้างไฟล์ PDF ของใบเสร็จ (ใช้ fpdf2 ทำงานแบบ offline ไม่ต้องใช้ browser)
+
+วางข้อมูลตามรูปแบบเดียวกับ templates/invoice.html โมดูลนี้ไม่ import database
+จึงใช้ใน worker process ของ pdf_export ได้โดยไม่ต้องเปิดฐานข้อมูล
+
+fpdf2 เป็น dependency เสริม (``uv sync --extra pdf``) และต้องมีฟอนต์ TrueType
+ที่มีอักษรไทย กำหนดด้วย PDF_FONT_PATH หรือติดตั้งฟอนต์ในระบบ (เช่น fonts-tlwg-garuda-ttf)
+"""
+import importlib.util
+import os
+from typing import Dict, List, Optional, Tuple
+
+# ฟอนต์ที่ลองใช้ตามลำดับเมื่อไม่ได้กำหนด PDF_FONT_PATH
+FONT_CANDIDATES = (
+    "static/fonts/THSarabunNew.ttf",
+    "static/fonts/Sarabun-Regular.ttf",
+    "/usr/share/fonts/truetype/tlwg/Garuda.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansThai-Regular.ttf",
+    "/usr/share/fonts/truetype/thai/Garuda.ttf",
+)
+
+FONT_FAMILY = "invoice"
+
+# หัวตาราง ความกว้าง (มม. รวมเท่ากับความกว้างหน้า A4 ลบขอบ) และการจัดชิด
+_COLUMNS = (
+    ("#", 10, "C"),
+    ("SKU", 28, "L"),
+    ("ชื่อสินค้า", 76, "L"),
+    ("ราคา/หน่วย", 26, "R"),
+    ("จำนวน", 20, "C"),
+    ("รวม (บาท)", 30, "R"),
+)
+
+
+def is_available() -> bool:
+    """ติดตั้ง fpdf2 แล้วหรือไม่ (ไม่ import จริง fpdf2 ใช้เวลาโหลดนาน จึงโหลดเมื่อสร้าง PDF)"""
+    return importlib.util.find_spec("fpdf") is not None
+
+
+def find_font(font_path: Optional[str] = None) -> str:
+    """หาไฟล์ฟอนต์ภาษาไทย ไม่พบจะ raise FileNotFoundError"""
+    if font_path:
+        if not os.path.exists(font_path):
+            raise FileNotFoundError(f"PDF font not found: {font_path}")
+        return font_path
+
+    env_path = os.environ.get("PDF_FONT_PATH")
+    if env_path:
+        return find_font(env_path)
+
+    for candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(
+        "No Thai TrueType font found; set PDF_FONT_PATH to a .ttf file"
+    )
+
+
+def _label_line(pdf, label: str, value: str) -> None:
+    pdf.cell(0, 6, f"{label} {value}", new_x="LMARGIN", new_y="NEXT")
+
+
+def render_invoice_pdf(context: Dict, font_path: str) -> Tuple[bytes, int]:
+    """สร้าง PDF ของใบเสร็จหนึ่งใบ
+
+    Args:
+        context: ตัวแปรของใบเสร็จจาก invoice_render.invoice_context()
+        font_path: ไฟล์ฟอนต์ TrueType ที่มีอักษรไทย
+
+    Returns:
+        Tuple (ไฟล์ PDF, จำนวนหน้า)
+    """
+    try:
+        from fpdf import FPDF, FontFace
+    except ImportError:
+        raise RuntimeError("fpdf2 is not installed (uv sync --extra pdf)")
+
+    pdf = FPDF(format="A4")
+    pdf.set_margins(10, 12, 10)
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.set_title(f"ใบเสร็จรับเงิน {context['invoice_number']}")
+    pdf.add_font(FONT_FAMILY, "", font_path)
+    pdf.add_page()
+
+    seller = context.get('seller') or {}
+    customer = context.get('customer') or {}
+
+    pdf.set_font(FONT_FAMILY, size=20)
+    pdf.cell(0, 10, "ใบเสร็จรับเงิน", align="C", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font(FONT_FAMILY, size=12)
+    pdf.cell(0, 6, "INVOICE", align="C", new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(4)
+
+    if seller.get('shop_name'):
+        pdf.set_font(FONT_FAMILY, size=13)
+        pdf.cell(0, 7, "ข้อมูลผู้ขาย", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font(FONT_FAMILY, size=11)
+        _label_line(pdf, "ชื่อร้าน:", seller['shop_name'])
+        _label_line(pdf, "ที่อยู่:", seller.get('shop_address') or "")
+        _label_line(pdf, "เลขประจำตัวผู้เสียภาษี:", seller.get('tax_id') or "")
+        _label_line(pdf, "โทรศัพท์:", seller.get('phone') or "")
+        pdf.ln(2)
+
+    pdf.set_font(FONT_FAMILY, size=11)
+    _label_line(pdf, "วันที่:", context['date'])
+    _label_line(pdf, "เลขที่ใบเสร็จ:", context['invoice_number'])
+    pdf.ln(2)
+
+    if customer.get('name'):
+        pdf.set_font(FONT_FAMILY, size=13)
+        pdf.cell(0, 7, "ข้อมูลผู้ซื้อ", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font(FONT_FAMILY, size=11)
+        _label_line(pdf, "ชื่อ:", customer['name'])
+        _label_line(pdf, "ที่อยู่:", customer.get('address') or "")
+        if customer.get('tax_id'):
+            _label_line(pdf, "เลขประจำตัวผู้เสียภาษี:", customer['tax_id'])
+        pdf.ln(2)
+
+    # ตารางรายการสินค้า (ชื่อยาวขึ้นบรรทัดใหม่ หัวตารางซ้ำเมื่อขึ้นหน้าใหม่)
+    pdf.set_font(FONT_FAMILY, size=10)
+    with pdf.table(col_widths=tuple(width for _, width, _ in _COLUMNS),
+                   text_align=tuple(align for _, _, align in _COLUMNS),
+                   headings_style=FontFace(fill_color=(240, 240, 240)),
+                   line_height=7) as table:
+        table.row([title for title, _, _ in _COLUMNS])
+        for index, item in enumerate(context['items'], start=1):
+            table.row([
+                str(index),
+                str(item['sku']),
+                str(item['name']),
+                f"{item['price']:.2f}",
+                str(item['quantity']),
+                f"{item['subtotal']:.2f}",
+            ])
+
+    pdf.ln(3)
+    pdf.set_font(FONT_FAMILY, size=13)
+    pdf.cell(0, 8, f"ยอดรวมทั้งหมด (Total): {context['total']:.2f} บาท",
+             align="R", new_x="LMARGIN", new_y="NEXT")
+
+    # ลายเซ็น
+    pdf.ln(18)
+    pdf.set_font(FONT_FAMILY, size=11)
+    half = (pdf.w - pdf.l_margin - pdf.r_margin) / 2
+    blank = "................................."
+    pdf.cell(half, 6, customer.get('name') or blank, align="C")
+    pdf.cell(half, 6, seller.get('shop_name') or blank, align="C",
+             new_x="LMARGIN", new_y="NEXT")
+    pdf.cell(half, 6, "ผู้ซื้อ (Buyer)", align="C")
+    pdf.cell(half, 6, "เจ้าของร้าน (Shop Owner)", align="C",
+             new_x="LMARGIN", new_y="NEXT")
+
+    pdf.ln(8)
+    pdf.cell(0, 6, "ขอบคุณที่ใช้บริการ / Thank you for your business", align="C")
+
+    return bytes(pdf.output()), pdf.pages_count
+
+
+def render_batch(contexts: List[Dict], font_path: str) -> List[Tuple[str, bytes, int]]:
+    """สร้าง PDF หลายใบ (งานหนึ่งชิ้นของ worker process)
+
+    Returns:
+        List ของ (เลขที่ใบเสร็จ, ไฟล์ PDF, จำนวนหน้า) ตามลำดับเดิม
+    """
+    results = []
+    for context in contexts:
+        pdf_bytes, pages = render_invoice_pdf(context, font_path)
+        results.append((context['invoice_number'], pdf_bytes, pages))
+    return results
@@ -0,0 +1,170 @@
+"""แคช HTML ของใบเสร็จที่บันทึกแล้วสำหรับ /api/invoices/view
+
+ใบเสร็จที่บันทึกแล้วไม่เปลี่ยน การพิมพ์ซ้ำหรือเปิดดูซ้ำจึงส่ง HTML ที่ render
+และบีบอัดไว้แล้วได้ทันทีโดยไม่ต้องอ่านฐานข้อมูล แคชมีขนาดจำกัด (LRU) และถูกล้าง
+เมื่อเทมเพลต invoice.html, ข้อมูลผู้ขาย หรือยอดเงินของใบเสร็จที่บันทึกแล้วเปลี่ยน
+(เลขเวอร์ชันใน data_versions ทุก worker จึงเห็นการแก้ไขตรงกัน)
+"""
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from jinja2 import Environment
+
+import async_database as adb
+import database as db
+
+INVOICE_TEMPLATE = "invoice.html"
+
+# จำนวนใบเสร็จสูงสุดที่เก็บไว้ในแคช (ต่อ process)
+INVOICE_RENDER_CACHE_SIZE = int(os.environ.get("INVOICE_RENDER_CACHE_SIZE", "1024"))
+
+# ตรวจเทมเพลตและเวอร์ชันข้อมูลผู้ขายไม่บ่อยกว่านี้ (วินาที)
+INVOICE_RENDER_CHECK_INTERVAL = float(
+    os.environ.get("INVOICE_RENDER_CHECK_INTERVAL", "1.0")
+)
+
+
+@dataclass(frozen=True)
+class RenderedInvoice:
+    etag: str
+    gzip_body: bytes
+
+    @property
+    def body(self) -> bytes:
+        return gzip.decompress(self.gzip_body)
+
+
+def _data_versions() -> Tuple[int, int]:
+    """เวอร์ชันข้อมูลผู้ขายและยอดเงินใบเสร็จ (ใบเสร็จที่แก้ด้วย audit)"""
+    return (db.get_data_version(db.SELLER_VERSION),
+            db.get_data_version(db.INVOICES_VERSION))
+
+
+def invoice_context(invoice: Dict) -> Dict:
+    """แปลงผลจาก get_invoice_by_number เป็นตัวแปรของเทมเพลตใบเสร็จ"""
+    return {
+        "invoice_number": invoice['invoice_number'],
+        "items": invoice['items'],
+        "total": invoice['total_amount'],
+        "customer": {
+            'name': invoice['customer_name'],
+            'address': invoice['customer_address'],
+            'tax_id': invoice.get('customer_tax_id', '')
+        },
+        "seller": {
+            'shop_name': invoice['shop_name'],
+            'shop_address': invoice['shop_address'],
+            'tax_id': invoice['seller_tax_id'],
+            'phone': invoice['phone']
+        },
+        "date": invoice['invoice_date']
+    }
+
+
+class InvoiceRenderCache:
+    """แคช HTML (gzip) ของใบเสร็จตามเลขที่ใบเสร็จ เรียงลำดับการใช้แบบ LRU"""
+
+    def __init__(self, env: Environment, template_name: str = INVOICE_TEMPLATE,
+                 max_entries: int = INVOICE_RENDER_CACHE_SIZE,
+                 check_interval: float = INVOICE_RENDER_CHECK_INTERVAL):
+        self.env = env
+        self.template_name = template_name
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, RenderedInvoice]" = OrderedDict()
+        self._template_hash: Optional[str] = None
+        self._data_versions: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        # เพิ่มขึ้นทุกครั้งที่ล้างแคช ใช้กันไม่ให้ HTML ที่ render จากข้อมูลเก่าถูกเก็บ
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self) -> None:
+        """ล้างแคชทั้งหมด (เช่น หลังแก้ไขข้อมูลผู้ขายใน process นี้)"""
+        self._entries.clear()
+        self._checked_at = 0.0
+        self.generation += 1
+
+    def render(self, context: Dict) -> str:
+        """render เทมเพลตใบเสร็จ (เทมเพลตถูก compile ครั้งเดียวใน Environment)"""
+        return self.env.get_template(self.template_name).render(context)
+
+    def _current_template_hash(self) -> str:
+        source = self.env.loader.get_source(self.env, self.template_name)[0]
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    async def _validate(self) -> None:
+        """ล้างแคชเมื่อเทมเพลต ข้อมูลผู้ขาย หรือยอดเงินใบเสร็จเปลี่ยนตั้งแต่ตรวจครั้งก่อน"""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return
+
+            data_versions = await adb.run_read(_data_versions)
+            changed = data_versions != self._data_versions
+
+            template_hash = self._current_template_hash()
+            changed = changed or template_hash != self._template_hash
+
+            if changed:
+                self.invalidate()
+            self._data_versions = data_versions
+            self._template_hash = template_hash
+            self._checked_at = time.monotonic()
+
+    async def get(self, invoice_number: str) -> Optional[RenderedInvoice]:
+        """ดึง HTML ของใบเสร็จจากแคช คืนค่า None ถ้ายังไม่มี"""
+        await self._validate()
+        rendered = self._entries.get(invoice_number)
+        if rendered is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(invoice_number)
+        self.hits += 1
+        return rendered
+
+    def put(self, invoice_number: str, context: Dict,
+            generation: Optional[int] = None) -> RenderedInvoice:
+        """render ใบเสร็จและเก็บลงแคช
+
+        Args:
+            invoice_number: เลขที่ใบเสร็จ (key ของแคช)
+            context: ตัวแปรของเทมเพลตจาก invoice_context()
+            generation: ค่า ``generation`` ก่อนอ่านใบเสร็จจากฐานข้อมูล ถ้าแคชถูกล้าง
+                ระหว่างนั้น ผลลัพธ์จะไม่ถูกเก็บ
+
+        Returns:
+            RenderedInvoice ที่ render แล้ว
+        """
+        body = self.render(context).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        rendered = RenderedInvoice(etag=etag,
+                                   gzip_body=gzip.compress(body, compresslevel=6))
+
+        if generation is None or generation == self.generation:
+            self._entries[invoice_number] = rendered
+            self._entries.move_to_end(invoice_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def stats(self) -> Dict:
+        """สถิติของแคช"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": sum(len(r.gzip_body) for r in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generation": self.generation,
+        }
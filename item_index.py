@@ -0,0 +1,86 @@
+"""ดัชนีค้นหาสินค้าในหน่วยความจำสำหรับ typeahead (/api/items/search)
+
+- SKU: เก็บเป็น list ที่เรียงแล้ว ค้นหาแบบขึ้นต้นด้วย (prefix) ด้วย bisect
+- SKU และชื่อสินค้า: ต่อกันเป็นข้อความก้อนเดียวบรรทัดละหนึ่งสินค้า พร้อม
+  ตารางตำแหน่งเริ่มของแต่ละบรรทัด ค้นหาแบบ substring ด้วย ``str.find``
+  (ทำงานในระดับ C) จึงไม่ต้องตัดคำและใช้กับภาษาไทยที่ไม่เว้นวรรคได้
+
+เทียบกับดัชนี n-gram แบบ posting list แล้ว สร้างใหม่ได้เร็วกว่ามาก
+(catalog หลายแสนรายการใช้เวลาระดับสิบมิลลิวินาที แทนที่จะเป็นหลายวินาที)
+และคำค้นที่พบบ่อยหยุดทันทีเมื่อได้ครบ limit ส่วนคำค้นที่ไม่พบเลยคือการสแกน
+ข้อความหนึ่งรอบ ดัชนีถูกสร้างใหม่ทุกครั้งที่เวอร์ชันของ catalog เปลี่ยน
+(ดู catalog_cache)
+"""
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List
+
+
+def normalize(text: str) -> str:
+    """ทำข้อความให้อยู่ในรูปเดียวกันก่อนเทียบ (NFC, ตัวพิมพ์เล็ก, ช่องว่างเดียว)"""
+    text = unicodedata.normalize("NFC", text).casefold()
+    return " ".join(text.split())
+
+
+class ItemIndex:
+    """ดัชนีค้นหาสินค้า เรียงผลลัพธ์ตาม SKU"""
+
+    def __init__(self, items: List[Dict]):
+        keyed = sorted(((normalize(item["sku"]), item) for item in items),
+                       key=lambda pair: pair[0])
+        self.items = [item for _, item in keyed]
+        self.skus = [sku for sku, _ in keyed]
+
+        lines = [f"{sku}\t{normalize(item['name'])}" for sku, item in keyed]
+        self.haystack = "\n".join(lines)
+
+        offsets = array("q")
+        position = 0
+        for line in lines:
+            offsets.append(position)
+            position += len(line) + 1
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _sku_prefix(self, query: str, limit: int) -> List[int]:
+        start = bisect_left(self.skus, query)
+        matches = []
+        for position in range(start, len(self.skus)):
+            if len(matches) >= limit or not self.skus[position].startswith(query):
+                break
+            matches.append(position)
+        return matches
+
+    def _contains(self, query: str, limit: int, exclude: set) -> List[int]:
+        haystack = self.haystack
+        offsets = self.offsets
+        matches = []
+        start = 0
+        while len(matches) < limit:
+            found = haystack.find(query, start)
+            if found < 0:
+                break
+            line = bisect_right(offsets, found) - 1
+            if line not in exclude:
+                matches.append(line)
+            # ข้ามไปบรรทัดถัดไป สินค้าหนึ่งรายการนับครั้งเดียว
+            if line + 1 >= len(offsets):
+                break
+            start = offsets[line + 1]
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """ค้นหาสินค้า: SKU ขึ้นต้นด้วยคำค้นก่อน ตามด้วย SKU/ชื่อที่มีคำค้นอยู่"""
+        query = normalize(query)
+        if not query:
+            return self.items[:limit]
+
+        positions = self._sku_prefix(query, limit)
+        if len(positions) < limit:
+            positions += self._contains(
+                query, limit - len(positions), set(positions)
+            )
+        return [self.items[position] for position in positions]
@@ -1,108 +1,131 @@
-from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form, Depends
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import FastAPI, Request, HTTPException, UploadFile, File, Form, Depends, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.middleware import Middleware
 from pydantic import BaseModel
-import csv
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import os
-import hashlib
-import hmac
+import time
 import database as db
+import metrics
+from auth import (AUTH_COOKIE, LOGIN_ACCOUNT_MAX_ATTEMPTS, AuthMiddleware,
+                  LoginRateLimiter, SessionTokens, client_address)
+import async_database as adb
+from catalog_cache import CatalogCache, etag_matches
+from compression import CompressionMiddleware, negotiate_encoding
+from idempotency import MAX_KEY_LENGTH, IdempotencyCache, IdempotencyConflict, request_hash
+from invoice_render import InvoiceRenderCache, invoice_context
+import invoice_pdf
+from invoice_export import EXPORT_FORMATS, stream_export
+from json_codec import JSONResponse
+import pdf_export
 
 # Authentication configuration
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
 if not ADMIN_PASSWORD:
     raise ValueError("ADMIN_PASSWORD environment variable is required")
 
-SECRET_KEY = os.environ.get("SECRET_KEY", os.urandom(32).hex())
-
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        # Skip authentication for login page and static files
-        if request.url.path in ["/login", "/static/"] or request.url.path.startswith("/static/"):
-            return await call_next(request)
-
-        # Check for auth cookie
-        auth_token = request.cookies.get("invoice_auth")
-        if auth_token and self.verify_token(auth_token):
-            return await call_next(request)
-
-        # Redirect to login for protected routes
-        if request.url.path == "/":
-            return RedirectResponse(url="/login", status_code=302)
-
-        # For API routes, return 401
-        if request.url.path.startswith("/api/"):
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        return RedirectResponse(url="/login", status_code=302)
-
-    def verify_token(self, token: str) -> bool:
-        try:
-            expected_token = hmac.new(SECRET_KEY.encode(), ADMIN_PASSWORD.encode(), hashlib.sha256).hexdigest()
-            return hmac.compare_digest(token, expected_token)
-        except:
-            return False
-
-app = FastAPI(middleware=[Middleware(AuthMiddleware)])
-
-def create_auth_token() -> str:
-    return hmac.new(SECRET_KEY.encode(), ADMIN_PASSWORD.encode(), hashlib.sha256).hexdigest()
+# ถ้าไม่กำหนด SECRET_KEY กุญแจจะ derive จาก ADMIN_PASSWORD (ทุก worker ได้ค่าเดียวกัน)
+SECRET_KEY = os.environ.get("SECRET_KEY") or None
+
+# โทเค็นให้ Prometheus อ่าน /metrics ด้วย Authorization: Bearer (ถ้าไม่กำหนดต้อง login)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+SESSION_TOKENS = SessionTokens(ADMIN_PASSWORD, SECRET_KEY)
+LOGIN_RATE_LIMITER = LoginRateLimiter()
+# มีบัญชีเดียว (รหัสผ่าน admin) จำกัดรวมทุก IP ด้วยคีย์ ADMIN_ACCOUNT
+ACCOUNT_RATE_LIMITER = LoginRateLimiter(max_attempts=LOGIN_ACCOUNT_MAX_ATTEMPTS)
+ADMIN_ACCOUNT = "admin"
+
+# สถานะการเตรียมข้อมูลเริ่มต้นที่ทำเบื้องหลังหลังเริ่มแอป (แสดงใน /health)
+BOOTSTRAP_STATUS = {"state": "pending", "schema_version": None, "seconds": None, "error": None}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # migrate schema ก่อนรับคำขอแรก (ปกติแค่อ่าน PRAGMA user_version)
+    BOOTSTRAP_STATUS["schema_version"] = await adb.run_write(db.init_database)
+    # นำเข้า CSV ทำเบื้องหลัง แอปจึงตอบ health check ได้ทันที
+    bootstrap = asyncio.create_task(bootstrap_data())
+    yield
+    bootstrap.cancel()
+    # ปิด worker process ของการส่งออก PDF (ถ้าเคยสร้าง)
+    await asyncio.to_thread(pdf_export.shutdown_pool)
+
+MIDDLEWARE = [Middleware(CompressionMiddleware),
+              Middleware(AuthMiddleware, tokens=SESSION_TOKENS,
+                         public_paths=("/login", "/health"),
+                         token_paths={"/metrics": METRICS_TOKEN})]
+if metrics.METRICS_ENABLED:
+    # ชั้นนอกสุด จับเวลารวมการตรวจสิทธิ์ด้วย
+    MIDDLEWARE.insert(0, Middleware(metrics.MetricsMiddleware, mounts=("/static",)))
+
+app = FastAPI(lifespan=lifespan, middleware=MIDDLEWARE, default_response_class=JSONResponse)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Setup templates
 templates = Jinja2Templates(directory="templates")
+metrics.instrument_templates(templates.env)
 
 # Load items from database (fallback to CSV for initial import)
-def load_items():
+def load_items(progress=None):
     # Try to load from database first
-    items = db.get_all_items()
+    count = db.get_items_count()
     
     # If database is empty, try to import from CSV file
-    if len(items) == 0:
+    # (หลาย worker อาจนำเข้าพร้อมกันตอนเริ่มครั้งแรก การนำเข้าเป็น upsert จึงไม่ซ้ำ)
+    if count == 0:
         csv_path = Path("database/export_items.csv")
         if csv_path.exists():
-            with open(csv_path, 'r', encoding='utf-8') as file:
-                csv_content = file.read()
-                success, count, message = db.import_items_from_csv(csv_content)
-                if success:
-                    items = db.get_all_items()
+            try:
+                with open(csv_path, 'rb') as file:
+                    success, count, message = db.import_items_from_stream(
+                        file, progress=progress, filename=csv_path.name
+                    )
+            except db.ImportInProgress:
+                # worker อื่นกำลังนำเข้า catalog เริ่มต้นอยู่
+                pass
     
-    return items
+    return count
+
+# Load customers from CSV into the customers table (only when the file changed)
+CUSTOMERS_CSV_PATH = os.environ.get("CUSTOMERS_CSV_PATH", "customer.csv")
+
+# ตรวจ mtime ของ customer.csv ไม่บ่อยกว่านี้ (วินาที)
+CUSTOMERS_RELOAD_INTERVAL = float(os.environ.get("CUSTOMERS_RELOAD_INTERVAL", "5"))
 
-# Load customers from CSV
 def load_customers():
-    customers = []
-    csv_path = Path("customer.csv")
-    
-    if not csv_path.exists():
-        return customers
-    
-    with open(csv_path, 'r', encoding='utf-8') as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            try:
-                name = row.get('Name', '').strip()
-                address = row.get('Address', '').strip()
-                tax_id = row.get('Tax ID', '').strip()
-                
-                if name:
-                    customers.append({
-                        'name': name,
-                        'address': address,
-                        'tax_id': tax_id
-                    })
-            except Exception as e:
-                continue
-    
-    return customers
+    db.sync_customers_from_csv(CUSTOMERS_CSV_PATH)
+
+class CustomersReloader:
+    """นำเข้า customer.csv ใหม่เมื่อไฟล์ถูกแก้ไข โดยไม่ต้อง restart"""
+
+    def __init__(self, csv_path: str, interval: float):
+        self.csv_path = csv_path
+        self.interval = interval
+        self._checked_at = 0.0
+        self._mtime = None
+
+    async def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.csv_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            # sync_customers_from_csv เทียบกับ mtime ในฐานข้อมูล worker อื่นที่
+            # นำเข้าไปแล้วจะไม่ถูกนำเข้าซ้ำ
+            await adb.sync_customers_from_csv(self.csv_path)
+            self._mtime = mtime
 
 # Pydantic models for request validation
 class SellerInfoUpdate(BaseModel):
@@ -115,9 +138,14 @@ class InvoiceCreate(BaseModel):
     items: List[Dict]
     customer: Dict
 
+# จำนวนใบเสร็จสูงสุดต่อคำขอของ /api/invoices/bulk
+MAX_BULK_INVOICES = int(os.environ.get("MAX_BULK_INVOICES", "10000"))
+
 # Global caches
-ITEMS_CACHE = load_items()
-CUSTOMERS_CACHE = load_customers()
+CATALOG_CACHE = CatalogCache()
+INVOICE_RENDER_CACHE = InvoiceRenderCache(templates.env)
+IDEMPOTENCY_CACHE = IdempotencyCache()
+CUSTOMERS_RELOADER = CustomersReloader(CUSTOMERS_CSV_PATH, CUSTOMERS_RELOAD_INTERVAL)
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
@@ -125,18 +153,32 @@ async def login_page(request: Request):
 
 @app.post("/login")
 async def login(request: Request, password: str = Form(...)):
-    if password == ADMIN_PASSWORD:
+    client = client_address(request.client.host if request.client else None,
+                            request.headers.get("x-forwarded-for"))
+    retry_after = max(LOGIN_RATE_LIMITER.retry_after(client),
+                      ACCOUNT_RATE_LIMITER.retry_after(ADMIN_ACCOUNT))
+    if retry_after:
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": f"Too many login attempts, try again in {retry_after} seconds"
+        }, status_code=429, headers={"Retry-After": str(retry_after)})
+
+    if SESSION_TOKENS.check_password(password):
+        LOGIN_RATE_LIMITER.reset(client)
+        ACCOUNT_RATE_LIMITER.reset(ADMIN_ACCOUNT)
         response = RedirectResponse(url="/", status_code=302)
-        auth_token = create_auth_token()
         response.set_cookie(
-            key="invoice_auth",
-            value=auth_token,
+            key=AUTH_COOKIE,
+            value=SESSION_TOKENS.issue(),
+            max_age=SESSION_TOKENS.max_age,
             httponly=True,
             secure=False,  # Set to True in production with HTTPS
             samesite="lax"
         )
         return response
     else:
+        LOGIN_RATE_LIMITER.record_failure(client)
+        ACCOUNT_RATE_LIMITER.record_failure(ADMIN_ACCOUNT)
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": "Invalid password"
@@ -145,35 +187,83 @@ async def login(request: Request, password: str = Form(...)):
 @app.get("/logout")
 async def logout():
     response = RedirectResponse(url="/login", status_code=302)
-    response.delete_cookie(key="invoice_auth")
+    response.delete_cookie(key=AUTH_COOKIE)
     return response
 
+@app.get("/health")
+async def health():
+    """health check สำหรับ load balancer (ไม่ต้อง login และไม่รอการนำเข้าข้อมูลเริ่มต้น)"""
+    return JSONResponse(content={"status": "ok", "bootstrap": BOOTSTRAP_STATUS})
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/api/items")
-async def get_items():
-    # Load fresh data from database
-    items = db.get_all_items()
-    return JSONResponse(content=items)
+async def get_items(request: Request):
+    # JSON ที่ serialize แล้วจากแคช สร้างใหม่เมื่อเวอร์ชัน catalog ในฐานข้อมูลเปลี่ยน
+    snapshot = await CATALOG_CACHE.get()
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=304, headers=headers)
+
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding == "br":
+        headers["Content-Encoding"] = "br"
+        return Response(content=snapshot.brotli_body, media_type="application/json",
+                        headers=headers)
+    if encoding == "gzip":
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=snapshot.gzip_body, media_type="application/json",
+                        headers=headers)
+
+    return Response(content=snapshot.body, media_type="application/json",
+                    headers=headers)
+
+@app.get("/api/items/search")
+async def search_items(q: str = "", limit: int = 20):
+    """ค้นหาสินค้าสำหรับช่องเลือกสินค้า (SKU ขึ้นต้นด้วย หรือชื่อมีคำค้น)"""
+    limit = max(1, min(limit, 100))
+    snapshot = await CATALOG_CACHE.get()
+    return JSONResponse(content=snapshot.index.search(q, limit))
 
 @app.get("/api/customers")
-async def get_customers():
-    return JSONResponse(content=CUSTOMERS_CACHE)
+async def get_customers(q: str = "", limit: int = 20, cursor: Optional[str] = None,
+                        shape: str = "objects"):
+    """ค้นหาลูกค้า (ชื่อหรือเลขประจำตัวผู้เสียภาษี) หน้าถัดไปใช้ header ``X-Next-Cursor``
+
+    ``shape=columns`` ส่งเป็น ``{"columns": [...], "rows": [[...]]}`` (เล็กกว่า)
+    """
+    await CUSTOMERS_RELOADER.maybe_reload()
+
+    limit = max(1, min(limit, 100))
+    try:
+        page = await adb.search_customers(q, limit, cursor, shape)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    if page['next_cursor']:
+        headers['X-Next-Cursor'] = page['next_cursor']
+    return JSONResponse(content=page['customers'], headers=headers)
 
 # ==================== Seller Info Endpoints ====================
 
 @app.get("/api/seller")
 async def get_seller():
     """ดึงข้อมูลผู้ขาย"""
-    seller = db.get_or_create_default_seller()
+    seller = await adb.get_or_create_default_seller()
     return JSONResponse(content=seller)
 
 @app.put("/api/seller/{seller_id}")
 async def update_seller(seller_id: int, seller_data: SellerInfoUpdate):
     """อัปเดตข้อมูลผู้ขาย"""
-    success = db.update_seller_info(
+    success = await adb.update_seller_info(
         seller_id,
         seller_data.shop_name,
         seller_data.shop_address,
@@ -182,7 +272,8 @@ async def update_seller(seller_id: int, seller_data: SellerInfoUpdate):
     )
     
     if success:
-        seller = db.get_seller_info(seller_id)
+        INVOICE_RENDER_CACHE.invalidate()
+        seller = await adb.get_seller_info(seller_id)
         return JSONResponse(content=seller)
     else:
         raise HTTPException(status_code=400, detail="Failed to update seller info")
@@ -192,9 +283,25 @@ async def update_seller(seller_id: int, seller_data: SellerInfoUpdate):
 @app.get("/api/items/count")
 async def get_items_count():
     """ดึงจำนวนสินค้าทั้งหมด"""
-    count = db.get_items_count()
+    count = await adb.get_items_count()
     return JSONResponse(content={"count": count})
 
+async def bootstrap_data():
+    """นำเข้าสินค้า/ลูกค้าจาก CSV และอัปเดตตารางสรุปยอดขาย (เบื้องหลังตอนเริ่มแอป)"""
+    BOOTSTRAP_STATUS["state"] = "running"
+    started = time.perf_counter()
+    try:
+        # ระหว่างนำเข้า catalog เริ่มต้น การอัปโหลด CSV จะได้ 409 เหมือนการนำเข้าปกติ
+        await adb.run_write(load_items)
+        CATALOG_CACHE.invalidate()
+        await adb.run_write(load_customers)
+        await adb.catch_up_sales_summaries()
+    except Exception as e:
+        print(f"Error bootstrapping data: {e}")
+        BOOTSTRAP_STATUS.update(state="failed", error=str(e))
+        return
+    BOOTSTRAP_STATUS.update(state="done", seconds=round(time.perf_counter() - started, 3))
+
 @app.post("/api/items/upload")
 async def upload_items(file: UploadFile = File(...)):
     """อัปโหลดไฟล์ CSV สินค้า"""
@@ -202,10 +309,12 @@ async def upload_items(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="กรุณาอัปโหลดไฟล์ CSV เท่านั้น")
     
     try:
-        content = await file.read()
-        csv_content = content.decode('utf-8')
-        
-        success, count, message = db.import_items_from_csv(csv_content)
+        # อ่านไฟล์ทีละส่วนจากไฟล์ชั่วคราวของ UploadFile ไม่โหลดทั้งไฟล์เข้าหน่วยความจำ
+        # นำเข้าได้ทีละครั้งทุก worker (ล็อกในฐานข้อมูล)
+        success, count, message = await adb.import_items_from_stream(
+            file.file, filename=file.filename
+        )
+        CATALOG_CACHE.invalidate()
         
         if success:
             return JSONResponse(content={
@@ -216,120 +325,368 @@ async def upload_items(file: UploadFile = File(...)):
         else:
             raise HTTPException(status_code=400, detail=message)
             
+    except HTTPException:
+        raise
+    except db.ImportInProgress:
+        raise HTTPException(status_code=409, detail="กำลังนำเข้าสินค้าอยู่ กรุณารอสักครู่")
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="ไฟล์ CSV ไม่ถูกต้อง กรุณาตรวจสอบ encoding (ต้องเป็น UTF-8)")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"เกิดข้อผิดพลาด: {str(e)}")
 
+@app.get("/api/items/upload/progress")
+async def upload_items_progress():
+    """ความคืบหน้าการนำเข้า CSV สินค้า (ของ worker ใดก็ได้ อ่านจากฐานข้อมูล)"""
+    return JSONResponse(content=await adb.get_item_import_progress())
+
 # ==================== Invoice Endpoints ====================
 
 @app.post("/api/generate-invoice")
 async def generate_invoice(request: Request):
-    """สร้างและบันทึกใบเสร็จ"""
+    """สร้างและบันทึกใบเสร็จ
+
+    คำขอที่มี header ``Idempotency-Key`` ถูกบันทึกครั้งเดียวต่อคีย์ คำขอซ้ำได้ใบเสร็จเดิม
+    (header ``Idempotent-Replayed: true``)
+    """
     data = await request.json()
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Request body must be an object")
     invoice_items = data.get('items', [])
     customer_info = data.get('customer', {})
+    idempotency_key = request.headers.get("idempotency-key")
+    headers = {}
+
+    # ข้อมูลไม่ถูกต้องเป็นความผิดของ client ตอบ 400 ก่อนเริ่มบันทึก
+    try:
+        db.validate_invoice_payload(customer_info, invoice_items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # บันทึกใบเสร็จลงฐานข้อมูล
-    saved_invoice = db.save_invoice(customer_info, invoice_items)
+    if idempotency_key is None:
+        saved_invoice = await adb.save_invoice(customer_info, invoice_items)
+    else:
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key")
+        hash_ = request_hash(data)
+        try:
+            result = await IDEMPOTENCY_CACHE.submit(
+                idempotency_key, hash_,
+                lambda: adb.save_invoice_once(idempotency_key, hash_,
+                                              customer_info, invoice_items)
+            )
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        saved_invoice = await adb.get_invoice_by_id(result[0]) if result else None
+        if result and result[1]:
+            headers["Idempotent-Replayed"] = "true"
     
     if not saved_invoice:
         raise HTTPException(status_code=500, detail="Failed to save invoice")
     
     # ดึงข้อมูลผู้ขาย
-    seller = db.get_seller_info(saved_invoice['seller_id'])
+    seller = await adb.get_seller_info(saved_invoice['seller_id'])
     
     # Calculate totals
     total = saved_invoice['total_amount']
     
     # Generate invoice HTML
-    invoice_html = templates.TemplateResponse(
-        "invoice.html",
-        {
-            "request": request,
-            "invoice_number": saved_invoice['invoice_number'],
-            "items": invoice_items,
-            "total": total,
-            "customer": customer_info,
-            "seller": seller,
-            "date": saved_invoice['invoice_date']
-        }
-    )
+    invoice_html = INVOICE_RENDER_CACHE.render({
+        "invoice_number": saved_invoice['invoice_number'],
+        "items": saved_invoice['items'],
+        "total": total,
+        "customer": customer_info,
+        "seller": seller,
+        "date": saved_invoice['invoice_date']
+    })
     
-    return invoice_html
+    return HTMLResponse(content=invoice_html, headers=headers)
+
+@app.post("/api/invoices/bulk")
+async def create_invoices_bulk(request: Request):
+    """บันทึกใบเสร็จหลายใบในครั้งเดียว (เช่น ยอดขายสิ้นวันจาก POS)"""
+    data = await request.json()
+    invoices = data.get('invoices') if isinstance(data, dict) else None
+
+    if not isinstance(invoices, list) or not invoices:
+        raise HTTPException(status_code=400, detail="invoices must be a non-empty list")
+    if len(invoices) > MAX_BULK_INVOICES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many invoices in one request (max {MAX_BULK_INVOICES})"
+        )
+
+    results = await adb.save_invoices_bulk(invoices)
+    created = sum(1 for result in results if result['success'])
+
+    return JSONResponse(content={
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    })
+
+@app.get("/api/invoices")
+async def list_invoices_endpoint(date_from: Optional[str] = None,
+                                 date_to: Optional[str] = None,
+                                 customer: Optional[str] = None,
+                                 min_amount: Optional[float] = None,
+                                 max_amount: Optional[float] = None,
+                                 cursor: Optional[str] = None,
+                                 limit: int = 50, order: str = "desc",
+                                 shape: str = "objects"):
+    """รายการใบเสร็จตามช่วงวันที่ ลูกค้า และยอดเงิน แบ่งหน้าด้วย cursor"""
+    limit = max(1, min(limit, 500))
+    try:
+        page = await adb.list_invoices(date_from, date_to, customer,
+                                       min_amount, max_amount,
+                                       cursor, limit, order, shape)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(content=page)
+
+@app.get("/api/invoices/export")
+async def export_invoices(fmt: str = Query("csv", alias="format"),
+                          date_from: Optional[str] = None,
+                          date_to: Optional[str] = None):
+    """ส่งออกใบเสร็จพร้อมรายการสินค้าตามช่วงวันที่ (CSV หรือ NDJSON) แบบ streaming"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}', expected csv or ndjson")
+    try:
+        # ตรวจวันที่ตอนนี้ (ไม่แตะฐานข้อมูล) การอ่านทั้งหมดเกิดขึ้นระหว่างส่งข้อมูลใน threadpool
+        batches = db.iter_invoice_lines(date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, extension = EXPORT_FORMATS[fmt]
+    period = "-".join(part for part in (date_from, date_to) if part).replace("/", "")
+    filename = f"invoices-{period or 'all'}.{extension}"
+    return StreamingResponse(
+        stream_export(fmt, batches),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/invoices/export/pdf")
+async def export_invoices_pdf(date_from: Optional[str] = None,
+                              date_to: Optional[str] = None,
+                              customer: Optional[str] = None,
+                              min_amount: Optional[float] = None,
+                              max_amount: Optional[float] = None,
+                              workers: Optional[int] = None):
+    """ส่งออกใบเสร็จตามตัวกรอง (เหมือน /api/invoices) เป็น PDF ใน ZIP แบบ streaming"""
+    if not invoice_pdf.is_available():
+        raise HTTPException(status_code=503, detail="PDF export requires fpdf2 (uv sync --extra pdf)")
+    try:
+        font_path = invoice_pdf.find_font()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    filters = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "customer": customer,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+    }
+    # ตรวจตัวกรองก่อนเริ่มส่ง เพราะหลังส่ง header แล้วจะตอบ 400 ไม่ได้
+    try:
+        await adb.list_invoices(limit=1, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"invoices-{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
+    return StreamingResponse(
+        pdf_export.export_invoices_zip(filters, workers, font_path),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @app.get("/api/invoices/search")
-async def search_invoices_endpoint(query: str = "", limit: int = 50):
-    """ค้นหาใบเสร็จ"""
-    invoices = db.search_invoices(query, limit)
-    return JSONResponse(content=invoices)
+async def search_invoices_endpoint(query: str = "", limit: int = 50,
+                                   cursor: Optional[str] = None,
+                                   sort: str = "relevance", shape: str = "objects"):
+    """ค้นหาใบเสร็จ
+
+    หน้าถัดไปส่ง cursor จาก header ``X-Next-Cursor`` กลับมา
+    ``shape=columns`` ส่งเป็น ``{"columns": [...], "rows": [[...]]}`` (เล็กกว่า)
+    """
+    limit = max(1, min(limit, 500))
+    try:
+        page = await adb.search_invoices_page(query, limit, cursor, sort, shape)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {}
+    if page['next_cursor']:
+        headers['X-Next-Cursor'] = page['next_cursor']
+    return JSONResponse(content=page['invoices'], headers=headers)
+
+@app.get("/api/invoices/batch")
+async def get_invoices_batch(numbers: str):
+    """ดึงใบเสร็จหลายใบพร้อมรายการสินค้า (``numbers`` คั่นด้วยจุลภาค เช่น 001/2568,002/2568)"""
+    invoice_numbers = list(dict.fromkeys(n.strip() for n in numbers.split(",") if n.strip()))
+    try:
+        invoices = await adb.get_invoices_by_numbers(invoice_numbers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content={
+        "invoices": [invoices[n] for n in invoice_numbers if n in invoices],
+        "missing": [n for n in invoice_numbers if n not in invoices],
+    })
 
 @app.get("/api/invoices/view", response_class=HTMLResponse)
 async def view_invoice(request: Request, number: str, year: str):
-    """แสดงใบเสร็จในรูปแบบ HTML"""
-    import sys
+    """แสดงใบเสร็จในรูปแบบ HTML (จากแคชเมื่อเคย render แล้ว)"""
     invoice_number = f"{number}/{year}"
-    print(f"[DEBUG] Received number={number}, year={year}", file=sys.stderr)
-    print(f"[DEBUG] Constructed invoice_number={invoice_number}", file=sys.stderr)
-    sys.stderr.flush()
-    
-    invoice = db.get_invoice_by_number(invoice_number)
-    print(f"[DEBUG] Invoice result: {invoice is not None}", file=sys.stderr)
-    sys.stderr.flush()
-    
-    if not invoice:
-        raise HTTPException(status_code=404, detail=f"Invoice not found: {invoice_number}")
-
-    # เตรียมข้อมูลสำหรับเทมเพลต
-    seller = {
-        'shop_name': invoice['shop_name'],
-        'shop_address': invoice['shop_address'],
-        'tax_id': invoice['seller_tax_id'],
-        'phone': invoice['phone']
-    }
 
-    customer = {
-        'name': invoice['customer_name'],
-        'address': invoice['customer_address'],
-        'tax_id': invoice.get('customer_tax_id', '')
+    rendered = await INVOICE_RENDER_CACHE.get(invoice_number)
+    if rendered is None:
+        generation = INVOICE_RENDER_CACHE.generation
+        invoice = await adb.get_invoice_by_number(invoice_number)
+        if not invoice:
+            raise HTTPException(status_code=404, detail=f"Invoice not found: {invoice_number}")
+        rendered = INVOICE_RENDER_CACHE.put(invoice_number, invoice_context(invoice),
+                                            generation)
+
+    # no-cache: browser ต้องถามใหม่ทุกครั้ง (ข้อมูลผู้ขายอาจเปลี่ยน) แต่ได้ 304 ถ้า ETag ตรง
+    headers = {
+        "ETag": rendered.etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
     }
 
-    return templates.TemplateResponse(
-        "invoice.html",
-        {
-            "request": request,
-            "invoice_number": invoice['invoice_number'],
-            "items": invoice['items'],
-            "total": invoice['total_amount'],
-            "customer": customer,
-            "seller": seller,
-            "date": invoice['invoice_date']
-        }
-    )
+    if etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=headers)
+
+    # แคชเก็บเฉพาะ gzip ถ้า client ไม่รับ gzip ส่ง HTML ปกติ (middleware บีบอัดด้วย br ให้ถ้ารับ)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), available=("gzip",))
+    if encoding == "gzip":
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=rendered.gzip_body, media_type="text/html",
+                        headers=headers)
+
+    return HTMLResponse(content=rendered.body, headers=headers)
 
 @app.get("/api/invoices/{invoice_number}")
 async def get_invoice(invoice_number: str):
     """ดึงข้อมูลใบเสร็จด้วยเลขที่ใบเสร็จ"""
-    invoice = db.get_invoice_by_number(invoice_number)
+    invoice = await adb.get_invoice_by_number(invoice_number)
     
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
     return JSONResponse(content=invoice)
 
+# ==================== Report Endpoints ====================
+
+async def _period_report(period: str, date_from: Optional[str], date_to: Optional[str]):
+    try:
+        rows = await adb.sales_by_period(period, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=rows)
+
+@app.get("/api/reports/daily")
+async def report_daily(date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """ยอดขายรายวัน"""
+    return await _period_report("day", date_from, date_to)
+
+@app.get("/api/reports/monthly")
+async def report_monthly(date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """ยอดขายรายเดือน"""
+    return await _period_report("month", date_from, date_to)
+
+@app.get("/api/reports/yearly")
+async def report_yearly(date_from: Optional[str] = None, date_to: Optional[str] = None):
+    """ยอดขายรายปี (พ.ศ.)"""
+    return await _period_report("year", date_from, date_to)
+
+@app.get("/api/reports/skus")
+async def report_skus(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                      limit: int = 50, order_by: str = "amount"):
+    """สินค้าขายดีในช่วงวันที่ เรียงตามยอดเงินหรือจำนวนชิ้น"""
+    limit = max(1, min(limit, 500))
+    try:
+        rows = await adb.sales_by_sku(date_from, date_to, limit, order_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=rows)
+
+@app.get("/api/reports/customers")
+async def report_customers(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                           limit: int = 50):
+    """ลูกค้าที่มียอดซื้อสูงสุดในช่วงวันที่"""
+    limit = max(1, min(limit, 500))
+    try:
+        rows = await adb.sales_by_customer(date_from, date_to, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(content=rows)
+
+@app.post("/api/reports/rebuild")
+async def report_rebuild():
+    """สร้างตารางสรุปยอดขายใหม่ทั้งหมดจากใบเสร็จ"""
+    started = time.perf_counter()
+    count = await adb.rebuild_sales_summaries()
+    return JSONResponse(content={
+        "invoices": count,
+        "seconds": round(time.perf_counter() - started, 3)
+    })
+
+@app.get("/api/reports/audit")
+async def report_audit(limit: int = 100):
+    """ตรวจยอดเงินทุกใบเสร็จเทียบกับราคา x จำนวน (แก้ได้ด้วย ``reports.py audit --fix``)"""
+    started = time.perf_counter()
+    result = await adb.audit_invoice_totals(max(0, min(limit, 1000)))
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return JSONResponse(content=result)
+
 @app.get("/api/test-db")
 async def test_db():
     """Test database connection"""
-    invoice = db.get_invoice_by_number("001/2568")
+    invoice = await adb.get_invoice_by_number("001/2568")
     return JSONResponse(content={"found": invoice is not None, "invoice": invoice})
 
-@app.get("/api/test-debug")
-async def test_debug():
-    """Test if debug code is loaded"""
-    import sys
-    print("[DEBUG] Test debug endpoint called!", file=sys.stderr)
-    sys.stderr.flush()
-    return JSONResponse(content={"debug": "working", "timestamp": str(datetime.now())})
+# ==================== Metrics Endpoints ====================
+
+POOL_GAUGE = metrics.Gauge("invoice_db_pool", "Connection pool statistics",
+                           ("pool", "stat"))
+EXECUTOR_QUEUED = metrics.Gauge("invoice_db_executor_queued",
+                                "Database calls waiting for a thread", ("executor",))
+CACHE_GAUGE = metrics.Gauge("invoice_cache", "In-process cache statistics",
+                            ("cache", "stat"))
+
+def _update_gauges():
+    for pool_name in ("writer", "reader"):
+        for stat, value in db.get_pool_stats()[pool_name].items():
+            if isinstance(value, (int, float)):
+                POOL_GAUGE.set(value, pool_name, stat)
+    for executor, stats in adb.get_executor_stats().items():
+        EXECUTOR_QUEUED.set(stats["queued"], executor)
+    CACHE_GAUGE.set(CATALOG_CACHE.hits, "catalog", "hits")
+    CACHE_GAUGE.set(CATALOG_CACHE.rebuilds, "catalog", "rebuilds")
+    for stat, value in INVOICE_RENDER_CACHE.stats().items():
+        CACHE_GAUGE.set(value, "invoice_render", stat)
+    for stat, value in IDEMPOTENCY_CACHE.stats().items():
+        CACHE_GAUGE.set(value, "idempotency", stat)
+
+@app.get("/metrics")
+async def get_metrics():
+    """สถิติในรูปแบบ Prometheus ของ worker ที่รับคำขอนี้ (label ``worker`` = pid)"""
+    _update_gauges()
+    return Response(content=metrics.render_metrics(),
+                    media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/metrics/slow-queries")
+async def get_slow_queries():
+    """slow query ล่าสุดพร้อม EXPLAIN QUERY PLAN"""
+    return JSONResponse(content={
+        "threshold_ms": metrics.DB_SLOW_QUERY_MS,
+        "queries": metrics.get_slow_queries(),
+    })
 
 if __name__ == "__main__":
     import uvicorn
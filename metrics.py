@@ -0,0 +1,454 @@
+"""เก็บสถิติเวลาตอบของ route, query ฐานข้อมูล และการ render เทมเพลต (Prometheus)
+
+- MetricsMiddleware (ASGI) จับเวลาทุกคำขอแยกตาม method และ route template
+- InstrumentedConnection/InstrumentedCursor เป็น factory ของ sqlite3 ที่จับเวลา
+  ทุก query แยกตามชนิดคำสั่งและตาราง query ที่ช้ากว่า DB_SLOW_QUERY_MS จะถูกบันทึก
+  พร้อม EXPLAIN QUERY PLAN
+- instrument_templates() จับเวลา render ของทุกเทมเพลตใน jinja2 Environment
+
+สถิติเก็บต่อ process (แต่ละ worker ของ serve.py มีชุดของตัวเอง) ทุก series มี label
+``worker`` (pid) เพื่อแยกค่าของแต่ละ worker ปิดทั้งหมดด้วย METRICS_ENABLED=0
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from jinja2 import Environment, Template
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# query ที่ใช้เวลานานกว่านี้ (มิลลิวินาที รวมเวลา fetch) ถูกบันทึกเป็น slow query
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "100"))
+
+_slow_seconds = DB_SLOW_QUERY_MS / 1000
+
+# จำนวน slow query ล่าสุดที่เก็บไว้
+SLOW_QUERY_LOG_SIZE = 50
+
+# ขอบบนของ bucket (วินาที)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_perf_counter = time.perf_counter
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}",
+                f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """ค่าที่เพิ่มขึ้นอย่างเดียว"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        self.inc_labels(amount, labels)
+
+    def inc_labels(self, amount: float, labels: Tuple) -> None:
+        # acquire/release ตรงๆ เร็วกว่า ``with`` (เรียกทุก query)
+        self._lock.acquire()
+        try:
+            self._values[labels] = self._values.get(labels, 0) + amount
+        finally:
+            self._lock.release()
+
+    def expose(self, const_labels: Tuple[Tuple[str, str], ...] = ()) -> List[str]:
+        lines = self.header()
+        const_names = tuple(name for name, _ in const_labels)
+        const_values = tuple(value for _, value in const_labels)
+        names = const_names + self.labelnames
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(names, const_values + labels)} "
+                         f"{_format_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """ค่าที่ตั้งใหม่ได้ (เช่น จำนวนในแคช)"""
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """นับจำนวนค่าตาม bucket พร้อมผลรวม (เวลาเป็นวินาที)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # ต่อ label: จำนวนในแต่ละ bucket (ไม่สะสม, ช่องสุดท้ายคือ +Inf), ผลรวม, จำนวน
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.observe_labels(value, labels)
+
+    def observe_labels(self, value: float, labels: Tuple) -> None:
+        index = bisect_left(self.buckets, value)
+        self._lock.acquire()
+        try:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+        finally:
+            self._lock.release()
+
+    def snapshot(self) -> Dict[Tuple, Dict]:
+        """จำนวนและผลรวมต่อ label (สำหรับ benchmark/ตรวจสอบ)"""
+        with self._lock:
+            return {labels: {"count": series[-1], "sum": series[-2]}
+                    for labels, series in self._series.items()}
+
+    def expose(self, const_labels: Tuple[Tuple[str, str], ...] = ()) -> List[str]:
+        lines = self.header()
+        const_names = tuple(name for name, _ in const_labels)
+        const_values = tuple(value for _, value in const_labels)
+        names = const_names + self.labelnames
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            labels = const_values + labels
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names + ('le',), labels + (le,))} "
+                             f"{cumulative}")
+            label_text = _format_labels(names, labels)
+            lines.append(f"{self.name}_sum{label_text} {series[-2]!r}")
+            lines.append(f"{self.name}_count{label_text} {series[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+HTTP_REQUEST_DURATION = Histogram(
+    "invoice_http_request_duration_seconds",
+    "Time spent handling HTTP requests, including streamed bodies",
+    ("method", "route"),
+)
+HTTP_REQUESTS = Counter(
+    "invoice_http_requests_total", "HTTP responses by status code",
+    ("method", "route", "status"),
+)
+HTTP_RESPONSE_BYTES = Counter(
+    "invoice_http_response_bytes_total",
+    "Bytes of compressed response bodies before compression and as sent",
+    ("encoding", "stage"),
+)
+DB_QUERY_DURATION = Histogram(
+    "invoice_db_query_duration_seconds",
+    "Time spent in sqlite3 execute/executemany by statement type and table",
+    ("statement",),
+)
+DB_FETCH_SECONDS = Counter(
+    "invoice_db_fetch_seconds_total",
+    "Time spent fetching result rows by statement type and table",
+    ("statement",),
+)
+DB_SLOW_QUERIES = Counter(
+    "invoice_db_slow_queries_total",
+    f"Queries slower than DB_SLOW_QUERY_MS ({DB_SLOW_QUERY_MS:g} ms)",
+    ("statement",),
+)
+TEMPLATE_RENDER_DURATION = Histogram(
+    "invoice_template_render_duration_seconds", "Jinja2 template render time",
+    ("template",),
+)
+
+
+def render_metrics() -> str:
+    """สถิติทั้งหมดในรูปแบบ Prometheus text exposition (version 0.0.4)
+
+    ทุก series มี label ``worker`` (pid ของ process) แต่ละ scrape ได้ค่าของ worker
+    ที่รับคำขอเท่านั้น รวมข้ามเวลาด้วย ``sum by (...)`` หรือ ``max by (worker)``
+    """
+    const_labels = (("worker", str(os.getpid())),)
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose(const_labels))
+    return "\n".join(lines) + "\n"
+
+
+# ==================== HTTP Functions ====================
+
+class MetricsMiddleware:
+    """ASGI middleware จับเวลาคำขอ แยกตาม route template (เช่น /api/invoices/{invoice_number})"""
+
+    def __init__(self, app, mounts: Sequence[str] = ()):
+        self.app = app
+        self.mounts = tuple(mounts)
+
+    def _route_label(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        for mount in self.mounts:
+            if scope["path"].startswith(mount + "/"):
+                return mount
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = _perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = _perf_counter() - started
+            route = self._route_label(scope)
+            HTTP_REQUEST_DURATION.observe_labels(elapsed, (scope["method"], route))
+            HTTP_REQUESTS.inc_labels(1, (scope["method"], route, str(status)))
+
+
+# ==================== Database Functions ====================
+
+_TABLE_PATTERNS = {
+    "insert": re.compile(r"\bINTO\s+([\w.]+)", re.IGNORECASE),
+    "replace": re.compile(r"\bINTO\s+([\w.]+)", re.IGNORECASE),
+    "update": re.compile(r"^\s*UPDATE\s+(?:OR\s+\w+\s+)?([\w.]+)", re.IGNORECASE),
+}
+
+# คำสั่งที่ใช้ตารางของ FROM ชั้นนอกสุด (ไม่ใช่ของ subquery หรือ CTE)
+_FROM_OPERATIONS = frozenset(("select", "with", "delete"))
+
+# วงเล็บ, string literal และ FROM <ตาราง> สำหรับหา FROM ตามความลึกของวงเล็บ
+_FROM_TOKENS = re.compile(r"'(?:[^']|'')*'|(\()|(\))|\bFROM\s+([\w.]+)", re.IGNORECASE)
+
+
+def _outermost_from(sql: str) -> Optional[str]:
+    """ตารางของ FROM ที่อยู่ในวงเล็บชั้นตื้นที่สุด (FROM แรกของชั้นนั้น)"""
+    depth = 0
+    best: Optional[Tuple[int, str]] = None
+    for match in _FROM_TOKENS.finditer(sql):
+        if match.group(1):
+            depth += 1
+        elif match.group(2):
+            depth -= 1
+        elif match.group(3):
+            if depth == 0:
+                return match.group(3)
+            if best is None or depth < best[0]:
+                best = (depth, match.group(3))
+    return best[1] if best else None
+
+# คำสั่งที่ขอ EXPLAIN QUERY PLAN ได้
+_EXPLAINABLE = frozenset(("select", "with", "insert", "replace", "update", "delete"))
+
+
+@lru_cache(maxsize=1024)
+def statement_labels(sql: str) -> Tuple[str]:
+    """label ของ SQL: ชนิดคำสั่งและตารางหลัก เช่น ``("select invoices",)``
+
+    SELECT/WITH/DELETE ใช้ตารางของ FROM ชั้นนอกสุด subquery ใน select list หรือ
+    CTE จึงไม่ทำให้ได้ label ของตารางที่ join ย่อย
+    """
+    words = sql.split(None, 1)
+    if not words:
+        return ("empty",)
+    operation = words[0].lower()
+    if operation in _FROM_OPERATIONS:
+        table = _outermost_from(sql)
+    else:
+        pattern = _TABLE_PATTERNS.get(operation)
+        match = pattern.search(sql) if pattern is not None else None
+        table = match.group(1) if match else None
+    return (f"{operation} {table}" if table else operation,)
+
+
+_slow_queries: Deque[Dict] = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+
+def get_slow_queries() -> List[Dict]:
+    """slow query ล่าสุด (ใหม่สุดก่อน)"""
+    return list(reversed(_slow_queries))
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters) -> Optional[List[str]]:
+    try:
+        cursor = sqlite3.Connection.cursor(conn)
+        rows = sqlite3.Cursor.execute(cursor, "EXPLAIN QUERY PLAN " + sql, parameters)
+        return [row[3] for row in rows.fetchall()]
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def _record_slow_query(cursor: "InstrumentedCursor") -> None:
+    label = cursor._labels[0]
+    DB_SLOW_QUERIES.inc(1, label)
+    plan = None
+    if label.split(" ", 1)[0] in _EXPLAINABLE and cursor._parameters is not None:
+        plan = _explain(cursor.connection, cursor._sql, cursor._parameters)
+    entry = {
+        "statement": label,
+        "sql": " ".join(cursor._sql.split()),
+        "ms": round(cursor._elapsed * 1000, 2),
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "plan": plan,
+    }
+    _slow_queries.append(entry)
+    print(f"Slow query ({entry['ms']} ms): {entry['sql'][:200]}"
+          + (f" | plan: {'; '.join(plan)}" if plan else ""))
+
+
+# เมธอดของ sqlite3 เรียกตรงแทน super() (ลดค่าใช้จ่ายต่อ query)
+_cursor_execute = sqlite3.Cursor.execute
+_cursor_fetchone = sqlite3.Cursor.fetchone
+_connection_cursor = sqlite3.Connection.cursor
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor ที่จับเวลา execute และ fetch"""
+
+    _labels = ("",)
+    _sql = ""
+    _parameters = None
+    _elapsed = 0.0
+    _slow_logged = False
+
+    def _executed(self, sql: str, parameters, elapsed: float) -> None:
+        labels = statement_labels(sql)
+        self._labels = labels
+        self._sql = sql
+        self._parameters = parameters
+        self._elapsed = elapsed
+        DB_QUERY_DURATION.observe_labels(elapsed, labels)
+        self._slow_logged = elapsed >= _slow_seconds
+        if self._slow_logged:
+            _record_slow_query(self)
+
+    def _fetched(self, elapsed: float) -> None:
+        DB_FETCH_SECONDS.inc_labels(elapsed, self._labels)
+        self._elapsed += elapsed
+        if self._elapsed >= _slow_seconds and not self._slow_logged:
+            self._slow_logged = True
+            _record_slow_query(self)
+
+    def execute(self, sql, parameters=()):
+        started = _perf_counter()
+        try:
+            return _cursor_execute(self, sql, parameters)
+        finally:
+            self._executed(sql, parameters, _perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = _perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # พารามิเตอร์อาจเป็น iterator ที่ใช้ไปแล้ว จึงไม่ขอ query plan
+            self._executed(sql, None, _perf_counter() - started)
+
+    def fetchone(self):
+        started = _perf_counter()
+        try:
+            return _cursor_fetchone(self)
+        finally:
+            self._fetched(_perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = _perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            self._fetched(_perf_counter() - started)
+
+    def fetchall(self):
+        started = _perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            self._fetched(_perf_counter() - started)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection ที่ทุก cursor (รวม conn.execute) เป็น InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return _connection_cursor(self, InstrumentedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return _connection_cursor(self, InstrumentedCursor).executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """factory สำหรับ sqlite3.connect ตาม METRICS_ENABLED"""
+    return InstrumentedConnection if METRICS_ENABLED else sqlite3.Connection
+
+
+# ==================== Template Functions ====================
+
+class InstrumentedTemplate(Template):
+    """Template ที่จับเวลา render"""
+
+    def render(self, *args, **kwargs):
+        started = _perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER_DURATION.observe_labels(_perf_counter() - started,
+                                                    (self.name or "<string>",))
+
+
+def instrument_templates(env: Environment) -> None:
+    """ให้ทุกเทมเพลตที่โหลดจาก env จับเวลา render (เรียกก่อนโหลดเทมเพลต)"""
+    if METRICS_ENABLED:
+        env.template_class = InstrumentedTemplate
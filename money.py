@@ -0,0 +1,55 @@
+"""จำนวนเงินเป็นจำนวนเต็มหน่วยสตางค์ (1 บาท = 100 สตางค์)
+
+ราคาและยอดรวมเก็บในฐานข้อมูลเป็น INTEGER สตางค์ และคำนวณด้วยจำนวนเต็มเท่านั้น
+ยอดรวมที่บันทึกจึงเท่ากับผลรวมของยอดแต่ละรายการที่แสดงพอดีทุกสตางค์
+แปลงเป็นบาทเฉพาะตอนส่งออก (JSON, เทมเพลต, CSV)
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+SATANG_PER_BAHT = 100
+
+_ONE = Decimal(1)
+
+
+def to_satang(value) -> int:
+    """แปลงจำนวนเงินบาทเป็นสตางค์ ปัดเศษสตางค์แบบครึ่งขึ้น
+
+    float ถูกแปลงผ่าน repr จึงได้ค่าตามที่พิมพ์ (1.005 เป็น 101 สตางค์ ไม่ใช่ 100)
+    ข้อมูลที่ไม่ใช่ตัวเลขจะ raise ValueError
+
+    Args:
+        value: จำนวนเงินบาท (int, float, str หรือ Decimal)
+
+    Returns:
+        จำนวนสตางค์
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if isinstance(value, int):
+        return value * SATANG_PER_BAHT
+    try:
+        amount = value if isinstance(value, Decimal) else Decimal(
+            value if isinstance(value, str) else repr(value)
+        )
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return int((amount * SATANG_PER_BAHT).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def to_baht(satang: int) -> float:
+    """แปลงสตางค์เป็นบาทสำหรับแสดงผล (ค่าเดียวกับ ``satang / 100.0`` ใน SQL)"""
+    return satang / SATANG_PER_BAHT
+
+
+def line_total(price_satang: int, quantity: int) -> int:
+    """ยอดของรายการสินค้าหนึ่งรายการ (สตางค์)"""
+    return price_satang * quantity
+
+
+def format_baht(satang: int) -> str:
+    """จัดรูปแบบสตางค์เป็นข้อความบาท 2 ตำแหน่ง เช่น 123456 เป็น ``1,234.56``"""
+    sign = "-" if satang < 0 else ""
+    baht, rest = divmod(abs(satang), SATANG_PER_BAHT)
+    return f"{sign}{baht:,}.{rest:02d}"
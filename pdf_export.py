@@ -0,0 +1,243 @@
+"""ส่งออกใบเสร็จหลายใบเป็นไฟล์ PDF รวมใน ZIP (สำหรับเก็บเอกสาร/ส่งสิ้นเดือน)
+
+PDF ถูกสร้างขนานกันใน ProcessPoolExecutor ตัวเดียวของ process (สร้างเมื่อส่งออกครั้งแรก
+ใช้ร่วมกันทุกการส่งออก ปิดด้วย shutdown_pool()) และเขียนลง ZIP ทีละชุดตามลำดับ
+ใบเสร็จ ZIP ถูกส่งออกเป็นชิ้นๆ ระหว่างสร้าง จึงไม่ต้องเก็บทั้งไฟล์ไว้ในหน่วยความจำ
+ท้าย ZIP มี export_report.json บอกจำนวนหน้าและความเร็ว (หน้า/วินาที)
+
+    python pdf_export.py --from 2026-10-01 --to 2026-10-31 -o invoices-2026-10.zip
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import database as db
+import invoice_pdf
+from invoice_render import invoice_context
+
+# จำนวน worker process สูงสุดของ pool ที่ทุกการส่งออกใช้ร่วมกัน (ต่อ process ของแอป)
+PDF_EXPORT_MAX_WORKERS = int(
+    os.environ.get("PDF_EXPORT_MAX_WORKERS", str(os.cpu_count() or 1))
+)
+
+# จำนวนใบเสร็จที่ส่งให้ worker ต่องานหนึ่งชิ้น
+PDF_EXPORT_CHUNK_SIZE = 16
+
+# จำนวนแถวที่อ่านจากฐานข้อมูลต่อหน้า
+_PAGE_SIZE = 500
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# งานที่ส่งเข้า pool ได้พร้อมกันจากทุกการส่งออก (ทำอยู่ 1 + รอคิว 1 ต่อ worker)
+# คืนเมื่องานเสร็จหรือถูกยกเลิก การส่งออกพร้อมกันจึงแบ่ง worker กันแทนการเพิ่มงานค้าง
+_task_slots = threading.BoundedSemaphore(PDF_EXPORT_MAX_WORKERS * 2)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """ProcessPoolExecutor ที่ใช้ร่วมกัน (สร้างเมื่อเรียกครั้งแรก)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: worker ไม่สืบทอด thread pool และการเชื่อมต่อฐานข้อมูลของ process หลัก
+            _pool = ProcessPoolExecutor(max_workers=PDF_EXPORT_MAX_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool(wait: bool = True) -> None:
+    """ปิด pool และยกเลิกงานที่ยังไม่เริ่ม (เรียกตอนปิดแอป)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _submit(chunk: List[Dict], font_path: str):
+    """ส่ง chunk เข้า pool เมื่อได้ slot (รอถ้าการส่งออกอื่นใช้ครบแล้ว)"""
+    _task_slots.acquire()
+    try:
+        future = get_pool().submit(invoice_pdf.render_batch, chunk, font_path)
+    except BaseException:
+        _task_slots.release()
+        raise
+    future.add_done_callback(lambda _: _task_slots.release())
+    return future
+
+
+class _ZipSink:
+    """ปลายทางของ ZipFile ที่เก็บ bytes ไว้จนกว่าจะถูกดึงออกไปส่ง (seek ไม่ได้)"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """จำกัดจำนวน worker ที่การส่งออกหนึ่งครั้งใช้ ให้อยู่ระหว่าง 1 ถึง PDF_EXPORT_MAX_WORKERS"""
+    if not workers:
+        workers = PDF_EXPORT_MAX_WORKERS
+    return max(1, min(workers, PDF_EXPORT_MAX_WORKERS))
+
+
+def iter_invoice_contexts(filters: Dict) -> Iterator[Dict]:
+    """อ่านใบเสร็จตามตัวกรองของ list_invoices (เก่าไปใหม่) ทีละหน้า"""
+    cursor = None
+    while True:
+        page = db.list_invoices(cursor=cursor, limit=_PAGE_SIZE, order="asc",
+                                **filters)
+        numbers = [row['invoice_number'] for row in page['invoices']]
+        invoices = db.get_invoices_by_numbers(numbers)
+        for number in numbers:
+            if number in invoices:
+                yield invoice_context(invoices[number])
+        cursor = page['next_cursor']
+        if not cursor:
+            return
+
+
+def _chunked(contexts: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for context in contexts:
+        chunk.append(context)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _pdf_name(invoice_number: str) -> str:
+    return invoice_number.replace("/", "-") + ".pdf"
+
+
+def export_invoices_zip(filters: Optional[Dict] = None,
+                        workers: Optional[int] = None,
+                        font_path: Optional[str] = None,
+                        report: Optional[Dict] = None) -> Iterator[bytes]:
+    """สร้าง ZIP ของ PDF ใบเสร็จ คืนค่าเป็นชิ้นของไฟล์ ZIP ตามลำดับ
+
+    Args:
+        filters: ตัวกรองของ db.list_invoices (date_from, date_to, customer,
+            min_amount, max_amount)
+        workers: จำนวน worker process (ไม่เกิน PDF_EXPORT_MAX_WORKERS)
+        font_path: ไฟล์ฟอนต์ภาษาไทย (ค่าเริ่มต้นจาก invoice_pdf.find_font)
+        report: Dict ที่จะถูกเติมสรุปผล (invoices, pages, seconds, pages_per_sec)
+
+    Returns:
+        Iterator ของ bytes ที่ต่อกันเป็นไฟล์ ZIP
+    """
+    if not invoice_pdf.is_available():
+        raise RuntimeError("fpdf2 is not installed (uv sync --extra pdf)")
+    font_path = invoice_pdf.find_font(font_path)
+    workers = resolve_workers(workers)
+    report = report if report is not None else {}
+
+    sink = _ZipSink()
+    started = time.perf_counter()
+    invoices = pages = 0
+    timestamp = datetime.now().timetuple()[:6]
+
+    pending = deque()
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+
+            def write_done():
+                nonlocal invoices, pages
+                for invoice_number, pdf_bytes, page_count in pending.popleft().result():
+                    info = zipfile.ZipInfo(_pdf_name(invoice_number), timestamp)
+                    archive.writestr(info, pdf_bytes)
+                    invoices += 1
+                    pages += page_count
+
+            for chunk in _chunked(iter_invoice_contexts(filters or {}),
+                                  PDF_EXPORT_CHUNK_SIZE):
+                pending.append(_submit(chunk, font_path))
+                # งานค้างไม่เกิน 2 ชิ้นต่อ worker หน่วยความจำจึงไม่โตตามจำนวนใบเสร็จ
+                if len(pending) >= workers * 2:
+                    write_done()
+                    yield sink.drain()
+
+            while pending:
+                write_done()
+                yield sink.drain()
+
+            seconds = time.perf_counter() - started
+            report.update({
+                "invoices": invoices,
+                "pages": pages,
+                "workers": workers,
+                "seconds": round(seconds, 3),
+                "pages_per_sec": round(pages / seconds, 1) if seconds > 0 else 0.0,
+            })
+            archive.writestr(zipfile.ZipInfo("export_report.json", timestamp),
+                             json.dumps(report, indent=2))
+    finally:
+        # client ยกเลิกกลางทาง: ยกเลิกงานที่ยังไม่เริ่ม pool ยังใช้ต่อได้
+        for future in pending:
+            future.cancel()
+
+    print(f"PDF export: {invoices} invoices, {pages} pages in "
+          f"{report.get('seconds', 0)}s ({report.get('pages_per_sec', 0)} pages/sec, "
+          f"{workers} workers)")
+    yield sink.drain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ส่งออกใบเสร็จเป็น PDF ใน ZIP")
+    parser.add_argument("--from", dest="date_from", help="วันที่เริ่มต้น (YYYY-MM-DD หรือ dd/mm/YYYY)")
+    parser.add_argument("--to", dest="date_to", help="วันที่สิ้นสุด (รวมวันนี้)")
+    parser.add_argument("--customer", help="ชื่อลูกค้าขึ้นต้นด้วย")
+    parser.add_argument("--min-amount", type=float)
+    parser.add_argument("--max-amount", type=float)
+    parser.add_argument("--workers", type=int, help=f"จำนวน process (สูงสุด {PDF_EXPORT_MAX_WORKERS})")
+    parser.add_argument("--font", help="ไฟล์ฟอนต์ TrueType ภาษาไทย")
+    parser.add_argument("-o", "--output", required=True, help="ไฟล์ ZIP ปลายทาง")
+    args = parser.parse_args()
+
+    filters = {
+        "date_from": args.date_from,
+        "date_to": args.date_to,
+        "customer": args.customer,
+        "min_amount": args.min_amount,
+        "max_amount": args.max_amount,
+    }
+    try:
+        with open(args.output, "wb") as output:
+            for chunk in export_invoices_zip(filters, args.workers, args.font):
+                output.write(chunk)
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        print(f"Error exporting invoices: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
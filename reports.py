@@ -0,0 +1,52 @@
+"""จัดการตารางสรุปยอดขายจาก command line
+
+    python reports.py rebuild       # สร้างตารางสรุปใหม่ทั้งหมดจากใบเสร็จ
+    python reports.py catch-up      # เพิ่มเฉพาะใบเสร็จที่ยังไม่อยู่ในตารางสรุป
+    python reports.py audit [--fix] # ตรวจยอดเงินทุกใบเสร็จ (--fix แก้ยอดที่ไม่ตรง)
+"""
+import argparse
+import time
+
+import database as db
+import money
+
+
+def audit(fix: bool, limit: int) -> None:
+    result = db.audit_invoice_totals(limit, fix=fix)
+    print(f"Checked {result['invoices']} invoices, {result['lines']} lines, "
+          f"total {money.format_baht(result['total_satang'])} บาท")
+    print(f"Line subtotal mismatches: {result['line_mismatches']}")
+    print(f"Invoice total mismatches: {result['invoice_mismatches']}")
+    for row in result['mismatches']:
+        print(f"  {row['invoice_number']}: stored {money.format_baht(row['total_satang'])}, "
+              f"computed {money.format_baht(row['computed_satang'])} "
+              f"({row['bad_lines']} of {row['line_count']} lines differ)")
+    if result['fixed']:
+        print("Mismatched totals fixed and sales summaries rebuilt")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="จัดการตารางสรุปยอดขาย")
+    parser.add_argument("command", choices=("rebuild", "catch-up", "audit"))
+    parser.add_argument("--fix", action="store_true",
+                        help="audit: แก้ยอดที่ไม่ตรงเป็นราคา x จำนวน")
+    parser.add_argument("--limit", type=int, default=20,
+                        help="audit: จำนวนใบเสร็จที่ไม่ตรงที่แสดง")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "audit":
+        audit(args.fix, args.limit)
+        print(f"Audit finished in {time.perf_counter() - started:.2f}s")
+        return
+
+    if args.command == "rebuild":
+        count = db.rebuild_sales_summaries()
+    else:
+        count = db.catch_up_sales_summaries()
+    print(f"Sales summaries: {count} invoices applied in "
+          f"{time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
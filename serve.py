@@ -0,0 +1,41 @@
+"""รันแอปด้วย uvicorn หลาย worker process บนไฟล์ SQLite เดียวกัน
+
+process หลัก migrate schema ครั้งเดียวก่อนเริ่ม worker worker ที่เริ่มทีหลังจึงเจอ
+schema ล่าสุดแล้ว (ตรวจแค่ PRAGMA user_version) แคชในแต่ละ worker ตรวจเลขเวอร์ชัน
+ในตาราง data_versions จึงเห็นการนำเข้าสินค้า/แก้ไขข้อมูลผู้ขายจาก worker อื่น
+
+    WEB_CONCURRENCY=4 python serve.py --port 8000
+"""
+import argparse
+import os
+
+# จำนวน worker เริ่มต้น (ชื่อเดียวกับที่ uvicorn/gunicorn ใช้)
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+
+def bootstrap() -> None:
+    """migrate ฐานข้อมูลใน process หลัก แล้วปิดการเชื่อมต่อก่อนเริ่ม worker"""
+    import database as db
+
+    db.init_database()
+    db.close_database()
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="รันแอปด้วย uvicorn หลาย worker")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY,
+                        help="จำนวน worker process (ค่าเริ่มต้นจาก WEB_CONCURRENCY)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    workers = max(1, args.workers)
+    bootstrap()
+    print(f"Starting {workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    run()